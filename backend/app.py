@@ -1,29 +1,37 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, g, request, jsonify, make_response, stream_with_context
 from flask_restful import Api, Resource
 from flask_cors import CORS
-from langchain_neo4j import Neo4jGraph
 from neo4j.time import DateTime as Neo4jDateTime
 from datetime import datetime
-from dotenv import load_dotenv
 import os
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from pydantic import BaseModel
-from tqdm import tqdm
-from sklearn.metrics.pairwise import cosine_distances
+from dotenv import load_dotenv
 import numpy as np
+from diversity import select_dissimilar_embeddings
+from embedding_store import article_embeddings
+from db import read_query, write_query, pool_metrics
+from chains import (
+    article_payload,
+    feed_flights,
+    get_related_records,
+    level_description,
+    meta_summary_role,
+    meta_summarizer,
+    prompt_preparer,
+    stream_line,
+    summarize_articles,
+    summarizer,
+    warm_topic_embeddings,
+)
+import queries
+import feed_materializer
+from feed_materializer import history_feed_key, invalidate_history_feeds, read_feed, topic_feed_key
+from llm_gateway import LLMOverloaded, gateway, priority
+from meta_summarizer import server_timing
+import metrics
+from response_cache import json_body, related_topics, topic_cache
 
 load_dotenv()
 
-url = os.getenv("NEO4J_URI")
-username = os.getenv("NEO4J_USER")
-password = os.getenv("NEO4J_PASSWORD")
-
-neo4j_graph = Neo4jGraph(
-    url=url, username=username, password=password, refresh_schema=False
-)
-
 app = Flask(__name__)
 api = Api(app)
 CORS(app)
@@ -31,17 +39,46 @@ CORS(app)
 
 current_date = datetime(2024, 5, 5, 14, 30)
 
+
+@app.before_request
+def start_trace():
+    g.trace = metrics.begin_request(request.method, request.url_rule.rule if request.url_rule else "unmatched")
+
+
+@app.after_request
+def finish_trace(response):
+    trace, status = g.pop("trace", None), response.status_code
+    if response.is_streamed:
+        # The feed is still being generated; the request ends when the stream closes
+        response.call_on_close(lambda: metrics.end_request(trace, status))
+    else:
+        metrics.end_request(trace, status)
+    return response
+
+
+@app.teardown_request
+def fail_trace(error):
+    # Unhandled errors skip after_request
+    if error is not None:
+        metrics.end_request(g.pop("trace", None), 500)
+
+
+def cached_json_response(body: bytes, etag: str):
+    # The browser revalidates with If-None-Match and gets a 304 while the body is unchanged
+    response = make_response(body, 200)
+    response.mimetype = "application/json"
+    response.set_etag(etag.strip('"'))
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
 @app.route("/topic/get_seed", methods=["GET"])
 def get_topic_seed():
-    query = """
-    MATCH (n:Topic)
-    WHERE n.celfSpread IS NOT NULL AND n.celfSpread <> 0
-    RETURN n.name AS name, n.celfSpread AS spread
-    ORDER BY spread DESC, name ASC
-    """
-    result = neo4j_graph.query(query)
-    topics = [{"name": record["name"]} for record in result]
-    return make_response(jsonify(topics), 200)
+    def compute():
+        result = read_query(queries.topic_seed_query)
+        return json_body([{"name": record["name"]} for record in result])
+
+    return cached_json_response(*topic_cache.get("topic_seed", compute))
 
 
 @app.route("/topic/<string:topic_name>", methods=["GET"])
@@ -50,31 +87,28 @@ def get_related_topics(topic_name):
     if not user_id:
         return make_response(jsonify({"error": "Missing user_id"}), 400)
 
-    query = """
-    MATCH (u:User {id: $user_id})-[:SUBSCRIBED_TO]->(subscribed:Topic)
-    WITH u, collect(subscribed.name) AS subscribed_names
-    MATCH (t:Topic {name: $topic_name})-[s:SIMILAR]-(other:Topic)
-    WHERE NOT other.name IN subscribed_names
-    RETURN other.name AS name, s.score AS score
-    ORDER BY s.score DESC
-    LIMIT 5
-    """
-    result = neo4j_graph.query(
-        query,
-        {
-            "topic_name": topic_name,
-            "user_id": user_id,
-        },
+    # SIMILAR edges are shared by every user; only the subscriptions are read per request
+    similar = topic_cache.get(
+        ("similar_topics", topic_name),
+        lambda: read_query(queries.similar_topics_query, {"topic_name": topic_name}),
     )
-    
-    seen = set()
-    topics = []
-    for record in result:
-        if record["name"] not in seen:
-            seen.add(record["name"])
-            topics.append({"name": record["name"], "score": record["score"]})
-            
-    return make_response(jsonify(topics), 200)
+    subscribed = read_query(queries.subscribed_topic_names_query, {"user_id": user_id})
+    return cached_json_response(*json_body(related_topics(similar, subscribed)))
+
+
+@app.route("/db/pool", methods=["GET"])
+def get_pool_metrics():
+    return make_response(jsonify(pool_metrics.snapshot()), 200)
+
+
+@app.route("/llm/gateway", methods=["GET"])
+def get_gateway_metrics():
+    return make_response(jsonify({**gateway.snapshot(), "prompts": prompt_preparer.snapshot()}), 200)
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.content_type)
 
 
 class DateResource(Resource):
@@ -111,14 +145,8 @@ class UserResource(Resource):
         join_date = data.get("join_date", datetime.now().isoformat())
 
         # Insert into Neo4j
-        query = """
-        MERGE (user:User {id: $user_id})
-        SET user.name = $name,
-            user.base_understanding = $base_understanding,
-            user.join_date = datetime($join_date)
-        """
-        neo4j_graph.query(
-            query,
+        write_query(
+            queries.create_user_query,
             {
                 "user_id": user_id,
                 "name": name,
@@ -138,14 +166,8 @@ class UserResource(Resource):
         join_date = data.get("join_date")
 
         # Update query for Neo4j
-        query = """
-        MATCH (user:User {id: $user_id})
-        SET user.name = $name,
-            user.base_understanding = $base_understanding,
-            user.join_date = datetime($join_date)
-        """
-        neo4j_graph.query(
-            query,
+        write_query(
+            queries.update_user_query,
             {
                 "user_id": user_id,
                 "name": name,
@@ -159,19 +181,7 @@ class UserResource(Resource):
     def get(self):
         user_id = request.args.get("id")
         # Query to retrieve user information and their subscribed interests with levels
-        query = """
-        MATCH (user:User {id: $user_id})
-        OPTIONAL MATCH (user)-[:SUBSCRIBED_TO]->(topic:Topic)
-        OPTIONAL MATCH (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
-        RETURN
-            user.id AS id, 
-            user.name AS name,
-            user.base_understanding AS base_understanding,
-            user.join_date AS join_date,
-            collect({topic: topic.name, level: r.level}) AS interests
-        """
-
-        result = neo4j_graph.query(query, {"user_id": user_id})
+        result = read_query(queries.get_user_query, {"user_id": user_id})
         if result and len(result) > 0:
             user = result[0]
             if hasattr(user["join_date"], "to_native"):
@@ -190,20 +200,11 @@ class UserInterestResource(Resource):
         level = data.get("level", "Beginner")
 
         # Add relationship: User SUBSCRIBED_TO Topic
-        query = """
-        MATCH (user:User {id: $user_id}), (topic:Topic {name: $topic_name})
-        MERGE (user)-[:SUBSCRIBED_TO]->(topic)
-        """
-        neo4j_graph.query(query, {"user_id": user_id, "topic_name": topic_name})
+        write_query(queries.subscribe_query, {"user_id": user_id, "topic_name": topic_name})
 
         # Add level of understanding relationship
-        query_level = """
-        MATCH (user:User {id: $user_id}), (topic:Topic {name: $topic_name})
-        MERGE (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
-        SET r.level = $level
-        """
-        neo4j_graph.query(
-            query_level, {"user_id": user_id, "topic_name": topic_name, "level": level}
+        write_query(
+            queries.set_level_query, {"user_id": user_id, "topic_name": topic_name, "level": level}
         )
 
         return make_response(jsonify({"message": "Interest added successfully!"}), 201)
@@ -214,22 +215,13 @@ class UserInterestResource(Resource):
         topic_name = data.get("topic_name")
 
         # Remove subscription relationship
-        query = """
-        MATCH (user:User {id: $user_id})-[r:SUBSCRIBED_TO]->(topic:Topic {name: $topic_name})
-        DELETE r
-        """
-        neo4j_graph.query(query, {"user_id": user_id, "topic_name": topic_name})
+        write_query(queries.unsubscribe_query, {"user_id": user_id, "topic_name": topic_name})
 
         return make_response(jsonify({"message": "Interest removed successfully!"}), 200)
     
     def get(self, user_id):
         # Get all topics the user is subscribed to
-        query = """
-        MATCH (user:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)
-        OPTIONAL MATCH (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
-        RETURN topic.name AS name, r.level AS level
-        """
-        result = neo4j_graph.query(query, {"user_id": user_id})
+        result = read_query(queries.user_interests_query, {"user_id": user_id})
         topics = [
             {"topic": record["name"], "level": record["level"]} for record in result
         ]
@@ -243,11 +235,7 @@ class UserArticleResource(Resource):
         article_link = data.get("article_link")
 
         # Add relationship: User SAVED_FOR_LATER Article
-        query = """
-        MATCH (user:User {id: $user_id}), (article:Article {link: $article_link})
-        MERGE (user)-[:SAVED_FOR_LATER]->(article)
-        """
-        neo4j_graph.query(query, {"user_id": user_id, "article_link": article_link})
+        write_query(queries.save_article_query, {"user_id": user_id, "article_link": article_link})
 
         return make_response(jsonify({"message": "Article saved successfully!"}), 201)
 
@@ -257,24 +245,18 @@ class UserArticleResource(Resource):
         article_link = data.get("article_link")
 
         # Remove saved article relationship
-        query = """
-        MATCH (user:User {id: $user_id})-[r:SAVED_FOR_LATER]->(article:Article {link: $article_link})
-        DELETE r
-        """
-        neo4j_graph.query(query, {"user_id": user_id, "article_link": article_link})
+        write_query(queries.remove_saved_article_query, {"user_id": user_id, "article_link": article_link})
 
         return make_response(jsonify({"message": "Article removed from saved list!"}), 200)
 
 class InterestResource(Resource):
     def get(self):
         # Get all topics
-        query = """
-        MATCH (topic:Topic)
-        RETURN topic.name AS name
-        """
-        result = neo4j_graph.query(query)
-        topics = [record["name"] for record in result]
-        return make_response(jsonify(topics), 200)
+        def compute():
+            result = read_query(queries.all_topics_query)
+            return json_body([record["name"] for record in result])
+
+        return cached_json_response(*topic_cache.get("all_topics", compute))
 
 
 class SummarizeAllArticlesResource(Resource):
@@ -286,12 +268,14 @@ class SummarizeAllArticlesResource(Resource):
             return make_response(jsonify({"error": "No summaries provided"}), 400)
         if not topic:
             return make_response(jsonify({"error": "No topic provided"}), 400)
-        # Generate meta-summary
-        role = "A journalist whose sole job is to write a summary of multiple articles and want to make sure that the summary is accurate and informative" 
+        # Generate meta-summary, map-reduce style when the summaries don't fit one prompt
+        try:
+            with priority("meta_summary"):
+                summary_ret, stages = meta_summarizer.summarize(summaries, topic, meta_summary_role)
+        except LLMOverloaded as e:
+            return make_response(jsonify({"error": str(e)}), 503, {"Retry-After": "30"})
 
-        summary_ret = meta_summary_chain.invoke({"summaries": summaries, "topic": topic, "role": role}).content
-        
-        return summary_ret
+        return summary_ret, 200, {"Server-Timing": server_timing(stages)}
 
 
 api.add_resource(UserResource, "/user")
@@ -316,137 +300,62 @@ class ArticleTopicResource(Resource):
         except ValueError:
             return make_response(jsonify({"error": "'before_date' must be in 'YYYY-MM-DD' format"}), 400)
 
-        articles = get_related_articles(topic, before_date, level)
+        # Served from the materialized feed when the precompute job has built it
+        feed = read_feed(topic_feed_key(topic, level, before_date))
+        if feed is not None:
+            if stream_format():
+                return stream_feed(feed)
+            return make_response(jsonify({"articles": feed}))
+
+        if stream_format():
+            records = get_related_records(topic, before_date)
+            return stream_articles(records, topic, level_description(level))
+        articles = feed_flights.do(
+            ("articles/topic", topic, level, before_date), lambda: get_related_articles(topic, before_date, level)
+        )
         return make_response(jsonify({"articles": articles}))
 
 api.add_resource(ArticleTopicResource, "/articles/topic")
 
-llm = ChatOllama(model="mistral", temperature=0.7, num_predict=256)
-
-class ArticleAnalysis(BaseModel):
-    summary: str
-    intent: str
-
-parser = JsonOutputParser(pydantic_object=ArticleAnalysis)
-
-summary_prompt = ChatPromptTemplate(
-    messages=[
-        (
-            "system",
-            "You are an expert media analyst generating concise and accurate summaries based on the information found in the text and a provided topic",
-        ),
-        (
-            "human",
-            """
-            You will perform two tasks based on the following input:
-
-            {question}
-
-            1. Generate a summary based on the topic of {topic}:
-
-            2. Classify the intent as one of:
-               - Inform
-               - Persuade
-               - Manipulate
-               - Mislead
-               - Satirize
-
-            {format_instructions}
-        """,
-        ),
-    ],
-    partial_variables={"format_instructions": parser.get_format_instructions()},
-)
-summary_chain = summary_prompt | llm | parser
-
-meta_summary_prompt = ChatPromptTemplate(
-    [
-        (
-            "system",
-            "You are a {role}. You are generating an overall summary from multiple summaries about a given topic.",
-        ),
-        (
-            "human",
-            "Generate an overall summary of the following summaries: {summaries} based on the topic of {topic}. Do not include any extra text or headings—just return the summary.:",
-        ),
-    ]
-)
-meta_summary_chain = meta_summary_prompt | llm
+stream_mimetypes = ["application/json", "application/x-ndjson", "text/event-stream"]
+
+
+def stream_format():
+    # Streaming is opt-in through ?stream=1 or an NDJSON/SSE Accept header
+    best = request.accept_mimetypes.best_match(stream_mimetypes)
+    if best in ("application/x-ndjson", "text/event-stream"):
+        return best
+    if request.args.get("stream") == "1":
+        return "application/x-ndjson"
+    return None
+
+
+def stream_articles(records, topic: str, level: str, status: int = 200):
+    # Emits each article as soon as its summary is ready instead of one JSON list
+    mimetype = stream_format()
+
+    def generate():
+        for i, analysis in summarizer.iter_summaries(records, topic, level):
+            yield stream_line(article_payload(records[i], analysis), mimetype, i)
+
+    return Response(stream_with_context(generate()), status=status, mimetype=mimetype)
+
+
+def stream_feed(articles, status: int = 200):
+    # Streams an already summarized (materialized) feed in the requested format
+    mimetype = stream_format()
+    return Response((stream_line(article, mimetype, i) for i, article in enumerate(articles)), status=status, mimetype=mimetype)
+
 
-embeddings = OllamaEmbeddings(model="nomic-embed-text")
-embedding_dimension = 378
 def get_related_articles(topic: str, before_date: str, level: str):
-    if (level == "Beginner"):
-        level = "middle schooler who is just starting to learn about the topic and wants to understand the basics"
-    elif (level == "Intermediate"):
-        level = "graduate student who has some knowledge about the topic and wants to learn more advanced concepts"
-    elif (level == "Expert"):
-        level = "Industry profession in the domain who is well-versed in the topic and wants to explore a deeper understanding"
-    role = "A journalist whose sole job is to make summaries of articles and want to make sure that the summary is accurate and informative" 
-    query = """
-        WITH $topic_embedding AS topic_vector
-        CALL db.index.vector.queryNodes('article_vectors', 5, topic_vector) YIELD node, score
-        RETURN node.link AS link, node.title AS title, node.description AS description,
-            node.pubDate AS pubDate, score
-        ORDER BY score DESC
-        LIMIT 5;
-    """
-
-    random_query = """
-        MATCH (article:Article)-[:RELATED_TO]->(topic:Topic {name: $topic})
-        WHERE article.pubDate < datetime($before_date)
-        RETURN article.link AS link, article.title AS title, article.description AS description,
-               article.pubDate AS pubDate, 0 AS score
-        ORDER BY rand()
-        LIMIT 5
-    """
-
-    result = neo4j_graph.query(
-        query,
-        {
-            "topic_embedding": embeddings.embed_query(topic),
-            "before_date": before_date,
-        },
-    )
+    records = get_related_records(topic, before_date)
+    return summarize_articles(records, topic, level_description(level))
 
-    articles = []
-    for record in tqdm(result, desc="Processing articles", unit="article"):
-        response_dict = summary_chain.invoke({"question": record["title"] + record["description"], "topic": topic, "level": level})
-        articles.append(
-            {
-                "link": record["link"],
-                "title": record["title"],
-                "description": record["description"],
-                "pubDate": record["pubDate"].strftime("%Y-%m-%dT%H:%M:%S"),
-                "score": record["score"],
-                "summary": response_dict["summary"],
-                "intent": response_dict["intent"],
-            }
-        )
 
-    result = neo4j_graph.query(
-        random_query,
-        {
-            "topic": topic,
-            "before_date": before_date,
-        },
-    )
-    for record in tqdm(result, desc="Processing articles", unit="article"):
-        response_dict = summary_chain.invoke(
-            {"question": record["title"] + record["description"], "topic": topic, "level": level}
-        )
-        articles.append(
-            {
-                "link": record["link"],
-                "title": record["title"],
-                "description": record["description"],
-                "pubDate": record["pubDate"].strftime("%Y-%m-%dT%H:%M:%S"),
-                "score": record["score"],
-                "summary": response_dict["summary"],
-                "intent": response_dict["intent"],
-            }
-        )
-    return articles
+def get_history_articles(user_id: str, topic: str, level: str):
+    history = read_query(queries.history_articles_query, {"user_id": user_id, "topic": topic})
+    return summarize_articles(history, topic, level)
+
 
 class HistoryResource(Resource):
     def post(self):
@@ -458,17 +367,9 @@ class HistoryResource(Resource):
 
         print(f"User ID: {user_id}, Topic: {topic}, Date: {date}, Level: {level}")
         
-        # Retrieve all article embeddings from given topic the tiven user is subscribed to
-        query = """
-        MATCH (user:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)<-[:RELATED_TO]-(article:Article)
-        WHERE topic.name = $topic
-        AND article.pubDate < datetime($date)
-        RETURN article.embedding AS embedding, elementId(article) as elementId, article.link AS link,
-               article.title AS title, article.description AS description, article.pubDate AS pubDate
-        ORDER BY article.pubDate DESC
-        """
-        result = neo4j_graph.query(query, {"user_id": user_id, "topic": topic, "date": date})
-        embeddings = np.array([article["embedding"] for article in result])
+        # Retrieve all articles from given topic the tiven user is subscribed to, vectors from the local store
+        result = read_query(queries.history_candidates_query, {"user_id": user_id, "topic": topic, "date": date})
+        embeddings = article_embeddings(result)
         
         # print length of result
         print(f"Number of articles retrieved: {len(result)}")
@@ -478,36 +379,17 @@ class HistoryResource(Resource):
         selected_articles = [result[i] for i in select_indices]
 
         # Add LAST_QUERY relationship for each selected article's topic
-        query = """
-        UNWIND $articles AS article
-        MATCH (user:User {id: $user_id})
-        MATCH (a:Article)-[:RELATED_TO]->(topic:Topic {name: $topic})
-        WHERE elementId(a) = article.elementId
-        MERGE (user)-[r:LAST_QUERY]->(a)
-        SET r.lastQueriedAt = $date
-        MERGE (user)-[r2:LAST_QUERY]->(topic)
-        SET r2.lastQueriedAt = $date
-        """
-        neo4j_graph.query(query, {
+        write_query(queries.record_history_query, {
             "user_id": user_id,
             "articles": selected_articles,  # Each dict should have "elementId" key
             "topic": topic,
             "date": date
         })
+        invalidate_history_feeds(user_id, topic)
 
-        articles = []
-        for record in selected_articles:
-            response = summary_chain.invoke({"question": record["title"] + record["description"], "topic": topic, "level": level})
-            articles.append(
-                {
-                    "link": record["link"],
-                    "title": record["title"],
-                    "description": record["description"],
-                    "pubDate": record["pubDate"].strftime("%Y-%m-%dT%H:%M:%S"),
-                    "summary": response["summary"],
-                    "intent": response["intent"],
-                }
-            )
+        if stream_format():
+            return stream_articles(selected_articles, topic, level, 201)
+        articles = summarize_articles(selected_articles, topic, level)
 
         return make_response(jsonify(articles), 201)
 
@@ -519,26 +401,18 @@ class HistoryResource(Resource):
         print(f"User ID: {user_id}, Topic: {topic}, Level: {level}")
 
         # Retrieve all articles related to topic that was last queried by the user
-        query = """
-        MATCH (user:User {id: $user_id})-[:LAST_QUERY]->(topic:Topic {name: $topic})<-[:RELATED_TO]-(article:Article)
-        MATCH (user)-[:LAST_QUERY]->(article)
-        RETURN article.link AS link, article.title AS title, article.description AS description, article.pubDate AS pubDate
-        """
-
-        history = neo4j_graph.query(query, {"user_id": user_id, "topic": topic})
-        articles = []
-        for record in history:
-            response = summary_chain.invoke({"question": record["title"] + record["description"], "topic": topic, "level": level})
-            articles.append(
-                {
-                    "link": record["link"],
-                    "title": record["title"],
-                    "description": record["description"],
-                    "pubDate": record["pubDate"].strftime("%Y-%m-%dT%H:%M:%S"),
-                    "summary": response["summary"],
-                    "intent": response["intent"],
-                }
-            )
+        feed = read_feed(history_feed_key(user_id, topic, level))
+        if feed is not None:
+            if stream_format():
+                return stream_feed(feed, 201)
+            return make_response(jsonify(feed), 201)
+
+        if stream_format():
+            history = read_query(queries.history_articles_query, {"user_id": user_id, "topic": topic})
+            return stream_articles(history, topic, level, 201)
+        articles = feed_flights.do(
+            ("articles/history", user_id, topic, level), lambda: get_history_articles(user_id, topic, level)
+        )
 
         print(f"Articles: {articles}")
 
@@ -553,41 +427,26 @@ class HistoryResource(Resource):
         print(f"User ID: {user_id}, Topic: {topic}, Date: {date}, Level: {level}")
 
         # get the date of the last query for the given topic
-        query = """
-        MATCH (user:User {id: $user_id})-[r:LAST_QUERY]->(topic:Topic {name: $topic})
-        RETURN r.lastQueriedAt AS lastQueriedAt
-        """
-        result = neo4j_graph.query(query, {"user_id": user_id, "topic": topic})
+        result = read_query(queries.last_query_date_query, {"user_id": user_id, "topic": topic})
         if result and len(result) > 0:
             prev_date = result[0]["lastQueriedAt"]
         else:
             return make_response(jsonify({"error": "No previous date found"}), 404)
         
         # get all relevant articles that were published after the last query date
-        query = """
-        MATCH (user:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)<-[:RELATED_TO]-(article:Article)
-        WHERE topic.name = $topic
-        AND article.pubDate > datetime($prev_date)
-        RETURN article.embedding AS embedding, elementId(article) as elementId, article.link AS link,
-               article.title AS title, article.description AS description, article.pubDate AS pubDate
-        ORDER BY article.pubDate DESC
-        LIMIT 10
-        """
-        new_result = neo4j_graph.query(query, {"user_id": user_id, "topic": topic, "prev_date": prev_date})
-        new_embeddings = np.array([article["embedding"] for article in new_result])
+        new_result = read_query(queries.new_articles_query, {"user_id": user_id, "topic": topic, "prev_date": prev_date})
+        new_embeddings = article_embeddings(new_result)
 
         # if there are no new articles
         if(len(new_embeddings) == 0):
+            if stream_format():
+                return stream_articles([], topic, level, 202)
             return make_response(jsonify([]), 202)
 
 
         # get the articles from the history that are related to the topic
-        query = """
-        MATCH (user:User {id: $user_id})-[:LAST_QUERY]->(topic:Topic {name: $topic})<-[:RELATED_TO]-(article:Article)
-        RETURN article.embedding AS embedding, elementId(article) as elementId, article.link AS link, article.title AS title, article.description AS description, article.pubDate AS pubDate
-        """
-        history = neo4j_graph.query(query, {"user_id": user_id, "topic": topic})
-        history_embeddings = np.array([article["embedding"] for article in history])
+        history = read_query(queries.history_records_query, {"user_id": user_id, "topic": topic})
+        history_embeddings = article_embeddings(history)
 
         all_articles = history + new_result
         all_embeddings = np.concatenate((history_embeddings, new_embeddings), axis=0)
@@ -596,67 +455,32 @@ class HistoryResource(Resource):
         new_history = [all_articles[i] for i in dissimilar_indices]
 
         # Add LAST_QUERY relationship for each selected article's topic
-        query = """
-        UNWIND $articles AS article
-        MATCH (user:User {id: $user_id})
-        MATCH (a:Article)-[:RELATED_TO]->(topic:Topic {name: $topic})
-        WHERE elementId(a) = article.elementId
-        MERGE (user)-[r:LAST_QUERY]->(a)
-        SET r.lastQueriedAt = $date
-        MERGE (user)-[r2:LAST_QUERY]->(topic)
-        SET r2.lastQueriedAt = $date
-        """
-        neo4j_graph.query(query, {
+        write_query(queries.record_history_query, {
             "user_id": user_id,
             "articles": new_history,  # Each dict should have "elementId" key
             "topic": topic,
             "date": date
         })
+        invalidate_history_feeds(user_id, topic)
 
-        articles = []
-        for record in new_result: # only returns the new articles that were added to the history
-            response = summary_chain.invoke({"question": record["title"] + record["description"], "topic": topic, "level": level})
-            articles.append(
-                {
-                    "link": record["link"],
-                    "title": record["title"],
-                    "description": record["description"],
-                    "pubDate": record["pubDate"].strftime("%Y-%m-%dT%H:%M:%S"),
-                    "summary": response["summary"],
-                    "intent": response["intent"],
-                }
-            )
+        # only returns the new articles that were added to the history
+        if stream_format():
+            return stream_articles(new_result, topic, level, 201)
+        articles = summarize_articles(new_result, topic, level)
 
         return make_response(jsonify(articles), 201)
 
 api.add_resource(HistoryResource, "/articles/history")
 
-def select_dissimilar_embeddings(embeddings: np.ndarray, k):
-    # embeddings: numpy array of shape [N, D]
-    N = embeddings.shape[0]
-    if k >= N:
-        return list(range(N))  # return all if k >= total nodes
-
-    # Compute cosine distances
-    distances = cosine_distances(embeddings)
-
-    # Start with the point that is farthest from all others (max average distance)
-    first_idx = np.argmax(distances.mean(axis=1))
-    selected = [first_idx]
-    remaining = set(range(N)) - {first_idx}
-
-    for _ in range(k - 1):
-        # For each candidate, find its distance to the closest selected point
-        min_distances = [
-            (idx, min(distances[idx][s] for s in selected)) for idx in remaining
-        ]
-        # Pick the one with the largest min distance (most dissimilar from any selected)
-        next_idx = max(min_distances, key=lambda x: x[1])[0]
-        selected.append(next_idx)
-        remaining.remove(next_idx)
-
-    return selected  # indices of selected embeddings
+try:
+    warm_topic_embeddings()
+except Exception as e:
+    # Topic vectors are then embedded lazily on first use
+    print(f"Could not warm topic embeddings: {e}")
 
+# Under the debug reloader only the serving child runs the scheduler
+if feed_materializer.scheduler_interval and (__name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+    feed_materializer.start_scheduler()
 
 if __name__ == "__main__":
     app.run(debug=True)
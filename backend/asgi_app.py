@@ -0,0 +1,490 @@
+import asyncio
+import contextlib
+from datetime import datetime
+
+import numpy as np
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.endpoints import HTTPEndpoint
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Match, Route
+
+import queries
+from chains import (
+    aget_topic_embedding,
+    article_payload,
+    asummarize_articles,
+    feed_flights,
+    level_description,
+    meta_summary_role,
+    meta_summarizer,
+    prompt_preparer,
+    stream_line,
+    summarizer,
+    warm_topic_embeddings,
+)
+from db import aread_query, awrite_query, close_async_driver, pool_metrics
+from diversity import select_dissimilar_embeddings
+from embedding_store import aarticle_embeddings
+import feed_materializer
+from feed_materializer import ainvalidate_history_feeds, aread_feed, history_feed_key, topic_feed_key
+from llm_gateway import LLMOverloaded, gateway, priority
+from meta_summarizer import server_timing
+import metrics
+from response_cache import etag_matches, json_body, related_topics, topic_cache
+from retrieval import arandom_articles, asearch_articles
+
+# Async twin of app.py: same routes and response shapes, but every request
+# awaits Neo4j and Ollama instead of holding a worker thread. Run with
+#   uvicorn asgi_app:app --port 5000
+
+load_dotenv()
+
+current_date = datetime(2024, 5, 5, 14, 30)
+
+
+def cached_json_response(request, body: bytes, etag: str):
+    # The browser revalidates with If-None-Match and gets a 304 while the body is unchanged
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, 200, headers=headers, media_type="application/json")
+
+
+async def get_topic_seed(request):
+    async def compute():
+        result = await aread_query(queries.topic_seed_query)
+        return json_body([{"name": record["name"]} for record in result])
+
+    return cached_json_response(request, *await topic_cache.aget("topic_seed", compute))
+
+
+async def get_related_topics(request):
+    topic_name = request.path_params["topic_name"]
+    user_id = request.query_params.get("id")
+    if not user_id:
+        return JSONResponse({"error": "Missing user_id"}, 400)
+
+    async def compute():
+        return await aread_query(queries.similar_topics_query, {"topic_name": topic_name})
+
+    similar = await topic_cache.aget(("similar_topics", topic_name), compute)
+    subscribed = await aread_query(queries.subscribed_topic_names_query, {"user_id": user_id})
+    return cached_json_response(request, *json_body(related_topics(similar, subscribed)))
+
+
+async def get_pool_metrics(request):
+    return JSONResponse(pool_metrics.snapshot(), 200)
+
+
+async def get_gateway_metrics(request):
+    return JSONResponse({**gateway.snapshot(), "prompts": prompt_preparer.snapshot()}, 200)
+
+
+async def get_metrics(request):
+    return Response(metrics.render(), media_type=metrics.content_type)
+
+
+class DateResource(HTTPEndpoint):
+    async def get(self, request):
+        return JSONResponse({"current_date": current_date.isoformat()}, 200)
+
+    async def put(self, request):
+        data = await request.json()
+        new_date = data.get("current_date")
+
+        if new_date:
+            try:
+                parsed_date = datetime.fromisoformat(new_date)
+                global current_date
+                current_date = parsed_date
+                return JSONResponse({"message": "Date updated successfully!"}, 200)
+            except ValueError:
+                return JSONResponse({"message": "Invalid date format!"}, 400)
+        else:
+            return JSONResponse({"message": "No date provided!"}, 400)
+
+
+class UserResource(HTTPEndpoint):
+    async def post(self, request):
+        data = await request.json()
+        user_id = data.get("id")
+        name = data.get("name")
+        base_understanding = data.get("base_understanding", "Beginner")
+        join_date = data.get("join_date", datetime.now().isoformat())
+
+        await awrite_query(
+            queries.create_user_query,
+            {
+                "user_id": user_id,
+                "name": name,
+                "base_understanding": base_understanding,
+                "join_date": join_date,
+            },
+        )
+        print(f"User {name} created with ID {user_id}.")
+        return JSONResponse({"message": "User created successfully!"}, 201)
+
+    async def put(self, request):
+        data = await request.json()
+        await awrite_query(
+            queries.update_user_query,
+            {
+                "user_id": data.get("id"),
+                "name": data.get("name"),
+                "base_understanding": data.get("base_understanding"),
+                "join_date": data.get("join_date"),
+            },
+        )
+        return JSONResponse({"message": "User updated successfully!"}, 200)
+
+    async def get(self, request):
+        user_id = request.query_params.get("id")
+        result = await aread_query(queries.get_user_query, {"user_id": user_id})
+        if result and len(result) > 0:
+            user = result[0]
+            if hasattr(user["join_date"], "to_native"):
+                user["join_date"] = user["join_date"].to_native().isoformat()
+            return JSONResponse(user, 200)
+        else:
+            return JSONResponse({"message": "User not found!"}, 201)
+
+
+class UserInterestResource(HTTPEndpoint):
+    async def post(self, request):
+        user_id = request.path_params["user_id"]
+        data = await request.json()
+        topic_name = data.get("topic_name")
+        level = data.get("level", "Beginner")
+
+        await awrite_query(queries.subscribe_query, {"user_id": user_id, "topic_name": topic_name})
+        await awrite_query(
+            queries.set_level_query, {"user_id": user_id, "topic_name": topic_name, "level": level}
+        )
+        return JSONResponse({"message": "Interest added successfully!"}, 201)
+
+    async def delete(self, request):
+        user_id = request.path_params["user_id"]
+        data = await request.json()
+        await awrite_query(
+            queries.unsubscribe_query, {"user_id": user_id, "topic_name": data.get("topic_name")}
+        )
+        return JSONResponse({"message": "Interest removed successfully!"}, 200)
+
+    async def get(self, request):
+        user_id = request.path_params["user_id"]
+        result = await aread_query(queries.user_interests_query, {"user_id": user_id})
+        topics = [
+            {"topic": record["name"], "level": record["level"]} for record in result
+        ]
+        return JSONResponse(topics, 200)
+
+
+class UserArticleResource(HTTPEndpoint):
+    async def post(self, request):
+        user_id = request.path_params["user_id"]
+        data = await request.json()
+        await awrite_query(
+            queries.save_article_query, {"user_id": user_id, "article_link": data.get("article_link")}
+        )
+        return JSONResponse({"message": "Article saved successfully!"}, 201)
+
+    async def delete(self, request):
+        user_id = request.path_params["user_id"]
+        data = await request.json()
+        await awrite_query(
+            queries.remove_saved_article_query,
+            {"user_id": user_id, "article_link": data.get("article_link")},
+        )
+        return JSONResponse({"message": "Article removed from saved list!"}, 200)
+
+
+class InterestResource(HTTPEndpoint):
+    async def get(self, request):
+        async def compute():
+            result = await aread_query(queries.all_topics_query)
+            return json_body([record["name"] for record in result])
+
+        return cached_json_response(request, *await topic_cache.aget("all_topics", compute))
+
+
+class SummarizeAllArticlesResource(HTTPEndpoint):
+    async def post(self, request):
+        data = await request.json()
+        topic = data.get("topic")
+        summaries = data.get("combined_summaries")
+        if not summaries:
+            return JSONResponse({"error": "No summaries provided"}, 400)
+        if not topic:
+            return JSONResponse({"error": "No topic provided"}, 400)
+
+        try:
+            with priority("meta_summary"):
+                summary, stages = await meta_summarizer.asummarize(summaries, topic, meta_summary_role)
+        except LLMOverloaded as e:
+            return JSONResponse({"error": str(e)}, 503, headers={"Retry-After": "30"})
+        return JSONResponse(summary, headers={"Server-Timing": server_timing(stages)})
+
+
+stream_mimetypes = ["application/json", "application/x-ndjson", "text/event-stream"]
+
+
+def accept_quality(accept: str, mimetype: str):
+    # (quality, specificity) the Accept header gives a mimetype: the q of the
+    # most specific matching range, so "application/json;q=0.5, */*" ranks
+    # JSON at 0.5 as werkzeug does. Specificity is 2 for the exact type,
+    # 1 for type/* and 0 for */*; (0.0, -1) when nothing matches.
+    ranges = {mimetype: 2, mimetype.split("/")[0] + "/*": 1, "*/*": 0}
+    best = (0.0, -1)
+    for entry in accept.split(","):
+        media_range, *params = [part.strip() for part in entry.split(";")]
+        specificity = ranges.get(media_range.lower())
+        if specificity is None or specificity <= best[1]:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        best = (q, specificity)
+    return best
+
+
+def stream_format(request):
+    # Streaming is opt-in through ?stream=1 or an NDJSON/SSE Accept header,
+    # chosen like werkzeug's best_match in app.py: highest quality, then the
+    # more specific range, then the first of stream_mimetypes
+    accept = request.headers.get("accept", "")
+    if accept:
+        best, best_rank = None, (0.0, -1)
+        for mimetype in stream_mimetypes:
+            rank = accept_quality(accept, mimetype)
+            if rank[0] > 0 and rank > best_rank:
+                best, best_rank = mimetype, rank
+        if best is not None and best != "application/json":
+            return best
+    if request.query_params.get("stream") == "1":
+        return "application/x-ndjson"
+    return None
+
+
+def stream_articles(request, records, topic: str, level: str, status: int = 200):
+    mimetype = stream_format(request)
+
+    async def generate():
+        async for i, analysis in summarizer.aiter_summaries(records, topic, level):
+            yield stream_line(article_payload(records[i], analysis), mimetype, i)
+
+    return StreamingResponse(generate(), status_code=status, media_type=mimetype)
+
+
+def stream_feed(request, articles, status: int = 200):
+    mimetype = stream_format(request)
+    return StreamingResponse(
+        (stream_line(article, mimetype, i) for i, article in enumerate(articles)), status_code=status, media_type=mimetype
+    )
+
+
+async def get_related_records(topic: str, before_date: str):
+    result = await asearch_articles(topic, before_date, await aget_topic_embedding(topic))
+    result += await arandom_articles(topic, before_date)
+    return result
+
+
+async def get_related_articles(topic: str, before_date: str, level: str):
+    records = await get_related_records(topic, before_date)
+    return await asummarize_articles(records, topic, level_description(level))
+
+
+async def get_history_articles(user_id: str, topic: str, level: str):
+    history = await aread_query(queries.history_articles_query, {"user_id": user_id, "topic": topic})
+    return await asummarize_articles(history, topic, level)
+
+
+class ArticleTopicResource(HTTPEndpoint):
+    async def get(self, request):
+        topic = request.query_params.get("topic")
+        level = request.query_params.get("level")
+        before_date = request.query_params.get("before_date")
+
+        if not topic or not before_date or not level:
+            return JSONResponse({"error": "Missing 'topic' or 'before_date' or 'level' parameter"}, 400)
+        try:
+            datetime.strptime(before_date, "%Y-%m-%d")
+        except ValueError:
+            return JSONResponse({"error": "'before_date' must be in 'YYYY-MM-DD' format"}, 400)
+
+        feed = await aread_feed(topic_feed_key(topic, level, before_date))
+        if feed is not None:
+            if stream_format(request):
+                return stream_feed(request, feed)
+            return JSONResponse({"articles": feed})
+
+        if stream_format(request):
+            records = await get_related_records(topic, before_date)
+            return stream_articles(request, records, topic, level_description(level))
+        articles = await feed_flights.ado(
+            ("articles/topic", topic, level, before_date), lambda: get_related_articles(topic, before_date, level)
+        )
+        return JSONResponse({"articles": articles})
+
+
+class HistoryResource(HTTPEndpoint):
+    async def post(self, request):
+        data = await request.json()
+        date = data.get("current_date")
+        user_id = data.get("user_id")
+        topic = data.get("topic")
+        level = data.get("level")
+
+        result = await aread_query(
+            queries.history_candidates_query, {"user_id": user_id, "topic": topic, "date": date}
+        )
+        embeddings = await aarticle_embeddings(result)
+        select_indices = await asyncio.to_thread(select_dissimilar_embeddings, embeddings, 5)
+        selected_articles = [result[i] for i in select_indices]
+
+        await awrite_query(queries.record_history_query, {
+            "user_id": user_id,
+            "articles": selected_articles,
+            "topic": topic,
+            "date": date
+        })
+        await ainvalidate_history_feeds(user_id, topic)
+
+        if stream_format(request):
+            return stream_articles(request, selected_articles, topic, level, 201)
+        articles = await asummarize_articles(selected_articles, topic, level)
+        return JSONResponse(articles, 201)
+
+    async def get(self, request):
+        user_id = request.query_params.get("user_id")
+        topic = request.query_params.get("topic")
+        level = request.query_params.get("level")
+
+        feed = await aread_feed(history_feed_key(user_id, topic, level))
+        if feed is not None:
+            if stream_format(request):
+                return stream_feed(request, feed, 201)
+            return JSONResponse(feed, 201)
+
+        if stream_format(request):
+            history = await aread_query(queries.history_articles_query, {"user_id": user_id, "topic": topic})
+            return stream_articles(request, history, topic, level, 201)
+        articles = await feed_flights.ado(
+            ("articles/history", user_id, topic, level), lambda: get_history_articles(user_id, topic, level)
+        )
+        return JSONResponse(articles, 201)
+
+    async def put(self, request):
+        data = await request.json()
+        date = data.get("current_date")
+        user_id = data.get("user_id")
+        topic = data.get("topic")
+        level = data.get("level")
+
+        result = await aread_query(queries.last_query_date_query, {"user_id": user_id, "topic": topic})
+        if result and len(result) > 0:
+            prev_date = result[0]["lastQueriedAt"]
+        else:
+            return JSONResponse({"error": "No previous date found"}, 404)
+
+        new_result = await aread_query(
+            queries.new_articles_query, {"user_id": user_id, "topic": topic, "prev_date": prev_date}
+        )
+        new_embeddings = await aarticle_embeddings(new_result)
+
+        if len(new_embeddings) == 0:
+            if stream_format(request):
+                return stream_articles(request, [], topic, level, 202)
+            return JSONResponse([], 202)
+
+        history = await aread_query(queries.history_records_query, {"user_id": user_id, "topic": topic})
+        history_embeddings = await aarticle_embeddings(history)
+
+        all_articles = history + new_result
+        all_embeddings = np.concatenate((history_embeddings, new_embeddings), axis=0)
+
+        dissimilar_indices = await asyncio.to_thread(select_dissimilar_embeddings, all_embeddings, 5)
+        new_history = [all_articles[i] for i in dissimilar_indices]
+
+        await awrite_query(queries.record_history_query, {
+            "user_id": user_id,
+            "articles": new_history,
+            "topic": topic,
+            "date": date
+        })
+        await ainvalidate_history_feeds(user_id, topic)
+
+        # only returns the new articles that were added to the history
+        if stream_format(request):
+            return stream_articles(request, new_result, topic, level, 201)
+        articles = await asummarize_articles(new_result, topic, level)
+        return JSONResponse(articles, 201)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    try:
+        await asyncio.to_thread(warm_topic_embeddings)
+    except Exception as e:
+        # Topic vectors are then embedded lazily on first use
+        print(f"Could not warm topic embeddings: {e}")
+    if feed_materializer.scheduler_interval:
+        feed_materializer.start_scheduler()
+    yield
+    await close_async_driver()
+
+
+class TraceMiddleware:
+    # metrics trace per request; it ends once the response, streamed or not, has been sent
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = next((route.path for route in routes if route.matches(scope)[0] != Match.NONE), "unmatched")
+        trace = metrics.begin_request(scope["method"], route)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            metrics.end_request(trace, status)
+
+
+routes = [
+    Route("/topic/get_seed", get_topic_seed, methods=["GET"]),
+    Route("/topic/{topic_name}", get_related_topics, methods=["GET"]),
+    Route("/db/pool", get_pool_metrics, methods=["GET"]),
+    Route("/llm/gateway", get_gateway_metrics, methods=["GET"]),
+    Route("/metrics", get_metrics, methods=["GET"]),
+    Route("/date", DateResource),
+    Route("/user", UserResource),
+    Route("/user/{user_id}/interest", UserInterestResource),
+    Route("/user/{user_id}/article", UserArticleResource),
+    Route("/interests", InterestResource),
+    Route("/summarize_all_articles", SummarizeAllArticlesResource),
+    Route("/articles/topic", ArticleTopicResource),
+    Route("/articles/history", HistoryResource),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(TraceMiddleware),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    lifespan=lifespan,
+)
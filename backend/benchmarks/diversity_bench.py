@@ -0,0 +1,64 @@
+"""Micro-benchmark of select_dissimilar_embeddings across corpus sizes.
+
+Run from backend/:  python -m benchmarks.diversity_bench --sizes 1000 10000 100000 200000
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_distances
+
+from diversity import select_dissimilar_embeddings
+
+
+def reference_select(embeddings: np.ndarray, k):
+    # The original O(N^2) implementation, kept to check results match
+    N = embeddings.shape[0]
+    if k >= N:
+        return list(range(N))
+    distances = cosine_distances(embeddings)
+    first_idx = np.argmax(distances.mean(axis=1))
+    selected = [first_idx]
+    remaining = set(range(N)) - {first_idx}
+    for _ in range(k - 1):
+        min_distances = [
+            (idx, min(distances[idx][s] for s in selected)) for idx in remaining
+        ]
+        next_idx = max(min_distances, key=lambda x: x[1])[0]
+        selected.append(next_idx)
+        remaining.remove(next_idx)
+    return [int(i) for i in selected]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 50000, 100000, 200000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--reference-max", type=int, default=2000,
+                        help="also time the original implementation up to this size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>8} {'seconds':>8} {'peak MB':>8} {'reference s':>11} {'match':>5}")
+    for n in args.sizes:
+        embeddings = rng.standard_normal((n, args.dim), dtype=np.float32)
+        tracemalloc.start()
+        start = time.perf_counter()
+        selected = select_dissimilar_embeddings(embeddings, args.k)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        reference_time, match = "-", "-"
+        if n <= args.reference_max:
+            start = time.perf_counter()
+            expected = reference_select(embeddings.astype(np.float64), args.k)
+            reference_time = f"{time.perf_counter() - start:.3f}"
+            match = str(select_dissimilar_embeddings(embeddings.astype(np.float64), args.k) == expected)
+        print(f"{n:>8} {elapsed:>8.3f} {peak:>8.1f} {reference_time:>11} {match:>5}")
+
+
+if __name__ == "__main__":
+    main()
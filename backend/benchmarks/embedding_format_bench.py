@@ -0,0 +1,50 @@
+"""Disk footprint and load cost of CSV list literals vs a float32 .npy matrix.
+
+Run from backend/:  python -m benchmarks.embedding_format_bench --rows 5000
+"""
+import argparse
+import ast
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    matrix = np.random.default_rng(0).standard_normal((args.rows, args.dim)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "data.csv")
+        npy_path = os.path.join(tmp, "embeddings.npy")
+        # The CSV stores what embed_query returns: Python floats as list literals
+        pd.DataFrame({"embedding": [str(row) for row in matrix.astype(np.float64).tolist()]}).to_csv(
+            csv_path, index=False
+        )
+        np.save(npy_path, matrix)
+
+        start = time.perf_counter()
+        data = pd.read_csv(csv_path)
+        data["embedding"] = data["embedding"].apply(ast.literal_eval)
+        csv_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings = np.load(npy_path, mmap_mode="r")
+        checksum = float(embeddings.sum(dtype=np.float64))  # touch every row
+        npy_seconds = time.perf_counter() - start
+
+        csv_mb = os.path.getsize(csv_path) / 2**20
+        npy_mb = os.path.getsize(npy_path) / 2**20
+
+    print(f"{'format':>6} {'MB':>8} {'load s':>8}")
+    print(f"{'csv':>6} {csv_mb:>8.1f} {csv_seconds:>8.2f}")
+    print(f"{'npy':>6} {npy_mb:>8.1f} {npy_seconds:>8.4f}  (checksum {checksum:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Deterministic stand-in for the Ollama HTTP API.
+
+Serves /api/embed, /api/embeddings and /api/chat with configurable latency,
+so embed_articles.py, the Flask app and the benchmarks can run without a GPU:
+    python -m benchmarks.fake_ollama --port 11435 --latency 0.05
+    OLLAMA_HOST=http://127.0.0.1:11435 python embed_articles.py
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int = 768):
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_chat_content(messages):
+    prompt = messages[-1]["content"] if messages else ""
+    if "JSON" in prompt or "json" in prompt:
+        return json.dumps({"summary": f"Summary of: {prompt.strip()[:60]}", "intent": "Inform"})
+    return f"Overall summary of {len(prompt)} characters of input."
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    per_item_latency = 0.0
+    dim = 768
+    calls = {"embed": 0, "chat": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/", "/api/version"):
+            self.send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self.send_json({"models": [{"name": "mistral:latest"}, {"name": "nomic-embed-text:latest"}]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path in ("/api/embed", "/api/embeddings"):
+            inputs = request.get("input", request.get("prompt", ""))
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.count("embed")
+            time.sleep(self.latency + self.per_item_latency * len(inputs))
+            vectors = [fake_embedding(text, self.dim) for text in inputs]
+            if self.path == "/api/embeddings":
+                self.send_json({"embedding": vectors[0]})
+            else:
+                self.send_json({"model": request.get("model"), "embeddings": vectors})
+        elif self.path == "/api/chat":
+            self.count("chat")
+            time.sleep(self.latency)
+            content = fake_chat_content(request.get("messages", []))
+            message = {"model": request.get("model"), "created_at": "2024-05-05T00:00:00Z"}
+            final = {
+                **message,
+                "message": {"role": "assistant", "content": "" if request.get("stream", True) else content},
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": sum(len(m.get("content", "")) // 4 for m in request.get("messages", [])),
+                "eval_count": len(content) // 4,
+            }
+            if request.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                chunk = {**message, "message": {"role": "assistant", "content": content}, "done": False}
+                self.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+            else:
+                self.send_json(final)
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def count(self, kind):
+        with self.lock:
+            self.calls[kind] += 1
+
+
+def serve(port: int = 11435, latency: float = 0.0, per_item_latency: float = 0.0, dim: int = 768):
+    # Starts the server on a daemon thread and returns it; call shutdown() to stop
+    handler = type(
+        "ConfiguredHandler",
+        (FakeOllamaHandler,),
+        {"latency": latency, "per_item_latency": per_item_latency, "dim": dim, "calls": {"embed": 0, "chat": 0}},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--per-item-latency", type=float, default=0.0, help="extra seconds per embedded text")
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+    server = serve(args.port, args.latency, args.per_item_latency, args.dim)
+    print(f"Fake Ollama listening on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,84 @@
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from langchain_core.runnables import RunnableLambda
+
+
+def fake_summary_chain(latency: float = 0.5, failure_rate: float = 0.0, seed: int = 0):
+    # Stand-in for summary_prompt | llm | parser that sleeps like a local LLM call
+    rng = random.Random(seed)
+
+    def summarize(inputs):
+        time.sleep(latency)
+        if rng.random() < failure_rate:
+            raise json.JSONDecodeError("Invalid json output", "", 0)
+        return {
+            "summary": f"Summary of {inputs['question'][:40]} for {inputs['topic']}",
+            "intent": "Inform",
+        }
+
+    return RunnableLambda(summarize)
+
+
+def fake_records(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            "link": f"https://example.com/article/{i}",
+            "title": f"Article {i} ",
+            "description": " ".join(rng.choice(["news", "model", "data", "graph", "market"]) for _ in range(80)),
+        }
+        for i in range(n)
+    ]
+
+
+def fake_meta_summary_chain(prompt_seconds_per_1k: float = 1.0, output_seconds: float = 2.0, context_tokens: int = 4096):
+    # Stand-in for meta_summary_prompt | llm: prompt processing scales with the
+    # input, generation takes a fixed time, and prompts past the context fail
+    from langchain_core.messages import AIMessage
+
+    from meta_summarizer import estimate_tokens
+
+    def summarize(inputs):
+        tokens = estimate_tokens(inputs["summaries"])
+        if tokens > context_tokens:
+            raise ValueError(f"prompt of {tokens} tokens exceeds the {context_tokens} token context")
+        time.sleep(prompt_seconds_per_1k * tokens / 1000 + output_seconds)
+        content = f"Overview of {inputs['topic']}: " + inputs["summaries"][:600]
+        return AIMessage(content=content, usage_metadata={"input_tokens": tokens, "output_tokens": 150, "total_tokens": tokens + 150})
+
+    return RunnableLambda(summarize)
+
+
+def fake_summaries(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = ["market", "policy", "model", "election", "climate", "launch", "report", "growth"]
+    return [f"Article {i}: " + " ".join(rng.choice(words) for _ in range(70)) + "." for i in range(n)]
+
+
+def synthetic_corpus(rows: int, topics: int, channels: int, dim: int, seed: int = 0):
+    # data.csv-shaped articles (bench:// links, bench- topics and channels) for the loader and the harness
+    rng = np.random.default_rng(seed)
+    topic_names = [f"bench-topic-{i}" for i in range(topics)]
+    # Zipf-like topic popularity so a few topics are hot, as in the real corpus
+    weights = 1.0 / np.arange(1, topics + 1)
+    weights /= weights.sum()
+    return pd.DataFrame(
+        {
+            "url": [f"bench://article/{i}" for i in range(rows)],
+            "title": [f"Article {i}" for i in range(rows)],
+            "body": ["lorem ipsum " * 50] * rows,
+            "timestamp": pd.to_datetime(
+                rng.integers(1_600_000_000, 1_715_000_000, rows), unit="s", utc=True
+            ),
+            "embedding": list(rng.standard_normal((rows, dim), dtype=np.float32).tolist()),
+            "source": [f"bench-channel-{i}" for i in rng.integers(0, channels, rows)],
+            "assigned_topic_name": [
+                ", ".join(rng.choice(topic_names, size=rng.integers(1, 4), replace=False, p=weights))
+                for _ in range(rows)
+            ],
+        }
+    )
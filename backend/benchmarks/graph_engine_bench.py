@@ -0,0 +1,191 @@
+"""Speed and agreement of graph_engine.py's Jaccard and CELF.
+
+Run from backend/:
+    python -m benchmarks.graph_engine_bench                   # data.csv topics, or a synthetic graph
+    python -m benchmarks.graph_engine_bench --neo4j           # against the SIMILAR/celfSpread GDS wrote
+
+Offline, Jaccard is checked against a set-based reference and the CELF seeds'
+estimated spread against independent forward cascades (every directed edge
+flips its own coin, as in GDS), next to the top-degree nodes as a baseline.
+With --neo4j the engine reads the live graph and is compared with what
+neo4j_graph_calc.py --engine gds wrote.
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+import graph_engine
+
+
+def load_pairs(data_path: str):
+    data = pd.read_csv(data_path, usecols=["url", "assigned_topic_name"])
+    return [
+        (link, name)
+        for link, names in zip(data["url"], data["assigned_topic_name"].fillna(""))
+        for name in (names.split(", ") if names else [])
+    ]
+
+
+def synthetic_pairs(articles: int, topics: int, seed: int = 0):
+    # Popular topics get most articles; an article has one to three topics
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, topics + 1) ** 0.9
+    weights /= weights.sum()
+    pairs = []
+    for article in range(articles):
+        for topic in set(rng.choice(topics, rng.integers(1, 4), p=weights)):
+            pairs.append((article, f"topic {topic}"))
+    return pairs
+
+
+def reference_jaccard(pairs, top_k: int):
+    members = {}
+    for article, topic in pairs:
+        members.setdefault(topic, set()).add(article)
+    result = {}
+    for topic, articles in members.items():
+        scores = []
+        for other, other_articles in members.items():
+            shared = len(articles & other_articles)
+            if other != topic and shared:
+                scores.append((shared / len(articles | other_articles), other))
+        result[topic] = sorted(scores, key=lambda pair: -pair[0])[:top_k]
+    return result
+
+
+def forward_spread(matrix, seeds, probability: float, cascades: int, seed: int = 1):
+    # Plain IC cascades from the seed set, one coin per directed edge attempt
+    topics = matrix.shape[0]
+    by_topic = matrix.tocsr()
+    by_article = matrix.T.tocsr()
+
+    def neighbours(node):
+        if node < topics:
+            return by_topic.indices[by_topic.indptr[node] : by_topic.indptr[node + 1]] + topics
+        node -= topics
+        return by_article.indices[by_article.indptr[node] : by_article.indptr[node + 1]]
+
+    rng = random.Random(seed)
+    total = 0
+    for _ in range(cascades):
+        active = set(seeds)
+        frontier = list(seeds)
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for other in neighbours(node):
+                    if other not in active and rng.random() < probability:
+                        active.add(int(other))
+                        next_frontier.append(int(other))
+            frontier = next_frontier
+        total += len(active)
+    return total / cascades
+
+
+def run_offline(args):
+    if os.path.exists(args.data):
+        pairs = load_pairs(args.data)
+        print(f"Graph: {args.data}")
+    else:
+        pairs = synthetic_pairs(args.articles, args.topics)
+        print(f"Graph: synthetic ({args.articles} articles, {args.topics} topics)")
+    start = time.perf_counter()
+    matrix, topics = graph_engine.bipartite_matrix(pairs)
+    print(f"{matrix.nnz} edges, {matrix.shape[0]} topics, {matrix.shape[1]} articles, "
+          f"built in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    rows, cols, scores = graph_engine.topic_jaccard(matrix, args.top_k)
+    jaccard_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = reference_jaccard(pairs, args.top_k)
+    reference_seconds = time.perf_counter() - start
+    found = {}
+    for row, col, score in zip(rows, cols, scores):
+        found.setdefault(topics[row], []).append(score)
+    match = all(
+        np.allclose(found.get(topic, []), [score for score, _ in top]) for topic, top in expected.items()
+    )
+    print(f"Jaccard top-{args.top_k}: {jaccard_seconds:.3f}s (set reference {reference_seconds:.2f}s), "
+          f"scores match: {match}")
+
+    for n_workers in sorted({1, args.workers}):
+        start = time.perf_counter()
+        labels, sizes = graph_engine.live_edge_components(matrix, args.simulations, args.probability, workers=n_workers)
+        sample_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        seeds = graph_engine.celf(labels, sizes, args.seed_size)
+        celf_seconds = time.perf_counter() - start
+        print(f"CELF, {n_workers} worker(s): sampling {sample_seconds:.2f}s, selection {celf_seconds:.3f}s")
+
+    nodes = [node for node, _ in seeds]
+    estimate = sum(spread for _, spread in seeds)
+    degrees = np.concatenate([np.asarray(matrix.sum(axis=1)).ravel(), np.asarray(matrix.sum(axis=0)).ravel()])
+    top_degree = list(np.argsort(-degrees)[: args.seed_size])
+    print(f"Seed set spread: estimated {estimate:.1f}, "
+          f"forward cascades {forward_spread(matrix, nodes, args.probability, args.cascades):.1f}; "
+          f"top-degree nodes {forward_spread(matrix, top_degree, args.probability, args.cascades):.1f}")
+    print("Topic seeds:", [topics[node] for node in nodes if node < len(topics)])
+
+
+def run_neo4j(args):
+    from db import read_query
+
+    gds_similar = {}
+    for record in read_query(
+        "MATCH (t:Topic)-[s:SIMILAR]->(o:Topic) RETURN t.name AS topic, o.name AS other, s.score AS score"
+    ):
+        gds_similar.setdefault(record["topic"], {})[record["other"]] = record["score"]
+    gds_seeds = {record["name"] for record in read_query("MATCH (t:Topic) WHERE t.celfSpread > 0 RETURN t.name AS name")}
+
+    start = time.perf_counter()
+    matrix, topics = graph_engine.read_bipartite()
+    read_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    rows, cols, scores = graph_engine.topic_jaccard(matrix, args.top_k)
+    jaccard_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    seeds = graph_engine.compute_seeds(matrix, args.seed_size, args.simulations, args.probability, workers=args.workers)
+    celf_seconds = time.perf_counter() - start
+    print(f"read {read_seconds:.2f}s, Jaccard {jaccard_seconds:.3f}s, CELF {celf_seconds:.2f}s")
+
+    local_similar = {}
+    for row, col, score in zip(rows, cols, scores):
+        local_similar.setdefault(topics[row], {})[topics[col]] = float(score)
+    overlaps, differences = [], []
+    for topic, expected in gds_similar.items():
+        found = local_similar.get(topic, {})
+        overlaps.append(len(expected.keys() & found.keys()) / max(len(expected), 1))
+        differences += [abs(expected[other] - found[other]) for other in expected.keys() & found.keys()]
+    if overlaps:
+        print(f"SIMILAR: {len(overlaps)} topics, top-k overlap {np.mean(overlaps):.3f}, "
+              f"max score difference {max(differences, default=0):.2e}")
+    local_seeds = {topics[node] for node, _ in seeds if node < len(topics)}
+    print(f"Topic seeds: GDS {len(gds_seeds)}, local {len(local_seeds)}, shared {len(gds_seeds & local_seeds)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--articles", type=int, default=50000, help="synthetic graph size")
+    parser.add_argument("--topics", type=int, default=300, help="synthetic topic count")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed-size", type=int, default=10)
+    parser.add_argument("--simulations", type=int, default=100)
+    parser.add_argument("--probability", type=float, default=0.1)
+    parser.add_argument("--cascades", type=int, default=200, help="forward cascades checking the seed spread")
+    parser.add_argument("--workers", type=int, default=graph_engine.workers)
+    parser.add_argument("--neo4j", action="store_true", help="compare with the GDS output in the live graph")
+    args = parser.parse_args()
+    if args.neo4j:
+        run_neo4j(args)
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
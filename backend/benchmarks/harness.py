@@ -0,0 +1,348 @@
+"""End-to-end benchmark of the API and its pipeline stages on a synthetic corpus.
+
+Run from backend/:
+    python -m benchmarks.harness --articles 5000 --topics 50 --output before.json
+    python -m benchmarks.harness --backend neo4j --articles 20000 --output neo4j.json
+    python -m benchmarks.harness --compare before.json after.json
+
+The corpus (articles, topics, channels, 768-d embeddings) comes from
+benchmarks.fakes.synthetic_corpus. With --backend stand-in it is served by the
+in-memory graph from benchmarks.stand_ins; with --backend neo4j it is loaded
+into the docker-compose Neo4j as bench:// articles, timed as the "load"
+stage, and removed afterwards. Ollama is always benchmarks.fake_ollama with
+--llm-latency per request and --embed-latency per embedded text.
+Summaries are not cached between requests unless --warm-cache is given.
+
+Every endpoint and stage reports p50/p95/p99 latency, throughput and the
+peak Python allocation of one call (tracemalloc); the JSON output also has
+the configuration, environment and peak RSS so two runs can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import fake_ollama
+from benchmarks.fakes import synthetic_corpus
+
+endpoints = ["topic_feed", "history_post", "history_get", "history_put", "related_topics", "meta_summary"]
+stages = ["load", "vector_search", "random_sample", "history_candidates", "diversity", "summarize"]
+
+
+def measure(run, requests: int, concurrency: int):
+    # run(i) performs request i and returns False on an error response
+    latencies, errors = [], 0
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = run(i) is not False
+        except Exception as e:
+            print(f"  request {i} failed: {e!r}")
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, ok in executor.map(one, range(requests)):
+            latencies.append(latency)
+            errors += not ok
+    elapsed = time.perf_counter() - start
+
+    # One more call under tracemalloc, outside the timed runs
+    tracemalloc.start()
+    try:
+        run(requests)
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "throughput_rps": requests / elapsed,
+        "peak_mib": peak / 2**20,
+    }
+
+
+class Workload:
+    """The corpus, its users and the callables the harness times."""
+
+    def __init__(self, args, corpus):
+        self.args = args
+        self.corpus = corpus
+        self.topics = sorted({name for names in corpus["assigned_topic_name"] for name in names.split(", ") if name})
+        self.users = [f"bench-user-{i}" for i in range(args.users)]
+        self.before_date = args.before_date
+
+    def topic(self, i: int):
+        # Requests spread over the topics, so concurrent ones are not coalesced into one
+        return self.topics[i % len(self.topics)]
+
+    def user(self, i: int):
+        return self.users[i % len(self.users)]
+
+    def setup(self, client):
+        for user_id in self.users:
+            client.post("/user", json={"id": user_id, "name": user_id, "base_understanding": "Beginner"})
+            for topic in self.topics:
+                client.post(f"/user/{user_id}/interest", json={"topic_name": topic, "level": "Beginner"})
+
+    def endpoint(self, app_module, name: str):
+        level = "Beginner"
+
+        def call(method: str, path: str, **kwargs):
+            # A test client per call, as the timed requests run on several threads
+            response = getattr(app_module.app.test_client(), method)(path, **kwargs)
+            return response.status_code < 400
+
+        if name == "topic_feed":
+            return lambda i: call("get", "/articles/topic", query_string={
+                "topic": self.topic(i), "level": level, "before_date": self.before_date})
+        if name == "history_post":
+            return lambda i: call("post", "/articles/history", json={
+                "current_date": self.args.history_date, "user_id": self.user(i), "topic": self.topic(i), "level": level})
+        if name == "history_get":
+            return lambda i: call("get", "/articles/history", query_string={
+                "user_id": self.user(i), "topic": self.topic(i), "level": level})
+        if name == "history_put":
+            return lambda i: call("put", "/articles/history", json={
+                "current_date": self.before_date, "user_id": self.user(i), "topic": self.topic(i), "level": level})
+        if name == "related_topics":
+            return lambda i: call("get", f"/topic/{self.topic(i)}", query_string={"id": self.user(i)})
+        if name == "meta_summary":
+            from benchmarks.fakes import fake_summaries
+
+            summaries = "\n\n".join(fake_summaries(self.args.meta_summaries))
+            return lambda i: call("post", "/summarize_all_articles", json={
+                "topic": self.topic(i), "combined_summaries": summaries})
+        raise ValueError(name)
+
+    def stage(self, name: str):
+        import chains
+        import retrieval
+        from db import read_query
+        from diversity import select_dissimilar_embeddings
+        from embedding_store import article_embeddings
+        import queries
+
+        if name == "vector_search":
+            return lambda i: retrieval.search_articles(
+                self.topic(i), self.before_date, chains.get_topic_embedding(self.topic(i)))
+        if name == "random_sample":
+            return lambda i: retrieval.random_articles(self.topic(i), self.before_date)
+        if name == "history_candidates":
+            return lambda i: read_query(queries.history_candidates_query, {
+                "user_id": self.user(i), "topic": self.topic(i), "date": self.args.history_date})
+        if name == "diversity":
+            embeddings = {}
+
+            def diversity(i):
+                topic = self.topic(i)
+                if topic not in embeddings:
+                    records = read_query(queries.history_candidates_query, {
+                        "user_id": self.user(i), "topic": topic, "date": self.args.history_date})
+                    embeddings[topic] = article_embeddings(records)
+                return select_dissimilar_embeddings(embeddings[topic], 5)
+
+            return diversity
+        if name == "summarize":
+            records = {}
+
+            def summarize(i):
+                topic = self.topic(i)
+                if topic not in records:
+                    records[topic] = chains.get_related_records(topic, self.before_date)
+                return chains.summarizer.summarize_many(records[topic], topic, chains.level_description("Beginner"))
+
+            return summarize
+        raise ValueError(name)
+
+
+def stand_in_backend(args, corpus):
+    from benchmarks import stand_ins
+
+    stand_ins.install(stand_ins.StandInGraph(corpus=corpus), latency=args.db_latency)
+
+
+def neo4j_backend(args, corpus):
+    # Loads the corpus, returns the load stage's result; bench nodes are removed by neo4j_cleanup
+    import neo4j_loader
+    from benchmarks.loader_bench import clear_bench_nodes
+
+    clear_bench_nodes()
+    neo4j_loader.create_constraints(neo4j_loader.neo4j_graph)
+    neo4j_loader.create_indexes(neo4j_loader.neo4j_graph)
+    neo4j_loader.create_vector_index(neo4j_loader.neo4j_graph)
+    tracemalloc.start()
+    start = time.perf_counter()
+    neo4j_loader.insert_csv_data(corpus, args.batch_size, args.load_workers)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "requests": 1,
+        "concurrency": args.load_workers,
+        "errors": 0,
+        "p50_ms": elapsed * 1000,
+        "p95_ms": elapsed * 1000,
+        "p99_ms": elapsed * 1000,
+        "mean_ms": elapsed * 1000,
+        "throughput_rps": len(corpus) / elapsed,  # articles per second
+        "peak_mib": peak / 2**20,
+    }
+
+
+def neo4j_cleanup():
+    from benchmarks.loader_bench import clear_bench_nodes
+    from db import write_query
+
+    write_query("MATCH (u:User) WHERE u.id STARTS WITH 'bench-user-' DETACH DELETE u")
+    write_query("MATCH (f:Feed) WHERE f.topic STARTS WITH 'bench-' DELETE f")
+    clear_bench_nodes()
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count(), "commit": commit}
+
+
+def run(args):
+    ollama = fake_ollama.serve(args.ollama_port, args.llm_latency, args.embed_latency)
+    tmp = tempfile.mkdtemp()
+    # Set before the app modules are imported, as they read their settings at import
+    os.environ.update({
+        "OLLAMA_HOST": f"http://127.0.0.1:{args.ollama_port}",
+        "CACHE_PATH": os.path.join(tmp, "cache.sqlite3"),
+        "SUMMARY_CACHE_TTL": os.environ.get("SUMMARY_CACHE_TTL", "604800") if args.warm_cache else "0",
+    })
+    if args.backend == "stand-in":
+        os.environ.setdefault("NEO4J_URI", "bolt://127.0.0.1:7687")
+
+    start = time.perf_counter()
+    corpus = synthetic_corpus(args.articles, args.topics, args.channels, args.dim, args.seed)
+    print(f"Corpus: {len(corpus)} articles, {args.topics} topics, {args.channels} channels, "
+          f"{args.dim}-d embeddings ({time.perf_counter() - start:.1f}s)")
+
+    results = {}
+    if args.backend == "stand-in":
+        stand_in_backend(args, corpus)
+    else:
+        results["stage:load"] = neo4j_backend(args, corpus)
+    try:
+        import app
+
+        workload = Workload(args, corpus)
+        workload.setup(app.app.test_client())
+        for name in args.stages:
+            if name == "load":
+                continue
+            results[f"stage:{name}"] = measure(workload.stage(name), args.stage_requests, 1)
+            report(f"stage:{name}", results[f"stage:{name}"])
+        for name in args.endpoints:
+            concurrency = 1 if name == "history_post" else args.concurrency
+            results[f"endpoint:{name}"] = measure(workload.endpoint(app, name), args.requests, concurrency)
+            report(f"endpoint:{name}", results[f"endpoint:{name}"])
+    finally:
+        if args.backend == "neo4j":
+            neo4j_cleanup()
+        ollama.shutdown()
+
+    output = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "environment": environment(),
+        "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote {args.output}")
+    return output
+
+
+def report(name: str, result: dict):
+    print(f"{name:<28} p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+          f"p99 {result['p99_ms']:>9.1f} ms  {result['throughput_rps']:>8.2f}/s  "
+          f"peak {result['peak_mib']:>7.1f} MiB  errors {result['errors']}")
+
+
+def compare(base_path: str, new_path: str, tolerance: float):
+    """Prints the change of every shared result; returns the regressions past tolerance."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"base {base['environment'].get('commit')} -> new {new['environment'].get('commit')}")
+    print(f"{'':<28} {'p50':>16} {'p95':>16} {'p99':>16} {'throughput':>16} {'peak MiB':>16}")
+    regressions = []
+    for name in sorted(base["results"].keys() & new["results"].keys()):
+        old, now = base["results"][name], new["results"][name]
+        cells = []
+        for field in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_mib"):
+            change = (now[field] - old[field]) / old[field] if old[field] else 0.0
+            cells.append(f"{now[field]:>8.1f} {change:>+6.0%}")
+            # Higher p95 or lower throughput beyond the tolerance
+            worse = -change if field == "throughput_rps" else change
+            if field in ("p95_ms", "throughput_rps") and worse > tolerance:
+                regressions.append((name, field, change))
+        print(f"{name:<28} " + " ".join(f"{cell:>16}" for cell in cells))
+    for name, field, change in regressions:
+        print(f"REGRESSION {name} {field} {change:+.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["stand-in", "neo4j"], default="stand-in")
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=40, help="requests per endpoint")
+    parser.add_argument("--stage-requests", type=int, default=40, help="calls per pipeline stage")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoints", nargs="+", default=endpoints, choices=endpoints)
+    parser.add_argument("--stages", nargs="+", default=stages, choices=stages)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake Ollama request")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="extra seconds per embedded text")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per stand-in query")
+    parser.add_argument("--warm-cache", action="store_true", help="keep summaries cached between requests")
+    parser.add_argument("--meta-summaries", type=int, default=40, help="summaries per meta-summary request")
+    parser.add_argument("--before-date", default="2024-05-01")
+    parser.add_argument("--history-date", default="2024-03-01", help="current_date of the history POSTs")
+    parser.add_argument("--batch-size", type=int, default=500, help="loader batch size (neo4j)")
+    parser.add_argument("--load-workers", type=int, default=1, help="loader workers (neo4j)")
+    parser.add_argument("--ollama-port", type=int, default=11437)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="p95/throughput change flagged by --compare")
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Concurrency scaling of the Flask app (app.py) vs the ASGI app (asgi_app.py).
+
+Run from backend/:  python -m benchmarks.load_test --concurrency 1 4 16 32 --llm-latency 0.5
+
+Each server runs in its own subprocess with Neo4j replaced by the in-memory
+graph from benchmarks.stand_ins and Ollama by benchmarks.fake_ollama. Flask is
+served by a fixed pool of worker threads, like a threaded WSGI server in
+production; the ASGI app by a single uvicorn worker. Summary caching is
+disabled so every feed load waits on the LLM; identical loads that overlap
+still share one set of calls through request coalescing (singleflight.py).
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+from benchmarks import fake_ollama
+
+
+def serve(kind: str, port: int, workers: int, db_latency: float):
+    # Imported here so the parent process never builds a Neo4j driver
+    from benchmarks import stand_ins
+
+    stand_ins.install(latency=db_latency)
+    if kind == "flask":
+        import logging
+
+        from werkzeug.serving import BaseWSGIServer
+
+        import app
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+        class PooledWSGIServer(BaseWSGIServer):
+            # Handles each connection on a bounded pool instead of a new thread
+            multithread = True
+
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.pool = ThreadPoolExecutor(max_workers=workers)
+
+            def process_request(self, request, client_address):
+                self.pool.submit(self.process_request_thread, request, client_address)
+
+            def process_request_thread(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        PooledWSGIServer("127.0.0.1", port, app.app).serve_forever()
+    else:
+        import uvicorn
+
+        import asgi_app
+
+        uvicorn.run(asgi_app.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(kind: str, port: int, args, env: dict):
+    command = [
+        sys.executable, "-m", "benchmarks.load_test", "--serve", kind, "--port", str(port),
+        "--workers", str(args.workers), "--db-latency", str(args.db_latency),
+    ]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/date", timeout=1)
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError(f"{kind} server exited with {process.returncode}")
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def run_load(url: str, params: dict, requests: int, concurrency: int):
+    # Fires `requests` feed loads with at most `concurrency` in flight
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url, params={**params, "i": i})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return elapsed, np.array(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=32, help="feed loads per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake Ollama call")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="seconds per stand-in Neo4j query")
+    parser.add_argument("--workers", type=int, default=4, help="Flask worker threads")
+    parser.add_argument("--servers", nargs="+", default=["flask", "asgi"], choices=["flask", "asgi"])
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--ollama-port", type=int, default=11436)
+    parser.add_argument("--serve", choices=["flask", "asgi"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.workers, args.db_latency)
+        return
+
+    ollama = fake_ollama.serve(args.ollama_port, args.llm_latency)
+    params = {"topic": "Climate", "level": "Beginner", "before_date": "2024-05-01"}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "OLLAMA_HOST": f"http://127.0.0.1:{args.ollama_port}",
+            "CACHE_PATH": os.path.join(tmp, "cache.sqlite3"),
+            "SUMMARY_CACHE_TTL": "0",
+            "NEO4J_URI": os.getenv("NEO4J_URI") or "bolt://127.0.0.1:7687",
+        }
+        print(f"{'server':>6} {'concurrency':>11} {'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'errors':>6} {'llm calls':>9}")
+        for i, kind in enumerate(args.servers):
+            port = args.port + i
+            process = start_server(kind, port, args, env)
+            try:
+                for concurrency in args.concurrency:
+                    url = f"http://127.0.0.1:{port}/articles/topic"
+                    # Identical concurrent loads share their summaries (single-flight), so fewer calls reach Ollama
+                    chat_calls = ollama.RequestHandlerClass.calls["chat"]
+                    elapsed, latencies, errors = asyncio.run(run_load(url, params, args.requests, concurrency))
+                    print(
+                        f"{kind:>6} {concurrency:>11} {args.requests / elapsed:>7.2f} "
+                        f"{np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 95):>7.2f} {errors:>6} "
+                        f"{ollama.RequestHandlerClass.calls['chat'] - chat_calls:>9}"
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+    ollama.shutdown()
+
+
+if __name__ == "__main__":
+    main()
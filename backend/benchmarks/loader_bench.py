@@ -0,0 +1,76 @@
+"""Serial vs parallel ingestion against the docker-compose Neo4j.
+
+Start the database with `docker compose up -d`, then run from backend/:
+    python -m benchmarks.loader_bench --rows 20000 --workers 1 2 4 8
+
+Only synthetic nodes (links starting with bench://, channels and topics
+starting with bench-) are written, and they are removed between runs.
+"""
+import argparse
+import time
+
+import neo4j_loader
+from benchmarks.fakes import synthetic_corpus
+from neo4j_loader import create_constraints, create_vector_index, insert_csv_data, neo4j_graph
+
+
+def clear_bench_nodes():
+    neo4j_graph.query(
+        """
+        MATCH (n)
+        WHERE (n:Article AND n.link STARTS WITH 'bench://')
+           OR (n:Channel AND n.title STARTS WITH 'bench-')
+           OR (n:Topic AND n.name STARTS WITH 'bench-')
+        CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 1000 ROWS
+        """
+    )
+
+
+def graph_fingerprint():
+    # Same fingerprint means the same articles, channels, topics and edges
+    return neo4j_graph.query(
+        """
+        MATCH (a:Article) WHERE a.link STARTS WITH 'bench://'
+        OPTIONAL MATCH (a)-[:RELATED_TO]->(t:Topic)
+        OPTIONAL MATCH (a)-[:COMES_FROM]->(c:Channel)
+        WITH a, collect(DISTINCT t.name) AS topics, collect(DISTINCT c.title) AS channels
+        RETURN count(a) AS articles,
+               sum(size(topics)) AS related_to,
+               sum(size(channels)) AS comes_from,
+               sum(size(a.embedding)) AS embedding_values
+        """
+    )[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    data = synthetic_corpus(args.rows, args.topics, args.channels, neo4j_loader.embedding_dimension)
+    create_constraints(neo4j_graph)
+    create_vector_index(neo4j_graph)
+
+    results = []
+    for workers in args.workers:
+        clear_bench_nodes()
+        start = time.perf_counter()
+        insert_csv_data(data, args.batch_size, workers)
+        elapsed = time.perf_counter() - start
+        results.append((workers, elapsed, graph_fingerprint()))
+    clear_bench_nodes()
+
+    baseline = results[0][1]
+    print(f"{'workers':>7} {'seconds':>8} {'rows/s':>8} {'speedup':>8}  fingerprint")
+    for workers, elapsed, fingerprint in results:
+        print(f"{workers:>7} {elapsed:>8.1f} {args.rows / elapsed:>8.0f} {baseline / elapsed:>7.1f}x  {fingerprint}")
+    if len({tuple(sorted(f.items())) for _, _, f in results}) > 1:
+        print("WARNING: end state differs between worker counts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Map-reduce meta-summarization vs a single prompt, with a fake LLM.
+
+Run from backend/:  python -m benchmarks.meta_summary_bench --summaries 10 50 200
+
+The fake LLM spends --prompt-seconds per 1k input tokens plus --output-seconds
+per call and fails prompts past --context tokens, like mistral with a
+2k-4k window. The "overlap" row reruns the largest set after dropping its first 10% of
+summaries and appending as many new ones (a feed that moved on), to show how
+much of the map stage the chunk cache reuses.
+"""
+import argparse
+import time
+
+from benchmarks.fakes import fake_meta_summary_chain, fake_summaries
+from cache import PersistentCache
+from meta_summarizer import MetaSummarizer
+
+
+def run(summarizer, summaries):
+    start = time.perf_counter()
+    try:
+        _, stages = summarizer.summarize(summaries, "Economy", "journalist")
+    except ValueError:
+        return time.perf_counter() - start, None
+    return time.perf_counter() - start, stages
+
+
+def describe(stages):
+    if stages is None:
+        return "failed: context exceeded"
+    calls = sum(stage["chunks"] - stage["cached"] for stage in stages)
+    cached = sum(stage["cached"] for stage in stages)
+    tokens = sum(stage["input_tokens"] for stage in stages)
+    return f"{len(stages)} stages, {calls} LLM calls, {cached} cached chunks, {tokens} input tokens"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--summaries", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--prompt-seconds", type=float, default=0.2, help="per 1k input tokens")
+    parser.add_argument("--output-seconds", type=float, default=0.5)
+    parser.add_argument("--context", type=int, default=4096)
+    parser.add_argument("--chunk-tokens", type=int, default=1500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    chain = fake_meta_summary_chain(args.prompt_seconds, args.output_seconds, args.context)
+    single = MetaSummarizer(chain, chunk_tokens=10**9)
+    cache = PersistentCache("meta_summary_bench", path=":memory:")
+    mapreduce = MetaSummarizer(chain, cache=cache, chunk_tokens=args.chunk_tokens, max_concurrency=args.concurrency)
+
+    print(f"{'summaries':>9} {'strategy':>10} {'seconds':>8}  work")
+    for n in args.summaries:
+        summaries = fake_summaries(n)
+        for name, summarizer in (("single", single), ("mapreduce", mapreduce)):
+            elapsed, stages = run(summarizer, summaries)
+            print(f"{n:>9} {name:>10} {elapsed:>8.2f}  {describe(stages)}")
+
+    n = max(args.summaries)
+    summaries = fake_summaries(n)[n // 10 :] + fake_summaries(n // 10, seed=1)
+    elapsed, stages = run(mapreduce, summaries)
+    print(f"{n:>9} {'overlap':>10} {elapsed:>8.2f}  {describe(stages)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Summary prompt sizes and latency with and without prompt_prep compaction.
+
+Run from backend/:
+    python -m benchmarks.prompt_prep_bench --budgets 200 400 800      # data.csv bodies, or synthetic ones
+    python -m benchmarks.prompt_prep_bench --ollama --articles 5      # time the real summary chain too
+
+Offline, the LLM is modelled like a CPU Mistral: --prompt-seconds per 1k
+prompt tokens plus --output-seconds per call. With --ollama every article is
+summarized by summary_chain once from the raw text and once per budget.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import pandas as pd
+
+from meta_summarizer import estimate_tokens
+from prompt_prep import PromptPreparer
+
+
+def load_records(data_path: str, articles: int):
+    data = pd.read_csv(data_path, usecols=["url", "title", "body", "assigned_topic_name"]).fillna("")
+    data = data[data["body"].str.len() > 0].head(articles)
+    return [
+        ({"link": row.url, "title": row.title, "description": row.body}, row.assigned_topic_name.split(", ")[0])
+        for row in data.itertuples()
+    ]
+
+
+def synthetic_records(articles: int, seed: int = 0):
+    # Long scraped bodies: a lead, topic sentences spread through filler and repeated captions
+    rng = random.Random(seed)
+    topics = ["Climate", "Economy", "Artificial Intelligence", "Health"]
+    filler = [
+        "Officials declined to comment further on the matter.",
+        "Shares of several retailers fell slightly in morning trading.",
+        "Read more: the full statement is available on the agency's website.",
+        "Photo: a crowd gathers outside the court house.",
+        "The weather across the region stayed mild through the week.",
+    ]
+    records = []
+    for i in range(articles):
+        topic = topics[i % len(topics)]
+        sentences = [f"{topic} officials announced a new plan on Monday.", f"The {topic.lower()} plan drew criticism."]
+        for j in range(rng.randrange(40, 400)):
+            if rng.random() < 0.05:
+                sentences.append(f"Experts said the {topic.lower()} measures would take years, citing figure {j}.")
+            else:
+                sentences.append(rng.choice(filler))
+        records.append(({"link": f"https://example.com/{i}", "title": f"{topic} plan {i} ", "description": " ".join(sentences)}, topic))
+    return records
+
+
+def percentiles(values):
+    values = sorted(values)
+    return values[len(values) // 2], values[int(len(values) * 0.95)]
+
+
+def run_offline(records, args):
+    raw = [estimate_tokens(record["title"] + record["description"]) for record, _ in records]
+    modelled = [args.prompt_seconds * tokens / 1000 + args.output_seconds for tokens in raw]
+    p50, p95 = percentiles(raw)
+    print(f"{'budget':>7} {'p50 tokens':>10} {'p95 tokens':>10} {'compacted':>9} {'prep ms':>8} {'p50 call s':>10} {'p95 call s':>10}")
+    print(f"{'raw':>7} {p50:>10} {p95:>10} {0:>9} {0:>8.2f} "
+          f"{percentiles(modelled)[0]:>10.2f} {percentiles(modelled)[1]:>10.2f}")
+    for budget in args.budgets:
+        preparer = PromptPreparer(token_budget=budget)
+        start = time.perf_counter()
+        questions = [preparer.question(record, topic) for record, topic in records]
+        prep_ms = 1000 * (time.perf_counter() - start) / len(records)
+        tokens = [estimate_tokens(question) for question in questions]
+        modelled = [args.prompt_seconds * t / 1000 + args.output_seconds for t in tokens]
+        p50, p95 = percentiles(tokens)
+        print(f"{budget:>7} {p50:>10} {p95:>10} {preparer.compacted:>9} {prep_ms:>8.2f} "
+              f"{percentiles(modelled)[0]:>10.2f} {percentiles(modelled)[1]:>10.2f}")
+
+
+def run_ollama(records, args):
+    from chains import level_description, summary_chain
+
+    level = level_description("Beginner")
+    runs = [("raw", None)] + [(str(budget), PromptPreparer(token_budget=budget)) for budget in args.budgets]
+    for name, preparer in runs:
+        times, tokens = [], []
+        for record, topic in records:
+            question = record["title"] + record["description"] if preparer is None else preparer.question(record, topic)
+            tokens.append(estimate_tokens(question))
+            start = time.perf_counter()
+            try:
+                summary_chain.invoke({"question": question, "topic": topic, "level": level})
+            except Exception as e:
+                print(f"{name}: {e!r}")
+            times.append(time.perf_counter() - start)
+        print(f"{name:>7}: {statistics.mean(tokens):.0f} prompt tokens, {statistics.median(times):.2f}s p50 per call")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[200, 400, 800])
+    parser.add_argument("--prompt-seconds", type=float, default=1.0, help="modelled seconds per 1k prompt tokens")
+    parser.add_argument("--output-seconds", type=float, default=4.0, help="modelled generation seconds per call")
+    parser.add_argument("--ollama", action="store_true", help="time the real summary chain against Ollama")
+    args = parser.parse_args()
+    if os.path.exists(args.data):
+        records = load_records(args.data, args.articles)
+        print(f"Articles: {len(records)} from {args.data}")
+    else:
+        records = synthetic_records(args.articles)
+        print(f"Articles: {len(records)} synthetic")
+    if args.ollama:
+        run_ollama(records, args)
+    else:
+        run_offline(records, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Random topic sample: ORDER BY rand() against the shuffle-key index walk.
+
+Run from backend/:
+    python -m benchmarks.random_sample_bench             # simulated topics of 1k to 200k articles
+    python -m benchmarks.random_sample_bench --neo4j     # both queries on the largest live topics
+
+Offline, the graph is --edges RELATED_TO edges, one topic of the given size
+and the rest spread over --topics others. Each edge is (topic, shuffle key,
+passes the before_date filter). The exact path reads every edge of the topic
+and keeps the top `limit` random values, as Neo4j's ORDER BY rand() LIMIT
+does. The sampled path walks the windows retrieval.sample_windows asks for
+over two index layouts: the (topic, shuffleKey) composite index the loader
+builds, which only reads the topic's edges, and a shuffleKey-only index,
+which reads every edge of the graph in the window and filters by topic
+afterwards. Reported: rows read and latency per sample.
+"""
+import argparse
+import bisect
+import heapq
+import random
+import statistics
+import time
+
+import retrieval
+
+
+def simulated_graph(size: int, edges: int, topics: int, before_share: float, seed: int = 0):
+    # Topic 0 is the sampled one; returns both index layouts and their sort keys for bisect
+    rng = random.Random(seed)
+    entries = [(0, rng.random(), rng.random() < before_share) for _ in range(size)]
+    entries += [(rng.randrange(1, topics + 1), rng.random(), True) for _ in range(max(edges - size, 0))]
+    composite = sorted(entries)
+    by_key = sorted(entries, key=lambda entry: entry[1])
+    return {
+        "composite": (composite, [(topic, key) for topic, key, _ in composite]),
+        "key only": (by_key, [key for _, key, _ in by_key]),
+    }
+
+
+def exact_sample(index, size: int, limit: int):
+    # The topic's own edges, read from the Topic node
+    entries, _ = index["composite"]
+    kept = heapq.nsmallest(limit, ((random.random(), i) for i in range(size) if entries[i][2]))
+    return [i for _, i in kept], size
+
+
+def window_rows(entries, sort_keys, low: float, high: float, scoped: bool):
+    if scoped:
+        return entries[bisect.bisect_left(sort_keys, (0, low)):bisect.bisect_left(sort_keys, (0, high))]
+    return entries[bisect.bisect_left(sort_keys, low):bisect.bisect_left(sort_keys, high)]
+
+
+def sampler(layout: str):
+    def sampled(index, size: int, limit: int):
+        entries, sort_keys = index[layout]
+        rows = 0
+        for start, ranges in retrieval.sample_windows(size, limit):
+            found = []
+            for low, high in ranges:
+                for topic, key, passes in window_rows(entries, sort_keys, low, high, layout == "composite"):
+                    rows += 1
+                    if topic == 0 and passes:
+                        found.append(((key - start + 1.0) % 1.0, key))
+            if len(found) >= limit:
+                return [key for _, key in sorted(found)[:limit]], rows
+        indices, exact_rows = exact_sample(index, size, limit)
+        return indices, rows + exact_rows
+
+    return sampled
+
+
+def measure(sample, index, size: int, limit: int, repeats: int):
+    times, rows = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result, read = sample(index, size, limit)
+        times.append(time.perf_counter() - start)
+        rows.append(read)
+        assert len(result) == limit
+    return statistics.median(times) * 1000, statistics.mean(rows)
+
+
+def run_offline(args):
+    print(f"Graph: {args.edges} RELATED_TO edges over {args.topics + 1} topics")
+    print(f"{'articles':>9} {'exact rows':>11} {'exact ms':>9} {'key-only rows':>14} {'key-only ms':>12} "
+          f"{'topic rows':>11} {'topic ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        index = simulated_graph(size, args.edges, args.topics, args.before_share)
+        exact_ms, exact_rows = measure(exact_sample, index, size, args.limit, args.repeats)
+        global_ms, global_rows = measure(sampler("key only"), index, size, args.limit, args.repeats)
+        scoped_ms, scoped_rows = measure(sampler("composite"), index, size, args.limit, args.repeats)
+        print(f"{size:>9} {exact_rows:>11.0f} {exact_ms:>9.3f} {global_rows:>14.0f} {global_ms:>12.3f} "
+              f"{scoped_rows:>11.1f} {scoped_ms:>9.3f} {exact_ms / scoped_ms:>7.1f}x")
+
+
+def run_neo4j(args):
+    import queries
+    from db import read_query
+
+    topics = read_query(
+        """
+        MATCH (topic:Topic)
+        WITH topic, COUNT { (topic)<-[:RELATED_TO]-(:Article) } AS size
+        ORDER BY size DESC LIMIT $count
+        RETURN topic.name AS name, size
+        """,
+        {"count": args.live_topics},
+    )
+    for record in topics:
+        params = {"topic": record["name"], "before_date": args.before_date, "limit": args.limit}
+        timings = {}
+        for name, run in (
+            ("exact", lambda: read_query(queries.random_articles_query, params)),
+            ("sampled", lambda: retrieval.random_articles(record["name"], args.before_date, args.limit)),
+        ):
+            run()
+            times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+            timings[name] = statistics.median(times) * 1000
+        print(f"{record['name'][:40]:<40} {record['size']:>7} articles: exact {timings['exact']:.1f} ms, "
+              f"sampled {timings['sampled']:.1f} ms ({timings['exact'] / timings['sampled']:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 200000])
+    parser.add_argument("--edges", type=int, default=1000000, help="RELATED_TO edges in the simulated graph")
+    parser.add_argument("--topics", type=int, default=500, help="other topics in the simulated graph")
+    parser.add_argument("--before-share", type=float, default=0.9, help="share of articles passing before_date")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--neo4j", action="store_true", help="time both queries on the largest live topics")
+    parser.add_argument("--live-topics", type=int, default=5, help="live topics to time with --neo4j")
+    parser.add_argument("--before-date", default="2100-01-01")
+    args = parser.parse_args()
+    if args.neo4j:
+        run_neo4j(args)
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
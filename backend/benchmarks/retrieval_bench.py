@@ -0,0 +1,233 @@
+"""Recall and latency of topic/date-filtered vector retrieval vs exact brute force.
+
+Run from backend/:
+    python -m benchmarks.retrieval_bench                      # data.csv + embeddings.npy, or a synthetic corpus
+    python -m benchmarks.retrieval_bench --neo4j --before-dates 2024-03-01 2024-05-01
+
+The strategies answer "top-5 by cosine among topic X articles published
+before D": the original unfiltered top-5 from the index, retrieval.py's
+adaptive over-fetch, the in-process IVF index (vector_index.py, offline
+only) and the exact scan used as ground truth. Offline the Neo4j index is
+stood in for by a brute-force global top-k (so its latency is not the HNSW
+one); with --neo4j the strategies run against the live article_vectors index.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import retrieval
+import vector_index
+from embedding_store import EmbeddingStore
+
+# What get_related_articles ran before: the global top-5, ignoring topic and date
+unfiltered_query = """
+CALL db.index.vector.queryNodes('article_vectors', 5, $topic_embedding) YIELD node, score
+RETURN node.link AS link, score
+ORDER BY score DESC
+LIMIT 5
+"""
+
+
+class LocalIndex:
+    def __init__(self, matrix: np.ndarray, topics: list, dates: np.ndarray):
+        self.matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.dates = dates
+        self.topic_masks = {}
+        for i, names in enumerate(topics):
+            for name in names:
+                self.topic_masks.setdefault(name, np.zeros(len(topics), dtype=bool))[i] = True
+
+    def top_k(self, query: np.ndarray, k: int):
+        scores = self.matrix @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def fetch(self, query, topic, before, k, limit):
+        top = self.top_k(query, k)
+        keep = self.topic_masks[topic][top] & (self.dates[top] < before)
+        return list(top[keep][:limit])
+
+    def exact(self, query, topic, before, limit):
+        candidates = np.flatnonzero(self.topic_masks[topic] & (self.dates < before))
+        scores = self.matrix[candidates] @ query
+        return list(candidates[np.argsort(-scores)[:limit]])
+
+
+def load_corpus(data_path: str, embeddings_path: str):
+    data = pd.read_csv(data_path, usecols=["assigned_topic_name", "timestamp"])
+    matrix = np.load(embeddings_path).astype(np.float32)
+    topics = [name.split(", ") if name else [] for name in data["assigned_topic_name"].fillna("")]
+    dates = pd.to_datetime(data["timestamp"], errors="coerce", utc=True).dt.tz_localize(None).to_numpy()
+    return matrix, topics, dates
+
+
+def synthetic_corpus(n: int, n_topics: int, dim: int, seed: int = 0):
+    # Articles scatter around overlapping topic centroids, so a topic's nearest
+    # neighbours include plenty of other topics' articles
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    sizes = rng.zipf(1.6, n_topics).clip(1, 50)
+    weights = sizes / sizes.sum()
+    primary = rng.choice(n_topics, n, p=weights)
+    matrix = centroids[primary] * 0.35 + rng.standard_normal((n, dim)).astype(np.float32)
+    topics = [[f"topic {t}"] for t in primary]
+    start = np.datetime64("2023-01-01")
+    dates = start + rng.integers(0, 2 * 365 * 24, n).astype("timedelta64[h]")
+    return matrix, topics, dates
+
+
+def percentile_dates(dates: np.ndarray, mask: np.ndarray, quantiles):
+    topic_dates = np.sort(dates[mask & ~np.isnat(dates)])
+    return [topic_dates[int(q * (len(topic_dates) - 1))] + np.timedelta64(1, "s") for q in quantiles]
+
+
+def run_offline(args):
+    if os.path.exists(args.data) and os.path.exists(args.embeddings):
+        matrix, topics, dates = load_corpus(args.data, args.embeddings)
+        print(f"Corpus: {args.data} ({len(topics)} articles)")
+    else:
+        matrix, topics, dates = synthetic_corpus(args.articles, args.topics, args.dim)
+        print(f"Corpus: synthetic ({len(topics)} articles, {args.topics} topics)")
+    index = LocalIndex(matrix, topics, dates)
+
+    rng = np.random.default_rng(1)
+    names = [name for name, mask in index.topic_masks.items() if mask.sum() >= args.limit]
+    names = list(rng.choice(names, min(args.queries, len(names)), replace=False))
+    cases = []
+    for name in names:
+        mask = index.topic_masks[name]
+        query = index.matrix[mask].mean(axis=0)
+        query /= np.linalg.norm(query)
+        for before in percentile_dates(dates, mask, [0.1, 0.5, 0.9]):
+            cases.append((name, query, before))
+
+    tmp = tempfile.TemporaryDirectory()
+    store = EmbeddingStore(tmp.name, dim=matrix.shape[1])
+    store.append(
+        {"link": str(i), "pubDate": None if np.isnat(date) else str(date), "topics": names, "embedding": vector}
+        for i, (vector, names, date) in enumerate(zip(matrix, topics, dates))
+    )
+    vector_index.train_index(store)
+    ivf = vector_index.IVFIndex(store)
+
+    strategy_names = ("unfiltered", "adaptive", "ivf", "exact")
+    stats = {name: {"recall": [], "ms": [], "calls": [], "fallback": 0} for name in strategy_names}
+    for name, query, before in cases:
+        expected = set(index.exact(query, name, before, args.limit))
+        before_seconds = int(before.astype("datetime64[s]").astype(np.int64))
+        strategies = {
+            "unfiltered": lambda: (list(index.top_k(query, args.limit)), 1, False),
+            "adaptive": lambda: adaptive(index, query, name, before, args.limit),
+            "ivf": lambda: ([row for row, _ in ivf.search(query, args.limit, name, before_seconds)], 1, False),
+            "exact": lambda: (index.exact(query, name, before, args.limit), 1, False),
+        }
+        for strategy, run in strategies.items():
+            start = time.perf_counter()
+            found, calls, fallback = run()
+            stats[strategy]["ms"].append(1000 * (time.perf_counter() - start))
+            stats[strategy]["recall"].append(len(expected & set(found)) / max(len(expected), 1))
+            stats[strategy]["calls"].append(calls)
+            stats[strategy]["fallback"] += fallback
+    report(stats, len(cases))
+    tmp.cleanup()
+
+
+def adaptive(index: LocalIndex, query, topic, before, limit):
+    calls = []
+
+    def fetch(k):
+        calls.append(k)
+        return index.fetch(query, topic, before, k, limit)
+
+    def exact():
+        calls.append("exact")
+        return index.exact(query, topic, before, limit)
+
+    found = retrieval.adaptive_search(fetch, exact, topic, limit)
+    return found, len(calls), calls[-1] == "exact"
+
+
+def run_neo4j(args):
+    import queries
+    from db import read_query
+
+    topics = [record for record in read_query(queries.topic_embeddings_query) if record["embedding"] is not None]
+    rng = np.random.default_rng(1)
+    topics = [topics[i] for i in rng.choice(len(topics), min(args.queries, len(topics)), replace=False)]
+    stats = {name: {"recall": [], "ms": [], "calls": [], "fallback": 0} for name in ("unfiltered", "adaptive", "exact")}
+    cases = 0
+    for topic in topics:
+        for before_date in args.before_dates:
+            cases += 1
+            params = {
+                "topic": topic["name"],
+                "before_date": before_date,
+                "topic_embedding": topic["embedding"],
+                "limit": args.limit,
+            }
+            start = time.perf_counter()
+            expected = {record["link"] for record in read_query(queries.exact_vector_articles_query, params)}
+            exact_ms = 1000 * (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            unfiltered = read_query(unfiltered_query, params)
+            unfiltered_ms = 1000 * (time.perf_counter() - start)
+
+            calls = []
+            start = time.perf_counter()
+            found = retrieval.adaptive_search(
+                lambda k: calls.append(k) or read_query(queries.filtered_vector_articles_query, {**params, "k": k}),
+                lambda: calls.append("exact") or read_query(queries.exact_vector_articles_query, params),
+                topic["name"],
+                args.limit,
+            )
+            adaptive_ms = 1000 * (time.perf_counter() - start)
+
+            for strategy, records, ms, n_calls, fallback in (
+                ("unfiltered", unfiltered, unfiltered_ms, 1, False),
+                ("adaptive", found, adaptive_ms, len(calls), calls[-1] == "exact"),
+                ("exact", expected, exact_ms, 1, False),
+            ):
+                links = {record["link"] for record in records} if strategy != "exact" else records
+                stats[strategy]["recall"].append(len(expected & links) / max(len(expected), 1))
+                stats[strategy]["ms"].append(ms)
+                stats[strategy]["calls"].append(n_calls)
+                stats[strategy]["fallback"] += fallback
+    report(stats, cases)
+
+
+def report(stats, cases):
+    print(f"{cases} queries")
+    print(f"{'strategy':>10} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'exact fallbacks':>15}")
+    for strategy, s in stats.items():
+        print(
+            f"{strategy:>10} {np.mean(s['recall']):>9.3f} {np.percentile(s['ms'], 50):>8.2f} "
+            f"{np.percentile(s['ms'], 95):>8.2f} {np.mean(s['calls']):>8.2f} {s['fallback']:>15}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--embeddings", default="embeddings.npy")
+    parser.add_argument("--articles", type=int, default=50000, help="synthetic corpus size")
+    parser.add_argument("--topics", type=int, default=200, help="synthetic topic count")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50, help="topics to query")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--neo4j", action="store_true", help="run against the live article_vectors index")
+    parser.add_argument("--before-dates", nargs="+", default=["2024-02-01", "2024-05-01"])
+    args = parser.parse_args()
+    if args.neo4j:
+        run_neo4j(args)
+    else:
+        run_offline(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""In-memory stand-in for the Neo4j queries the API runs.
+
+install() swaps db.run_query and db.arun_query for functions that answer the
+statements in queries.py from a generated graph after a simulated round trip,
+so app.py and asgi_app.py can be exercised without a database.
+"""
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import db
+import queries
+from benchmarks.fake_ollama import fake_embedding
+
+topic_names = ["Artificial Intelligence", "Climate", "Economy", "Health", "Sports", "Space"]
+
+
+def generated_articles(articles_per_topic: int, dim: int, seed: int):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    articles = []
+    for topic in topic_names:
+        for i in range(articles_per_topic):
+            link = f"https://example.com/{topic.lower().replace(' ', '-')}/{i}"
+            articles.append(
+                {
+                    "elementId": f"4:bench:{len(articles)}",
+                    "link": link,
+                    "title": f"{topic} story {i} ",
+                    "description": " ".join(rng.choice(["news", "model", "data", "graph", "market"]) for _ in range(60)),
+                    "pubDate": start + timedelta(hours=rng.randrange(24 * 180)),
+                    "topic": topic,
+                    "embedding": fake_embedding(link, dim),
+                }
+            )
+    return articles
+
+
+def corpus_articles(corpus):
+    articles = []
+    names = set()
+    for i, row in enumerate(corpus.itertuples()):
+        topics = row.assigned_topic_name.split(", ") if row.assigned_topic_name else []
+        names.update(topics)
+        if not topics:
+            continue
+        articles.append(
+            {
+                "elementId": f"4:bench:{i}",
+                "link": row.url,
+                "title": row.title,
+                "description": row.body,
+                "pubDate": row.timestamp.to_pydatetime().replace(tzinfo=None),
+                "topic": topics[0],
+                "embedding": row.embedding,
+            }
+        )
+    return sorted(names), articles
+
+
+class StandInGraph:
+    def __init__(self, articles_per_topic: int = 200, dim: int = 768, seed: int = 0, corpus=None):
+        # corpus: a DataFrame shaped like data.csv (benchmarks.fakes.synthetic_corpus); an article
+        # belongs to its first assigned topic
+        if corpus is not None:
+            self.topic_names, self.articles = corpus_articles(corpus)
+        else:
+            self.topic_names, self.articles = topic_names, generated_articles(articles_per_topic, dim, seed)
+        self.by_topic = {}
+        for article in self.articles:
+            self.by_topic.setdefault(article["topic"], []).append(article)
+        self.matrix = np.array([article["embedding"] for article in self.articles], dtype=np.float32)
+        self.users = {}
+        self.history = {}  # (user id, topic) -> (lastQueriedAt, set of elementIds)
+        self.history_versions = {}  # (user id, topic) -> historyVersion
+        self.feeds = {}  # key -> Feed node properties
+        self.job_states = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.handlers = {
+            queries.topic_seed_query: self.topic_seed,
+            queries.similar_topics_query: self.similar_topics,
+            queries.subscribed_topic_names_query: self.subscribed_topic_names,
+            queries.graph_generation_query: lambda params: [{"generation": self.generation}],
+            queries.create_user_query: self.set_user,
+            queries.update_user_query: self.set_user,
+            queries.get_user_query: self.get_user,
+            queries.subscribe_query: self.subscribe,
+            queries.set_level_query: self.set_level,
+            queries.unsubscribe_query: self.unsubscribe,
+            queries.user_interests_query: self.user_interests,
+            queries.all_topics_query: lambda params: [{"name": name} for name in self.topic_names],
+            queries.topic_embeddings_query: lambda params: [{"name": name, "embedding": None} for name in self.topic_names],
+            queries.filtered_vector_articles_query: self.filtered_vector_articles,
+            queries.exact_vector_articles_query: self.exact_vector_articles,
+            queries.random_articles_query: self.random_articles,
+            queries.sampled_articles_query: self.sampled_articles,
+            queries.topic_size_query: self.topic_size,
+            queries.history_candidates_query: self.history_candidates,
+            queries.record_history_query: self.record_history,
+            queries.history_version_query: self.history_version,
+            queries.history_articles_query: self.history_articles,
+            queries.last_query_date_query: self.last_query_date,
+            queries.new_articles_query: self.new_articles,
+            queries.history_records_query: self.history_records,
+            queries.article_embeddings_query: self.article_embeddings,
+            queries.feed_query: self.feed,
+            queries.set_feed_query: self.set_feed,
+            queries.delete_feed_query: self.delete_feed,
+            queries.delete_history_feeds_query: self.delete_history_feeds,
+            queries.feed_keys_query: lambda params: [{"key": key} for key, feed in self.feeds.items() if self.fresh(feed)],
+            queries.subscriptions_query: self.subscriptions,
+            queries.changed_topics_query: lambda params: [],
+            queries.job_state_query: self.job_state,
+            queries.set_job_state_query: self.set_job_state,
+        }
+
+    def answer(self, query: str, params: dict = None):
+        handler = self.handlers.get(query)
+        if handler is None:
+            return []
+        with self.lock:
+            return handler(params or {})
+
+    def record(self, article, *fields):
+        return {field: article[field] for field in fields}
+
+    def topic_articles(self, topic: str):
+        return self.by_topic.get(topic, [])
+
+    def topic_seed(self, params):
+        return [{"name": name, "spread": len(self.topic_names) - i} for i, name in enumerate(self.topic_names)]
+
+    def similar_topics(self, params):
+        return [{"name": name, "score": 0.5} for name in self.topic_names if name != params["topic_name"]]
+
+    def subscribed_topic_names(self, params):
+        return [{"name": topic} for topic in self.users.get(params["user_id"], {"interests": {}})["interests"]]
+
+    def set_user(self, params):
+        user = self.users.setdefault(params["user_id"], {"interests": {}})
+        user.update(
+            name=params["name"],
+            base_understanding=params["base_understanding"],
+            join_date=params["join_date"],
+        )
+        return []
+
+    def get_user(self, params):
+        user = self.users.get(params["user_id"])
+        if user is None:
+            return []
+        interests = [{"topic": topic, "level": level} for topic, level in user["interests"].items()]
+        return [
+            {
+                "id": params["user_id"],
+                "name": user["name"],
+                "base_understanding": user["base_understanding"],
+                "join_date": user["join_date"],
+                "interests": interests or [{"topic": None, "level": None}],
+            }
+        ]
+
+    def subscribe(self, params):
+        if params["user_id"] in self.users and params["topic_name"] in self.topic_names:
+            self.users[params["user_id"]]["interests"].setdefault(params["topic_name"], None)
+        return []
+
+    def set_level(self, params):
+        if params["user_id"] in self.users and params["topic_name"] in self.topic_names:
+            self.users[params["user_id"]]["interests"][params["topic_name"]] = params["level"]
+        return []
+
+    def unsubscribe(self, params):
+        if params["user_id"] in self.users:
+            self.users[params["user_id"]]["interests"].pop(params["topic_name"], None)
+        return []
+
+    def user_interests(self, params):
+        user = self.users.get(params["user_id"], {"interests": {}})
+        return [{"name": topic, "level": level} for topic, level in user["interests"].items()]
+
+    def subscribed(self, params):
+        return params["topic"] in self.users.get(params["user_id"], {"interests": {}})["interests"]
+
+    def scored(self, params, indices):
+        return [
+            {**self.record(self.articles[i], "link", "title", "description", "pubDate"), "score": float(score)}
+            for i, score in indices
+        ]
+
+    def passes(self, article, params):
+        return article["topic"] == params["topic"] and article["pubDate"] < datetime.fromisoformat(params["before_date"])
+
+    def filtered_vector_articles(self, params):
+        # The global top-k (an exact stand-in for the HNSW index), then the filter
+        scores = self.matrix @ np.asarray(params["topic_embedding"], dtype=np.float32)
+        top = np.argsort(-scores)[: params["k"]]
+        kept = [(i, scores[i]) for i in top if self.passes(self.articles[i], params)]
+        return self.scored(params, kept[: params["limit"]])
+
+    def exact_vector_articles(self, params):
+        scores = self.matrix @ np.asarray(params["topic_embedding"], dtype=np.float32)
+        kept = [(i, scores[i]) for i in np.argsort(-scores) if self.passes(self.articles[i], params)]
+        return self.scored(params, kept[: params["limit"]])
+
+    def random_articles(self, params):
+        before = datetime.fromisoformat(params["before_date"])
+        candidates = [article for article in self.topic_articles(params["topic"]) if article["pubDate"] < before]
+        chosen = random.sample(candidates, min(params["limit"], len(candidates)))
+        return [{**self.record(article, "link", "title", "description", "pubDate"), "score": 0} for article in chosen]
+
+    def topic_size(self, params):
+        return [{"size": len(self.topic_articles(params["topic"]))}]
+
+    def sampled_articles(self, params):
+        # Keys are a per-article hash in [0, 1), standing in for RELATED_TO.shuffleKey
+        before = datetime.fromisoformat(params["before_date"])
+        keyed = []
+        for article in self.topic_articles(params["topic"]):
+            key = random.Random(article["link"]).random()
+            if article["pubDate"] < before and any(low <= key < high for low, high in params["ranges"]):
+                keyed.append(((key - params["start"] + 1.0) % 1.0, article))
+        keyed.sort(key=lambda pair: pair[0])
+        return [
+            {**self.record(article, "link", "title", "description", "pubDate"), "score": 0}
+            for _, article in keyed[: params["limit"]]
+        ]
+
+    def history_candidates(self, params):
+        if not self.subscribed(params):
+            return []
+        before = datetime.fromisoformat(params["date"])
+        candidates = [article for article in self.topic_articles(params["topic"]) if article["pubDate"] < before]
+        candidates.sort(key=lambda article: article["pubDate"], reverse=True)
+        return [
+            self.record(article, "elementId", "link", "title", "description", "pubDate")
+            for article in candidates
+        ]
+
+    def record_history(self, params):
+        key = (params["user_id"], params["topic"])
+        _, selected = self.history.get(key, (None, set()))
+        selected = selected | {article["elementId"] for article in params["articles"]}
+        self.history[key] = (params["date"], selected)
+        if params["articles"]:
+            self.history_versions[key] = self.history_versions.get(key, 0) + len(params["articles"])
+        return []
+
+    def history_version(self, params):
+        key = (params["user_id"], params["topic"])
+        return [{"version": self.history_versions.get(key, 0)}] if key in self.history else []
+
+    def history_rows(self, params, *fields):
+        _, selected = self.history.get((params["user_id"], params["topic"]), (None, set()))
+        return [
+            self.record(article, *fields)
+            for article in self.topic_articles(params["topic"])
+            if article["elementId"] in selected
+        ]
+
+    def history_articles(self, params):
+        return self.history_rows(params, "link", "title", "description", "pubDate")
+
+    def history_records(self, params):
+        return self.history_rows(params, "elementId", "link", "title", "description", "pubDate")
+
+    def article_embeddings(self, params):
+        wanted = set(params["element_ids"])
+        return [self.record(article, "elementId", "embedding") for article in self.articles if article["elementId"] in wanted]
+
+    def last_query_date(self, params):
+        key = (params["user_id"], params["topic"])
+        return [{"lastQueriedAt": self.history[key][0]}] if key in self.history else []
+
+    def new_articles(self, params):
+        if not self.subscribed(params):
+            return []
+        after = datetime.fromisoformat(params["prev_date"])
+        candidates = [article for article in self.topic_articles(params["topic"]) if article["pubDate"] > after]
+        candidates.sort(key=lambda article: article["pubDate"], reverse=True)
+        return [
+            self.record(article, "elementId", "link", "title", "description", "pubDate")
+            for article in candidates[:10]
+        ]
+
+    def feed(self, params):
+        feed = self.feeds.get(params["key"])
+        return [{"articles": feed["articles"]}] if feed and self.fresh(feed) else []
+
+    def fresh(self, feed):
+        if feed["kind"] != "history":
+            return True
+        return feed.get("historyVersion") == self.history_versions.get((feed["userId"], feed["topic"]), 0)
+
+    def set_feed(self, params):
+        self.feeds[params["key"]] = {**params["props"], "articles": params["articles"]}
+        return []
+
+    def delete_feed(self, params):
+        self.feeds.pop(params["key"], None)
+        return []
+
+    def delete_history_feeds(self, params):
+        for key, feed in list(self.feeds.items()):
+            if feed["kind"] == "history" and feed.get("userId") == params["user_id"] and feed["topic"] == params["topic"]:
+                del self.feeds[key]
+        return []
+
+    def subscriptions(self, params):
+        return [
+            {"user_id": user_id, "topic": topic, "level": level or user["base_understanding"] or "Beginner"}
+            for user_id, user in self.users.items()
+            for topic, level in user["interests"].items()
+        ]
+
+    def job_state(self, params):
+        return [{"state": dict(self.job_states[params["name"]])}] if params["name"] in self.job_states else []
+
+    def set_job_state(self, params):
+        self.job_states.setdefault(params["name"], {"name": params["name"]}).update(params["state"])
+        return []
+
+
+def install(graph: StandInGraph = None, latency: float = 0.005):
+    # Every query sleeps `latency` seconds to stand in for the Bolt round trip
+    graph = graph or StandInGraph()
+
+    def run_query(query: str, params: dict = None, access_mode: str = None):
+        time.sleep(latency)
+        return graph.answer(query, params)
+
+    async def arun_query(query: str, params: dict = None, access_mode: str = None):
+        await asyncio.sleep(latency)
+        return graph.answer(query, params)
+
+    db.run_query = run_query
+    db.arun_query = arun_query
+    return graph
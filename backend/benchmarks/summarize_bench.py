@@ -0,0 +1,35 @@
+"""Wall-clock scaling of ArticleSummarizer with a fake LLM.
+
+Run from backend/:  python -m benchmarks.summarize_bench --articles 10 --latency 0.5
+"""
+import argparse
+import time
+
+from summarizer import ArticleSummarizer
+from benchmarks.fakes import fake_records, fake_summary_chain
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    records = fake_records(args.articles)
+    chain = fake_summary_chain(args.latency, args.failure_rate)
+    baseline = None
+    print(f"{'concurrency':>11} {'seconds':>8} {'speedup':>8} {'failed':>6}")
+    for concurrency in args.concurrency:
+        summarizer = ArticleSummarizer(chain, max_concurrency=concurrency)
+        start = time.perf_counter()
+        results = summarizer.summarize_many(records, "AI", "Beginner")
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        failed = sum(result["summary"] is None for result in results)
+        print(f"{concurrency:>11} {elapsed:>8.2f} {baseline / elapsed:>7.1f}x {failed:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from pydantic import BaseModel
+
+from cache import PersistentCache, content_key
+from db import read_query, write_query
+from llm_gateway import gateway
+from metrics import span
+from retrieval import random_articles, search_articles
+import queries
+from meta_summarizer import MetaSummarizer
+from prompt_prep import PromptPreparer
+from singleflight import SingleFlight
+from summarizer import ArticleSummarizer
+
+# LLM chains, embeddings and the helpers around them, shared by the Flask app
+# (app.py) and the async ASGI app (asgi_app.py)
+
+llm = ChatOllama(model="mistral", temperature=0.7, num_predict=256)
+# Chains call the model through the gateway, which bounds and prioritizes the calls
+gated_llm = gateway.wrap(llm)
+
+class ArticleAnalysis(BaseModel):
+    summary: str
+    intent: str
+
+parser = JsonOutputParser(pydantic_object=ArticleAnalysis)
+
+summary_prompt = ChatPromptTemplate(
+    messages=[
+        (
+            "system",
+            "You are an expert media analyst generating concise and accurate summaries based on the information found in the text and a provided topic",
+        ),
+        (
+            "human",
+            """
+            You will perform two tasks based on the following input:
+
+            {question}
+
+            1. Generate a summary based on the topic of {topic}:
+
+            2. Classify the intent as one of:
+               - Inform
+               - Persuade
+               - Manipulate
+               - Mislead
+               - Satirize
+
+            {format_instructions}
+        """,
+        ),
+    ],
+    partial_variables={"format_instructions": parser.get_format_instructions()},
+)
+summary_chain = summary_prompt | gated_llm | parser
+
+# Long article bodies are compacted to a token budget before they are prompted
+prompt_preparer = PromptPreparer(cache=PersistentCache("compact_prompts", max_entries=100000))
+
+# Summaries are cached per (article, topic, level). The fingerprint covers the
+# prompt template, compaction and model settings so editing any invalidates old entries.
+summary_fingerprint = content_key(
+    summary_prompt.pretty_repr(),
+    parser.get_format_instructions(),
+    prompt_preparer.fingerprint(),
+    llm.model,
+    llm.temperature,
+    llm.num_predict,
+)
+summary_cache = PersistentCache(
+    "summaries",
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 100000)),
+)
+
+# Identical requests arriving together share one computation: whole feeds by
+# (endpoint, topic, level, date), single summaries by their cache key
+feed_flights = SingleFlight("feeds")
+summary_flights = SingleFlight("summaries")
+
+summarizer = ArticleSummarizer(
+    summary_chain,
+    cache=summary_cache,
+    fingerprint=summary_fingerprint,
+    max_concurrency=int(os.getenv("LLM_CONCURRENCY", 4)),
+    flights=summary_flights,
+    prepare=prompt_preparer.question,
+)
+
+
+def article_payload(record, analysis):
+    article = {
+        "link": record["link"],
+        "title": record["title"],
+        "description": record["description"],
+        "pubDate": record["pubDate"].strftime("%Y-%m-%dT%H:%M:%S"),
+        "summary": analysis["summary"],
+        "intent": analysis["intent"],
+    }
+    if "score" in record:
+        article["score"] = record["score"]
+    return article
+
+
+def summarize_articles(records, topic: str, level: str):
+    analyses = summarizer.summarize_many(records, topic, level)
+    return [article_payload(record, analysis) for record, analysis in zip(records, analyses)]
+
+
+async def asummarize_articles(records, topic: str, level: str):
+    analyses = await summarizer.asummarize_many(records, topic, level)
+    return [article_payload(record, analysis) for record, analysis in zip(records, analyses)]
+
+
+def stream_line(article, mimetype: str, index: int):
+    # One article of a streamed feed, as an NDJSON line or an SSE data frame. Articles
+    # arrive in completion order; index is their place in the feed's (pubDate/score)
+    # order, which the client restores once the stream ends
+    line = json.dumps({**article, "index": index})
+    return f"data: {line}\n\n" if mimetype == "text/event-stream" else line + "\n"
+
+
+meta_summary_prompt = ChatPromptTemplate(
+    [
+        (
+            "system",
+            "You are a {role}. You are generating an overall summary from multiple summaries about a given topic.",
+        ),
+        (
+            "human",
+            "Generate an overall summary of the following summaries: {summaries} based on the topic of {topic}. Do not include any extra text or headings—just return the summary.:",
+        ),
+    ]
+)
+meta_summary_chain = meta_summary_prompt | gated_llm
+meta_summary_role = "A journalist whose sole job is to write a summary of multiple articles and want to make sure that the summary is accurate and informative"
+
+# Large topics are summarized map-reduce style; chunk summaries are cached by content
+meta_summary_cache = PersistentCache(
+    "meta_summaries",
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 100000)),
+)
+meta_summarizer = MetaSummarizer(
+    meta_summary_chain,
+    cache=meta_summary_cache,
+    fingerprint=content_key(meta_summary_prompt.pretty_repr(), llm.model, llm.temperature, llm.num_predict),
+    chunk_tokens=int(os.getenv("META_SUMMARY_CHUNK_TOKENS", 1500)),
+    max_concurrency=int(os.getenv("LLM_CONCURRENCY", 4)),
+)
+
+embeddings = OllamaEmbeddings(model="nomic-embed-text")
+embedding_dimension = 378
+
+# Query embeddings of topic names are kept in memory, backed by the on-disk
+# cache and the Topic.embedding property. Topics come from request URLs, so
+# both keep at most TOPIC_EMBEDDING_CACHE_MAX_ENTRIES, least recently used first out
+max_topic_embeddings = int(os.getenv("TOPIC_EMBEDDING_CACHE_MAX_ENTRIES", 10000))
+topic_embeddings = OrderedDict()
+topic_embeddings_lock = threading.Lock()
+query_embedding_cache = PersistentCache("query_embeddings", max_entries=max_topic_embeddings)
+
+
+def cached_topic_embedding(topic: str):
+    with topic_embeddings_lock:
+        vector = topic_embeddings.get(topic)
+        if vector is not None:
+            topic_embeddings.move_to_end(topic)
+        return vector
+
+
+def remember_topic_embedding(topic: str, vector):
+    with topic_embeddings_lock:
+        topic_embeddings[topic] = vector
+        topic_embeddings.move_to_end(topic)
+        while len(topic_embeddings) > max_topic_embeddings:
+            topic_embeddings.popitem(last=False)
+
+
+def get_topic_embedding(topic: str):
+    vector = cached_topic_embedding(topic)
+    if vector is not None:
+        return vector
+    key = content_key(embeddings.model, topic)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        with span("embedding", "topic_query"):
+            vector = embeddings.embed_query(topic)
+        query_embedding_cache.set(key, vector)
+    remember_topic_embedding(topic, vector)
+    return vector
+
+
+async def aget_topic_embedding(topic: str):
+    vector = cached_topic_embedding(topic)
+    if vector is not None:
+        return vector
+    key = content_key(embeddings.model, topic)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        with span("embedding", "topic_query"):
+            vector = await embeddings.aembed_query(topic)
+        query_embedding_cache.set(key, vector)
+    remember_topic_embedding(topic, vector)
+    return vector
+
+
+def warm_topic_embeddings():
+    # Load every Topic vector stored by the loader; embed the rest in one batch
+    # and write them back so the next start reads them straight from the graph
+    result = read_query(queries.topic_embeddings_query)
+    vectors = {}
+    missing = []
+    for record in result:
+        if record["embedding"] is not None:
+            vectors[record["name"]] = record["embedding"]
+            continue
+        cached = query_embedding_cache.get(content_key(embeddings.model, record["name"]))
+        if cached is not None:
+            vectors[record["name"]] = cached
+        missing.append(record["name"])
+
+    to_embed = [name for name in missing if name not in vectors]
+    if to_embed:
+        with span("embedding", "topic_documents"):
+            embedded = embeddings.embed_documents(to_embed)
+        for name, vector in zip(to_embed, embedded):
+            vectors[name] = vector
+            query_embedding_cache.set(content_key(embeddings.model, name), vector)
+    if missing:
+        write_query(
+            queries.set_topic_embeddings_query,
+            {"rows": [{"name": name, "embedding": vectors[name]} for name in missing]},
+        )
+    for name, vector in vectors.items():
+        remember_topic_embedding(name, vector)
+    print(f"Warmed {len(topic_embeddings)} topic embeddings ({len(to_embed)} newly embedded)")
+
+
+def level_description(level: str):
+    if (level == "Beginner"):
+        level = "middle schooler who is just starting to learn about the topic and wants to understand the basics"
+    elif (level == "Intermediate"):
+        level = "graduate student who has some knowledge about the topic and wants to learn more advanced concepts"
+    elif (level == "Expert"):
+        level = "Industry profession in the domain who is well-versed in the topic and wants to explore a deeper understanding"
+    return level
+
+
+def get_related_records(topic: str, before_date: str):
+    result = search_articles(topic, before_date, get_topic_embedding(topic))
+    result += random_articles(topic, before_date)
+    return result
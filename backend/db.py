@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from neo4j import AsyncGraphDatabase, GraphDatabase, READ_ACCESS, WRITE_ACCESS
+
+import queries
+from metrics import span
+
+load_dotenv()
+
+url = os.getenv("NEO4J_URI")
+username = os.getenv("NEO4J_USER")
+password = os.getenv("NEO4J_PASSWORD")
+database = os.getenv("NEO4J_DATABASE") or None
+
+# Pool settings; with a neo4j:// URI read transactions are routed to followers
+max_pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", 50))
+acquisition_timeout = float(os.getenv("NEO4J_POOL_ACQUISITION_TIMEOUT", 30))
+max_connection_lifetime = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", 3600))
+fetch_size = int(os.getenv("NEO4J_FETCH_SIZE", 1000))
+
+driver = GraphDatabase.driver(
+    url,
+    auth=(username, password),
+    max_connection_pool_size=max_pool_size,
+    connection_acquisition_timeout=acquisition_timeout,
+    max_connection_lifetime=max_connection_lifetime,
+)
+
+
+class PoolMetrics:
+    """Counts sessions in use and how long each waited for its connection.
+
+    The wait is measured from opening the session until the transaction
+    function starts, which covers pool acquisition and BEGIN.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.transactions = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self):
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def release(self, wait: float, attempts: int):
+        with self._lock:
+            self.in_use -= 1
+            self.transactions += 1
+            self.retries += max(attempts - 1, 0)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "max_pool_size": max_pool_size,
+                "transactions": self.transactions,
+                "retries": self.retries,
+                "avg_wait_ms": 1000 * self.total_wait / max(self.transactions, 1),
+                "max_wait_ms": 1000 * self.max_wait,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+# Span names for the Cypher constants in queries.py; ad hoc queries are "other"
+query_names = {value: name for name, value in vars(queries).items() if name.endswith("_query")}
+
+
+def run_query(query: str, params: dict = None, access_mode: str = WRITE_ACCESS):
+    start = time.perf_counter()
+    started = []
+
+    def work(tx):
+        started.append(time.perf_counter())
+        return tx.run(query, params or {}).data()
+
+    pool_metrics.acquire()
+    try:
+        with driver.session(database=database, default_access_mode=access_mode, fetch_size=fetch_size) as session:
+            if access_mode == READ_ACCESS:
+                return session.execute_read(work)
+            return session.execute_write(work)
+    finally:
+        wait = (started[0] if started else time.perf_counter()) - start
+        pool_metrics.release(wait, len(started))
+
+
+def read_query(query: str, params: dict = None):
+    with span("neo4j", query_names.get(query, "other")):
+        return run_query(query, params, READ_ACCESS)
+
+
+def write_query(query: str, params: dict = None):
+    with span("neo4j", query_names.get(query, "other")):
+        return run_query(query, params, WRITE_ACCESS)
+
+
+def get_job_state(name: str):
+    # Properties of the :JobState node a background job keeps its progress on
+    result = read_query(queries.job_state_query, {"name": name})
+    return result[0]["state"] if result else {}
+
+
+def set_job_state(name: str, state: dict):
+    write_query(queries.set_job_state_query, {"name": name, "state": state})
+
+
+# The async driver is only created when the ASGI app first needs it, since it
+# must be bound to the event loop that serves the requests
+async_driver = None
+
+
+def get_async_driver():
+    global async_driver
+    if async_driver is None:
+        async_driver = AsyncGraphDatabase.driver(
+            url,
+            auth=(username, password),
+            max_connection_pool_size=max_pool_size,
+            connection_acquisition_timeout=acquisition_timeout,
+            max_connection_lifetime=max_connection_lifetime,
+        )
+    return async_driver
+
+
+async def close_async_driver():
+    global async_driver
+    if async_driver is not None:
+        await async_driver.close()
+        async_driver = None
+
+
+async def arun_query(query: str, params: dict = None, access_mode: str = WRITE_ACCESS):
+    start = time.perf_counter()
+    started = []
+
+    async def work(tx):
+        started.append(time.perf_counter())
+        result = await tx.run(query, params or {})
+        return await result.data()
+
+    pool_metrics.acquire()
+    try:
+        async with get_async_driver().session(
+            database=database, default_access_mode=access_mode, fetch_size=fetch_size
+        ) as session:
+            if access_mode == READ_ACCESS:
+                return await session.execute_read(work)
+            return await session.execute_write(work)
+    finally:
+        wait = (started[0] if started else time.perf_counter()) - start
+        pool_metrics.release(wait, len(started))
+
+
+async def aread_query(query: str, params: dict = None):
+    with span("neo4j", query_names.get(query, "other")):
+        return await arun_query(query, params, READ_ACCESS)
+
+
+async def awrite_query(query: str, params: dict = None):
+    with span("neo4j", query_names.get(query, "other")):
+        return await arun_query(query, params, WRITE_ACCESS)
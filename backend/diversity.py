@@ -0,0 +1,52 @@
+import numpy as np
+
+from metrics import timed
+
+
+@timed("diversity", "max_min")
+def select_dissimilar_embeddings(embeddings: np.ndarray, k):
+    """Greedy Max-Min (farthest point) selection of k embeddings by cosine distance.
+
+    The first point is the one with the largest mean cosine distance to all
+    others. Each following point maximizes its distance to the closest point
+    selected so far. Ties go to the lowest index.
+
+    Runs in O(N*k*D) time with O(N) extra memory: the mean distances come from
+    the centroid of the normalized vectors, and a running min-distance array is
+    updated with one matrix-vector product per step. Pass float32 embeddings to
+    keep the products in float32.
+    """
+    # embeddings: numpy array of shape [N, D]
+    embeddings = np.asarray(embeddings)
+    if not np.issubdtype(embeddings.dtype, np.floating):
+        embeddings = embeddings.astype(np.float32)
+    N = embeddings.shape[0]
+    if k >= N:
+        return list(range(N))  # return all if k >= total nodes
+
+    norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))
+    inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    def distances_to(idx):
+        similarity = (embeddings @ embeddings[idx]) * inv_norms * inv_norms[idx]
+        return np.clip(1.0 - similarity, 0.0, 2.0)
+
+    # Mean cosine distance to all points: 1 - x_i . mean(x_j) for normalized x.
+    # A zero vector has distance 1 to everything except its own 0 on the diagonal.
+    centroid = (inv_norms @ embeddings) / N
+    mean_distances = 1.0 - (embeddings @ centroid) * inv_norms - (norms == 0) / N
+    first_idx = int(np.argmax(mean_distances))
+    selected = [first_idx]
+
+    # Distance from every candidate to its closest selected point
+    min_distances = distances_to(first_idx)
+    min_distances[first_idx] = -np.inf
+
+    for _ in range(k - 1):
+        # Pick the one with the largest min distance (most dissimilar from any selected)
+        next_idx = int(np.argmax(min_distances))
+        selected.append(next_idx)
+        np.minimum(min_distances, distances_to(next_idx), out=min_distances)
+        min_distances[selected] = -np.inf
+
+    return selected  # indices of selected embeddings
@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from langchain_ollama import OllamaEmbeddings
+from tqdm import tqdm
+
+load_dotenv()
+
+embedding_dimension = 768
+
+
+def article_texts(data: pd.DataFrame):
+    return (data["title"].fillna("") + " " + data["body"].fillna("")).tolist()
+
+
+def text_hash(text: str):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def read_checkpoint(path: str):
+    # Checkpoint lines are "<row>\t<text hash>", appended once a batch is flushed
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) == 2 and parts[0].isdigit():
+                    done[int(parts[0])] = parts[1]
+    return done
+
+
+def open_output(output: str, checkpoint: str, hashes: list):
+    """Open the embedding matrix for writing and return it with the rows already done.
+
+    If the matrix matches the CSV it is resumed in place. Otherwise (new
+    articles were added) a fresh matrix is started and every vector whose
+    text hash was embedded before is carried over from the previous one.
+    """
+    shape = (len(hashes), embedding_dimension)
+    previous = read_checkpoint(checkpoint)
+    if os.path.exists(output):
+        matrix = np.lib.format.open_memmap(output, mode="r+")
+        if matrix.shape == shape and matrix.dtype == np.float32:
+            done = {row for row, h in previous.items() if row < len(hashes) and hashes[row] == h}
+            return matrix, done
+        del matrix
+        os.replace(output, output + ".prev")
+        if os.path.exists(checkpoint):
+            os.replace(checkpoint, checkpoint + ".prev")
+
+    matrix = np.lib.format.open_memmap(output, mode="w+", dtype=np.float32, shape=shape)
+    done = set()
+    with open(checkpoint, "w", encoding="utf-8") as f:
+        if os.path.exists(output + ".prev"):
+            old_matrix = np.load(output + ".prev", mmap_mode="r")
+            old_rows = {
+                h: row for row, h in read_checkpoint(checkpoint + ".prev").items() if row < len(old_matrix)
+            }
+            for row, h in enumerate(hashes):
+                if h in old_rows:
+                    matrix[row] = old_matrix[old_rows[h]]
+                    done.add(row)
+            matrix.flush()
+            f.writelines(f"{row}\t{hashes[row]}\n" for row in sorted(done))
+            del old_matrix
+            os.remove(output + ".prev")
+            if os.path.exists(checkpoint + ".prev"):
+                os.remove(checkpoint + ".prev")
+    return matrix, done
+
+
+def embed_batch(embeddings: OllamaEmbeddings, texts: list, retries: int = 3):
+    for attempt in range(retries):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            print(f"Embedding batch failed ({e!r}), retrying")
+            time.sleep(2**attempt)
+
+
+def embed_articles(
+    data_path: str = "data.csv",
+    output: str = "embeddings.npy",
+    checkpoint: str = None,
+    batch_size: int = 32,
+    concurrency: int = 4,
+    model: str = "nomic-embed-text",
+    base_url: str = None,
+):
+    checkpoint = checkpoint or output + ".checkpoint"
+    data = pd.read_csv(data_path)
+    texts = article_texts(data)
+    hashes = [text_hash(text) for text in texts]
+    matrix, done = open_output(output, checkpoint, hashes)
+
+    # Identical texts are embedded once and copied to every row that has them
+    embedded = {hashes[row]: row for row in done}
+    pending = {}
+    reused = []
+    for row, h in enumerate(hashes):
+        if row in done:
+            continue
+        if h in embedded:
+            matrix[row] = matrix[embedded[h]]
+            reused.append(row)
+        else:
+            pending.setdefault(h, []).append(row)
+    if reused:
+        matrix.flush()
+        with open(checkpoint, "a", encoding="utf-8") as f:
+            f.writelines(f"{row}\t{hashes[row]}\n" for row in reused)
+        done.update(reused)
+    unique_hashes = list(pending)
+    print(f"{len(texts)} rows, {len(done)} already embedded, {len(unique_hashes)} unique texts to embed")
+
+    embeddings = OllamaEmbeddings(model=model, base_url=base_url)
+    failed = 0
+    start = time.perf_counter()
+    with open(checkpoint, "a", encoding="utf-8") as checkpoint_file, ThreadPoolExecutor(
+        max_workers=concurrency
+    ) as executor, tqdm(total=len(unique_hashes), desc="Embedding", unit="text") as progress:
+        futures = {}
+        for i in range(0, len(unique_hashes), batch_size):
+            batch = unique_hashes[i : i + batch_size]
+            batch_texts = [texts[pending[h][0]] for h in batch]
+            futures[executor.submit(embed_batch, embeddings, batch_texts)] = batch
+
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                vectors = np.asarray(future.result(), dtype=np.float32)
+            except Exception as e:
+                failed += len(batch)
+                print(f"Embedding batch failed: {e!r}")
+                continue
+            for h, vector in zip(batch, vectors):
+                matrix[pending[h]] = vector
+            # Flush vectors before recording them so a crash never checkpoints unwritten rows
+            matrix.flush()
+            checkpoint_file.writelines(f"{row}\t{h}\n" for h in batch for row in pending[h])
+            checkpoint_file.flush()
+            progress.update(len(batch))
+
+    elapsed = time.perf_counter() - start
+    embedded = len(unique_hashes) - failed
+    print(f"Embedded {embedded} texts in {elapsed:.1f}s ({embedded / max(elapsed, 1e-9):.1f} texts/s)")
+    if failed:
+        print(f"{failed} texts failed; rerun to resume from the checkpoint")
+    return failed
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Embed articles into a float32 matrix aligned with data.csv")
+    arg_parser.add_argument("--data", default="data.csv")
+    arg_parser.add_argument("--output", default="embeddings.npy")
+    arg_parser.add_argument("--checkpoint", default=None, help="defaults to <output>.checkpoint")
+    arg_parser.add_argument("--batch-size", type=int, default=32, help="texts per embed_documents call")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="embedding calls in flight")
+    arg_parser.add_argument("--model", default="nomic-embed-text")
+    arg_parser.add_argument("--base-url", default=os.getenv("OLLAMA_HOST"), help="Ollama server URL")
+    args = arg_parser.parse_args()
+
+    failed = embed_articles(
+        args.data,
+        args.output,
+        args.checkpoint,
+        args.batch_size,
+        args.concurrency,
+        args.model,
+        args.base_url,
+    )
+    sys.exit(1 if failed else 0)
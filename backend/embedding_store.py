@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+import queries
+from metrics import timed
+
+store_path = os.getenv("VECTOR_STORE_PATH", "vector_store")
+embedding_dimension = 768
+no_date = np.iinfo(np.int64).min
+
+
+def epoch_seconds(value):
+    # pubDate as seconds since the epoch; accepts ISO strings, datetimes and neo4j DateTimes
+    if value is None or value == "":
+        return None
+    if hasattr(value, "to_native"):
+        value = value.to_native()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+class EmbeddingStore:
+    """Append-only article vectors on disk, aligned with one metadata line per row.
+
+    vectors.f32 holds raw float32 rows and is memory-mapped; meta.jsonl holds
+    link, title, description, pubDate and topics. A row only exists once its
+    metadata line is complete, so a reader never sees a half-written vector.
+    Re-appending a link supersedes its previous row. Only link, topics and
+    dates are kept in memory; titles and descriptions are read back from
+    meta.jsonl by offset when a search returns the row.
+    """
+
+    def __init__(self, path: str = None, dim: int = embedding_dimension):
+        self.path = path or store_path
+        self.dim = dim
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.meta_path = os.path.join(self.path, "meta.jsonl")
+        self.links = []
+        self.offsets = []
+        self.lengths = []
+        self.pub_dates = np.empty(0, dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        self.topic_rows = {}  # topic -> list of rows
+        self.row_of = {}  # link -> newest row
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self._meta_end = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self.refresh()
+
+    def __len__(self):
+        return len(self.links)
+
+    def refresh(self):
+        """Pick up rows appended since the last call (by this or another process)."""
+        with self._lock:
+            if not os.path.exists(self.meta_path) or os.path.getsize(self.meta_path) == self._meta_end:
+                return 0
+            with open(self.meta_path, "rb") as f:
+                f.seek(self._meta_end)
+                chunk = f.read()
+            # Only complete lines are rows; a partial last line is still being written
+            chunk = chunk[: chunk.rfind(b"\n") + 1]
+            if not chunk:
+                return 0
+            start = len(self.links)
+            dates = []
+            offset = self._meta_end
+            alive = np.ones(len(self.links) + chunk.count(b"\n"), dtype=bool)
+            alive[: len(self.alive)] = self.alive
+            for line in chunk.splitlines(keepends=True):
+                meta = json.loads(line)
+                row = len(self.links)
+                if meta["link"] in self.row_of:
+                    alive[self.row_of[meta["link"]]] = False
+                self.row_of[meta["link"]] = row
+                self.links.append(meta["link"])
+                self.offsets.append(offset)
+                self.lengths.append(len(line))
+                offset += len(line)
+                dates.append(no_date if meta["pubDate"] is None else meta["pubDate"])
+                for topic in meta["topics"]:
+                    self.topic_rows.setdefault(topic, []).append(row)
+            self._meta_end = offset
+            self.pub_dates = np.concatenate([self.pub_dates, np.array(dates, dtype=np.int64)])
+            self.alive = alive
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.links), self.dim))
+            return len(self.links) - start
+
+    def append(self, rows):
+        """Append rows of {link, title, description, pubDate, topics, embedding}."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        self.refresh()
+        vectors = np.asarray([row["embedding"] for row in rows], dtype=np.float32).reshape(len(rows), self.dim)
+        with self._lock:
+            # Vectors first, truncating bytes a crashed writer left past the last row
+            mode = "r+b" if os.path.exists(self.vectors_path) else "w+b"
+            with open(self.vectors_path, mode) as f:
+                f.seek(len(self.links) * self.dim * 4)
+                f.write(vectors.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.meta_path, "ab") as f:
+                for row in rows:
+                    meta = {
+                        "link": row["link"],
+                        "title": row.get("title"),
+                        "description": row.get("description"),
+                        "pubDate": epoch_seconds(row.get("pubDate")),
+                        "topics": sorted(set(row.get("topics") or [])),
+                    }
+                    f.write((json.dumps(meta, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.refresh()
+        return len(rows)
+
+    def topic_mask(self, topic: str, n: int):
+        mask = np.zeros(n, dtype=bool)
+        rows = self.topic_rows.get(topic)
+        if rows:
+            rows = np.asarray(rows)
+            mask[rows[rows < n]] = True
+        return mask
+
+    def raw_record(self, row: int):
+        with open(self.meta_path, "rb") as f:
+            f.seek(self.offsets[row])
+            return json.loads(f.read(self.lengths[row]))
+
+    def record(self, row: int):
+        # Full metadata of a row, read from meta.jsonl
+        meta = self.raw_record(row)
+        if meta["pubDate"] is not None:
+            meta["pubDate"] = datetime.fromtimestamp(meta["pubDate"], tz=timezone.utc)
+        return meta
+
+    def is_current(self, row: dict):
+        # True when the newest row for the link already has this vector, date and topics
+        current = self.row_of.get(row["link"])
+        if current is None:
+            return False
+        meta = self.raw_record(current)
+        return (
+            meta["pubDate"] == epoch_seconds(row.get("pubDate"))
+            and meta["topics"] == sorted(set(row.get("topics") or []))
+            and np.array_equal(self.matrix[current], np.asarray(row["embedding"], dtype=np.float32))
+        )
+
+    def vectors_for(self, links):
+        # (matrix of the newest vector per link, list of links found)
+        rows = [self.row_of[link] for link in links if link in self.row_of]
+        found = [link for link in links if link in self.row_of]
+        return np.asarray(self.matrix[rows], dtype=np.float32), found
+
+
+store = None
+store_lock = threading.Lock()
+
+
+def get_store():
+    # The process-wide store, shared by the history endpoints and vector_index
+    global store
+    with store_lock:
+        if store is None:
+            store = EmbeddingStore()
+    return store
+
+
+@timed("embedding", "store")
+def stored_embeddings(records):
+    """(float32 matrix aligned with records, indices of the records the store lacks).
+
+    Rows the store holds are gathered straight from the memory map; the
+    others are left as zeros for fill_missing.
+    """
+    shared = get_store()
+    shared.refresh()
+    rows = [shared.row_of.get(record["link"]) for record in records]
+    found = [i for i, row in enumerate(rows) if row is not None]
+    matrix = np.zeros((len(records), shared.dim), dtype=np.float32)
+    if found:
+        matrix[found] = shared.matrix[[rows[i] for i in found]]
+    return matrix, [i for i, row in enumerate(rows) if row is None]
+
+
+def fill_missing(matrix: np.ndarray, records, missing, fetched):
+    vectors = {record["elementId"]: record["embedding"] for record in fetched}
+    for i in missing:
+        vector = vectors.get(records[i]["elementId"])
+        if vector is not None:
+            matrix[i] = vector
+    return matrix
+
+
+def article_embeddings(records):
+    # Vectors for records carrying elementId and link; only articles missing
+    # from the store are fetched over Bolt
+    matrix, missing = stored_embeddings(records)
+    if missing:
+        from db import read_query
+
+        element_ids = [records[i]["elementId"] for i in missing]
+        fetched = read_query(queries.article_embeddings_query, {"element_ids": element_ids})
+        fill_missing(matrix, records, missing, fetched)
+    return matrix
+
+
+async def aarticle_embeddings(records):
+    # The memory-map gather (and the store refresh) runs off the event loop
+    matrix, missing = await asyncio.to_thread(stored_embeddings, records)
+    if missing:
+        from db import aread_query
+
+        element_ids = [records[i]["elementId"] for i in missing]
+        fetched = await aread_query(queries.article_embeddings_query, {"element_ids": element_ids})
+        fill_missing(matrix, records, missing, fetched)
+    return matrix
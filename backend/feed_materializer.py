@@ -0,0 +1,232 @@
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import queries
+from chains import get_related_records, level_description, summarize_articles
+from db import aread_query, awrite_query, get_job_state, read_query, set_job_state, write_query
+from llm_gateway import priority
+
+load_dotenv()
+
+# Builds every subscriber's feeds ahead of time and stores them as :Feed nodes,
+# so /articles/topic and /articles/history answer with one read and only fall
+# back to vector search + LLM calls on a miss. Run once, or as a scheduler:
+#   python feed_materializer.py --before-date 2024-05-05 --incremental --interval 600
+# The LLM gateway only orders calls within one process, so a standalone
+# scheduler competes with the API for Ollama. With FEED_MATERIALIZER_INTERVAL
+# set, the API runs the scheduler on a thread of its own process instead, and
+# the builds queue behind interactive calls as the "background" class. With
+# several API workers on a host, only the one holding the lock file runs passes.
+
+job_name = "feed_materializer"
+scheduler_interval = float(os.getenv("FEED_MATERIALIZER_INTERVAL", 0))  # 0: not run by the API
+lock_path = os.getenv("FEED_MATERIALIZER_LOCK", "feed_materializer.lock")
+
+
+def topic_feed_key(topic: str, level: str, before_date: str):
+    return f"topic|{topic}|{level}|{before_date}"
+
+
+def history_feed_key(user_id: str, topic: str, level: str):
+    return f"history|{user_id}|{topic}|{level}"
+
+
+def read_feed(key: str):
+    # The stored article list, or None when the feed has not been materialized
+    result = read_query(queries.feed_query, {"key": key})
+    return json.loads(result[0]["articles"]) if result else None
+
+
+async def aread_feed(key: str):
+    result = await aread_query(queries.feed_query, {"key": key})
+    return json.loads(result[0]["articles"]) if result else None
+
+
+def invalidate_history_feeds(user_id: str, topic: str):
+    write_query(queries.delete_history_feeds_query, {"user_id": user_id, "topic": topic})
+
+
+async def ainvalidate_history_feeds(user_id: str, topic: str):
+    await awrite_query(queries.delete_history_feeds_query, {"user_id": user_id, "topic": topic})
+
+
+def store_feed(key: str, props: dict, articles: list):
+    # Feeds with a failed summary are dropped instead of stored, so the
+    # endpoint computes them live and the next run retries them
+    if any(article["summary"] is None for article in articles):
+        write_query(queries.delete_feed_query, {"key": key})
+        return False
+    write_query(queries.set_feed_query, {"key": key, "props": props, "articles": json.dumps(articles)})
+    return True
+
+
+def build_topic_feed(topic: str, level: str, before_date: str):
+    # Same articles and shape as ArticleTopicResource
+    records = get_related_records(topic, before_date)
+    with priority("background"):
+        articles = summarize_articles(records, topic, level_description(level))
+    props = {"kind": "topic", "topic": topic, "level": level, "beforeDate": before_date}
+    return store_feed(topic_feed_key(topic, level, before_date), props, articles)
+
+
+def build_history_feed(user_id: str, topic: str, level: str):
+    # Same articles and shape as HistoryResource.get. The version is read first,
+    # so a history write during the build leaves the feed stamped as stale
+    params = {"user_id": user_id, "topic": topic}
+    version = read_query(queries.history_version_query, params)
+    history = read_query(queries.history_articles_query, params)
+    with priority("background"):
+        articles = summarize_articles(history, topic, level)
+    props = {
+        "kind": "history",
+        "userId": user_id,
+        "topic": topic,
+        "level": level,
+        "historyVersion": version[0]["version"] if version else 0,
+    }
+    return store_feed(history_feed_key(user_id, topic, level), props, articles)
+
+
+def create_feed_constraint():
+    write_query("CREATE CONSTRAINT feed_key_unique IF NOT EXISTS FOR (f:Feed) REQUIRE f.key IS UNIQUE")
+
+
+def plan_feeds(before_date: str, incremental: bool):
+    """Return {feed key: (build function, args)} for the feeds this run rebuilds.
+
+    A full run rebuilds every subscriber's feeds. An incremental run only
+    rebuilds topic feeds of topics that gained articles since the last run,
+    plus any feed that is missing (new subscriptions, failed or invalidated feeds)
+    or built from an older history version than the user's current one.
+    """
+    since = get_job_state(job_name).get("lastRunAt") if incremental else None
+    changed = None
+    if since is not None:
+        changed = {record["topic"] for record in read_query(queries.changed_topics_query, {"since": since})}
+    existing = {record["key"] for record in read_query(queries.feed_keys_query)}
+
+    plan = {}
+    for record in read_query(queries.subscriptions_query):
+        user_id, topic, level = record["user_id"], record["topic"], record["level"]
+        key = topic_feed_key(topic, level, before_date)
+        if changed is None or topic in changed or key not in existing:
+            plan[key] = (build_topic_feed, (topic, level, before_date))
+        key = history_feed_key(user_id, topic, level)
+        if changed is None or key not in existing:
+            plan[key] = (build_history_feed, (user_id, topic, level))
+    return plan
+
+
+def materialize(before_date: str, incremental: bool = False, workers: int = 4):
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    plan = plan_feeds(before_date, incremental)
+    built = failed = 0
+    # Each build runs its own batch of LLM calls, so the pool bounds how many
+    # feeds are in flight at once; the LLM gateway bounds the calls themselves
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build, *args): key for key, (build, args) in plan.items()}
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"Building feed {futures[future]} failed: {e!r}")
+                ok = False
+            if ok:
+                built += 1
+            else:
+                failed += 1
+
+    elapsed = time.perf_counter() - start
+    set_job_state(
+        job_name,
+        {
+            "lastRunAt": started_at,
+            "lastRunSeconds": elapsed,
+            "feedsBuilt": built,
+            "feedsFailed": failed,
+            "incremental": incremental,
+        },
+    )
+    print(f"Materialized {built} feeds in {elapsed:.1f}s ({failed} failed, {'incremental' if incremental else 'full'} run)")
+    return built, failed
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def acquire_scheduler_lock():
+    # The open lock file when this process now owns the scheduler, else None.
+    # The lock is released by the OS when the owning process exits
+    lock_file = open(lock_path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def run_scheduler(before_date: str, interval: float, workers: int = 4):
+    # The first run is a full one when no previous run is recorded. Without a
+    # fixed before_date each pass builds the feeds for the day it runs on.
+    # Schedulers on one host share a lock file; the others check it every
+    # interval and take over when its owner exits
+    lock_file = None
+    while True:
+        start = time.perf_counter()
+        if lock_file is None:
+            lock_file = acquire_scheduler_lock()
+            if lock_file is not None:
+                print(f"Feed scheduler lock {lock_path} acquired by process {os.getpid()}")
+        if lock_file is not None:
+            try:
+                materialize(before_date or today(), incremental=True, workers=workers)
+            except Exception as e:
+                print(f"Feed materialization failed: {e!r}")
+        time.sleep(max(interval - (time.perf_counter() - start), 0))
+
+
+def start_scheduler(before_date: str = None, interval: float = scheduler_interval, workers: int = 4):
+    # The scheduler on a daemon thread of the API process, sharing its LLM gateway
+    before_date = before_date or os.getenv("FEED_MATERIALIZER_BEFORE_DATE")
+
+    def run():
+        try:
+            create_feed_constraint()
+        except Exception as e:
+            print(f"Could not create the feed constraint: {e!r}")
+        run_scheduler(before_date, interval, workers)
+
+    thread = threading.Thread(target=run, name="feed-materializer", daemon=True)
+    thread.start()
+    print(f"Materializing feeds for {before_date or 'the current day'} every {interval:.0f}s in the background")
+    return thread
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Precompute subscriber feeds into :Feed nodes")
+    arg_parser.add_argument(
+        "--before-date",
+        default=None,
+        help="before_date the topic feeds are built for (YYYY-MM-DD, default: the day of each run)",
+    )
+    arg_parser.add_argument("--incremental", action="store_true", help="only rebuild topics with new articles")
+    arg_parser.add_argument("--interval", type=float, default=None, help="rerun incrementally every N seconds")
+    arg_parser.add_argument("--workers", type=int, default=4, help="feeds built concurrently")
+    args = arg_parser.parse_args()
+
+    create_feed_constraint()
+    if args.interval:
+        run_scheduler(args.before_date, args.interval, args.workers)
+    else:
+        materialize(args.before_date or today(), args.incremental, args.workers)
@@ -0,0 +1,241 @@
+import argparse
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+import queries
+
+load_dotenv()
+
+# Topic similarity and CELF topic seeds without the GDS plugin. Reads the
+# Article-Topic RELATED_TO edges once into a sparse topics x articles matrix and
+# writes the same SIMILAR.score and Topic.celfSpread properties the API reads:
+#   python graph_engine.py --workers 4
+# neo4j_graph_calc.py --engine local uses it for the seeds as well.
+
+job_name = "graph_engine"
+workers = int(os.getenv("GRAPH_ENGINE_WORKERS", os.cpu_count() or 1))
+write_batch_size = 500
+gain_chunk_nodes = 4096
+
+edges_query = """
+MATCH (a:Article)-[:RELATED_TO]->(t:Topic)
+RETURN elementId(a) AS article, t.name AS topic
+"""
+
+topic_names_query = """
+MATCH (t:Topic)
+RETURN t.name AS topic
+"""
+
+# One row per topic: its outgoing SIMILAR edges are replaced by row.similar
+write_similar_query = """
+UNWIND $rows AS row
+MATCH (t:Topic {name: row.topic})
+OPTIONAL MATCH (t)-[old:SIMILAR]->()
+DELETE old
+WITH DISTINCT t, row
+UNWIND row.similar AS pair
+MATCH (other:Topic {name: pair.other})
+MERGE (t)-[s:SIMILAR]->(other)
+SET s.score = pair.score
+"""
+
+# Like gds.influenceMaximization.celf.write: seeds get their marginal spread, every other topic 0
+write_seeds_query = """
+MATCH (t:Topic)
+WHERE t.celfSpread IS NOT NULL AND t.celfSpread <> 0 AND NOT t.name IN [seed IN $seeds | seed.name]
+SET t.celfSpread = 0
+WITH count(*) AS reset
+UNWIND $seeds AS seed
+MATCH (t:Topic {name: seed.name})
+SET t.celfSpread = seed.spread
+"""
+
+
+def bipartite_matrix(pairs, topics=None):
+    """(topics x articles CSR matrix of RELATED_TO edges, topic names by row).
+
+    pairs are (article id, topic name); topics adds topics without articles.
+    """
+    topic_index = {name: i for i, name in enumerate(topics or [])}
+    article_index = {}
+    rows, cols = [], []
+    for article, topic in pairs:
+        rows.append(topic_index.setdefault(topic, len(topic_index)))
+        cols.append(article_index.setdefault(article, len(article_index)))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(topic_index), len(article_index))
+    )
+    # Duplicate pairs were summed; an edge counts once
+    matrix.data[:] = 1
+    return matrix, list(topic_index)
+
+
+def read_bipartite():
+    from db import read_query
+
+    topics = [record["topic"] for record in read_query(topic_names_query)]
+    records = read_query(edges_query)
+    return bipartite_matrix(((record["article"], record["topic"]) for record in records), topics)
+
+
+def topic_jaccard(matrix, top_k: int = 10):
+    """(rows, cols, scores) of each topic's top_k most similar topics by article Jaccard."""
+    shared = (matrix @ matrix.T).tocoo()
+    off_diagonal = shared.row != shared.col
+    rows, cols, counts = shared.row[off_diagonal], shared.col[off_diagonal], shared.data[off_diagonal]
+    degrees = np.asarray(matrix.sum(axis=1)).ravel()
+    scores = counts / (degrees[rows] + degrees[cols] - counts)
+    # Per row by descending score (ties by column), then keep the first top_k
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left")
+    keep = rank < top_k
+    return rows[keep], cols[keep], scores[keep]
+
+
+def node_edges(matrix):
+    # Edges of the undirected article-topic graph; topics are nodes 0..T-1, articles follow
+    coo = matrix.tocoo()
+    return coo.row, coo.col + matrix.shape[0], matrix.shape[0] + matrix.shape[1]
+
+
+def sample_labels(u, v, n: int, probability: float, seed, simulations: int):
+    # Component labels of `simulations` live-edge graphs, one row per simulation
+    rng = np.random.default_rng(seed)
+    labels = np.empty((simulations, n), dtype=np.int32)
+    for s in range(simulations):
+        live = rng.random(len(u)) < probability
+        graph = sparse.coo_matrix((np.ones(live.sum(), dtype=np.int8), (u[live], v[live])), shape=(n, n))
+        _, labels[s] = connected_components(graph, directed=False)
+    return labels
+
+
+def live_edge_components(matrix, simulations: int = 100, probability: float = 0.1, seed: int = 0, workers: int = workers):
+    """Monte Carlo independent-cascade samples as connected components.
+
+    An IC cascade tries each edge at most once, so its spread from a seed set
+    is the number of nodes reachable from the seeds in a random graph keeping
+    each edge with `probability`. Returns (labels, sizes): labels[node, s] is
+    the node's component in simulation s, numbered across all simulations,
+    and sizes[c] the size of component c.
+    """
+    u, v, n = node_edges(matrix)
+    chunks = [len(part) for part in np.array_split(np.arange(simulations), max(1, min(workers, simulations)))]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    if len(chunks) == 1:
+        parts = [sample_labels(u, v, n, probability, seeds[0], chunks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            parts = list(
+                executor.map(sample_labels, *zip(*((u, v, n, probability, s, c) for s, c in zip(seeds, chunks))))
+            )
+    labels = np.concatenate(parts)
+    counts = [np.bincount(row) for row in labels]
+    offsets = np.cumsum([0] + [len(c) for c in counts[:-1]])
+    labels += offsets[:, None].astype(np.int32)
+    return np.ascontiguousarray(labels.T), np.concatenate(counts)
+
+
+def celf(labels: np.ndarray, sizes: np.ndarray, seed_size: int = 10):
+    """Lazy-greedy (CELF) seed selection over live-edge samples.
+
+    Returns [(node, marginal spread)] in selection order. A node's marginal
+    spread is the mean size of its components not yet covered by a seed.
+    """
+    n = labels.shape[0]
+    covered = np.zeros(len(sizes), dtype=bool)
+    gains = np.empty(n)
+    for start in range(0, n, gain_chunk_nodes):
+        gains[start : start + gain_chunk_nodes] = sizes[labels[start : start + gain_chunk_nodes]].mean(axis=1)
+    heap = [(-gain, node, 0) for node, gain in enumerate(gains)]
+    heapq.heapify(heap)
+    seeds = []
+    while heap and len(seeds) < seed_size:
+        neg_gain, node, evaluated_at = heapq.heappop(heap)
+        if evaluated_at == len(seeds):
+            seeds.append((node, float(-neg_gain)))
+            covered[labels[node]] = True
+            continue
+        components = labels[node]
+        gain = float((sizes[components] * ~covered[components]).mean())
+        heapq.heappush(heap, (-gain, node, len(seeds)))
+    return seeds
+
+
+def compute_seeds(matrix, seed_size: int = 10, simulations: int = 100, probability: float = 0.1, seed: int = 0, workers: int = workers):
+    labels, sizes = live_edge_components(matrix, simulations, probability, seed, workers)
+    return celf(labels, sizes, seed_size)
+
+
+def write_similarity(matrix, topics: list, top_k: int = 10):
+    from db import write_query
+
+    rows, cols, scores = topic_jaccard(matrix, top_k)
+    similar = {name: [] for name in topics}
+    for row, col, score in zip(rows, cols, scores):
+        similar[topics[row]].append({"other": topics[col], "score": float(score)})
+    payload = [{"topic": name, "similar": pairs} for name, pairs in similar.items()]
+    for start in range(0, len(payload), write_batch_size):
+        write_query(write_similar_query, {"rows": payload[start : start + write_batch_size]})
+    return len(rows)
+
+
+def write_seeds(seeds, topics: list):
+    # Only topic seeds are read by the API; article seeds still count towards the set
+    from db import write_query
+
+    topic_seeds = [{"name": topics[node], "spread": spread} for node, spread in seeds if node < len(topics)]
+    write_query(write_seeds_query, {"seeds": topic_seeds})
+    return topic_seeds
+
+
+def run(similarity: bool = True, seeds: bool = True, top_k: int = 10, seed_size: int = 10,
+        simulations: int = 100, probability: float = 0.1, workers: int = workers):
+    from db import set_job_state, write_query
+
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    matrix, topics = read_bipartite()
+    state = {"lastRunAt": started_at, "readSeconds": time.perf_counter() - start,
+             "topics": matrix.shape[0], "articles": matrix.shape[1], "edges": matrix.nnz}
+    print(f"Read {matrix.nnz} RELATED_TO edges ({matrix.shape[0]} topics, {matrix.shape[1]} articles) "
+          f"in {state['readSeconds']:.1f}s")
+    if similarity:
+        start = time.perf_counter()
+        state["similarWritten"] = write_similarity(matrix, topics, top_k)
+        state["similaritySeconds"] = time.perf_counter() - start
+        print(f"Wrote {state['similarWritten']} SIMILAR edges in {state['similaritySeconds']:.1f}s")
+    if seeds:
+        start = time.perf_counter()
+        topic_seeds = write_seeds(compute_seeds(matrix, seed_size, simulations, probability, workers=workers), topics)
+        state["lastCelfAt"] = started_at
+        state["celfSeconds"] = time.perf_counter() - start
+        print(f"Wrote {len(topic_seeds)} topic seeds of {seed_size} in {state['celfSeconds']:.1f}s")
+    if similarity or seeds:
+        write_query(queries.bump_graph_generation_query)
+    set_job_state(job_name, state)
+    return state
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compute SIMILAR edges and CELF seeds without GDS")
+    arg_parser.add_argument("--skip-similarity", action="store_true", help="leave SIMILAR edges untouched")
+    arg_parser.add_argument("--skip-seeds", action="store_true", help="leave celfSpread untouched")
+    arg_parser.add_argument("--top-k", type=int, default=10, help="SIMILAR edges kept per topic")
+    arg_parser.add_argument("--seed-size", type=int, default=10, help="CELF seed set size")
+    arg_parser.add_argument("--simulations", type=int, default=100, help="Monte Carlo cascades")
+    arg_parser.add_argument("--probability", type=float, default=0.1, help="cascade propagation probability")
+    arg_parser.add_argument("--workers", type=int, default=workers, help="processes sampling cascades")
+    args = arg_parser.parse_args()
+
+    run(not args.skip_similarity, not args.skip_seeds, args.top_k, args.seed_size,
+        args.simulations, args.probability, args.workers)
@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from langchain_core.runnables import RunnableLambda
+
+from metrics import observe, span
+
+# Admission control in front of Ollama. Every chain calls the model through
+# gateway.wrap(llm), which lets at most LLM_GATEWAY_CONCURRENCY calls run at
+# once and queues the rest by priority class: interactive feeds first, then
+# meta-summaries, then background precompute. A call whose class has a
+# latency budget is shed with LLMOverloaded when its expected or actual queue
+# wait exceeds the budget; the summarizer turns that into an article without
+# a summary, the meta-summary endpoint into a 503.
+
+priority_classes = ["interactive", "meta_summary", "background"]
+concurrency = int(os.getenv("LLM_GATEWAY_CONCURRENCY", 4))
+# Seconds a call may wait for a slot; background calls always wait
+budgets = {
+    "interactive": float(os.getenv("LLM_BUDGET_INTERACTIVE", 15)),
+    "meta_summary": float(os.getenv("LLM_BUDGET_META_SUMMARY", 60)),
+    "background": None,
+}
+
+current_priority = contextvars.ContextVar("llm_priority", default="interactive")
+
+
+class LLMOverloaded(Exception):
+    def __init__(self, priority: str, wait: float):
+        super().__init__(f"LLM queue wait of {wait:.1f}s exceeds the {priority} budget")
+        self.priority = priority
+        self.wait = wait
+
+
+@contextlib.contextmanager
+def priority(name: str):
+    # LLM calls made inside the block (including batch threads and tasks it starts) use this class
+    token = current_priority.set(name)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class Waiter:
+    def __init__(self, priority: str, loop=None):
+        self.priority = priority
+        self.loop = loop
+        self.event = threading.Event() if loop is None else loop.create_future()
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(wake_future, self.event)
+
+
+def wake_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMGateway:
+    def __init__(self, concurrency: int = concurrency, budgets: dict = budgets, window: int = 1000):
+        self.concurrency = concurrency
+        self.budgets = budgets
+        self.in_flight = 0
+        self.queue = []  # (class rank, arrival, waiter); cancelled waiters are skipped when popped
+        self.arrivals = itertools.count()
+        # Smoothed seconds per call, for the expected wait of a new arrival
+        self.service_seconds = None
+        self.stats = {
+            name: {"queued": 0, "admitted": 0, "shed": 0, "waits": deque(maxlen=window), "max_wait": 0.0}
+            for name in priority_classes
+        }
+        self._lock = threading.Lock()
+
+    def expected_wait(self, name: str):
+        # Calls queued at this class or above go first, concurrency at a time
+        if self.service_seconds is None:
+            return 0.0
+        rank = priority_classes.index(name)
+        ahead = sum(self.stats[other]["queued"] for other in priority_classes[: rank + 1])
+        return (ahead + 1) * self.service_seconds / self.concurrency
+
+    def admit(self, name: str, loop=None):
+        # None when a slot is free now, else a queued Waiter; raises LLMOverloaded to shed
+        with self._lock:
+            if self.in_flight < self.concurrency and not any(stats["queued"] for stats in self.stats.values()):
+                self.in_flight += 1
+                self.admitted(name, 0.0)
+                return None
+            budget = self.budgets.get(name)
+            expected = self.expected_wait(name)
+            if budget is not None and expected > budget:
+                self.stats[name]["shed"] += 1
+                raise LLMOverloaded(name, expected)
+            waiter = Waiter(name, loop)
+            heapq.heappush(self.queue, (priority_classes.index(name), next(self.arrivals), waiter))
+            self.stats[name]["queued"] += 1
+            return waiter
+
+    def admitted(self, name: str, wait: float):
+        stats = self.stats[name]
+        stats["admitted"] += 1
+        stats["waits"].append(wait)
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def withdraw(self, waiter: Waiter):
+        # True if the waiter gave up its place; False if it was granted a slot meanwhile
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            self.stats[waiter.priority]["queued"] -= 1
+            return True
+
+    def shed(self, name: str, wait: float):
+        with self._lock:
+            self.stats[name]["shed"] += 1
+        return LLMOverloaded(name, wait)
+
+    def release(self, seconds: float = None):
+        # seconds is how long the call took; None for a slot returned unused
+        with self._lock:
+            if seconds is not None:
+                previous = self.service_seconds
+                self.service_seconds = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+            while self.queue:
+                _, _, waiter = heapq.heappop(self.queue)
+                if waiter.cancelled:
+                    continue
+                # The slot passes straight to the waiter
+                waiter.granted = True
+                self.stats[waiter.priority]["queued"] -= 1
+                waiter.wake()
+                return
+            self.in_flight -= 1
+
+    @contextlib.contextmanager
+    def slot(self, name: str = None):
+        name = name or current_priority.get()
+        start = time.perf_counter()
+        waiter = self.admit(name)
+        if waiter is not None:
+            waiter.event.wait(self.budgets.get(name))
+            if self.withdraw(waiter):
+                raise self.shed(name, time.perf_counter() - start)
+            with self._lock:
+                self.admitted(name, time.perf_counter() - start)
+        called = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - called)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, name: str = None):
+        name = name or current_priority.get()
+        start = time.perf_counter()
+        waiter = self.admit(name, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.event), self.budgets.get(name))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                if not self.withdraw(waiter):
+                    self.release()
+                raise
+            if self.withdraw(waiter):
+                raise self.shed(name, time.perf_counter() - start)
+            with self._lock:
+                self.admitted(name, time.perf_counter() - start)
+        called = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - called)
+
+    def wrap(self, model):
+        # The model as a runnable whose calls each hold a slot
+        # Spans: llm_queue for the wait for a slot, llm for the call, both named by priority class
+        def invoke(input, config):
+            name, start = current_priority.get(), time.perf_counter()
+            with self.slot(name):
+                observe("llm_queue", name, time.perf_counter() - start)
+                with span("llm", name):
+                    return model.invoke(input, config)
+
+        async def ainvoke(input, config):
+            name, start = current_priority.get(), time.perf_counter()
+            async with self.aslot(name):
+                observe("llm_queue", name, time.perf_counter() - start)
+                with span("llm", name):
+                    return await model.ainvoke(input, config)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"gateway({model.get_name()})")
+
+    def snapshot(self):
+        with self._lock:
+            classes = {}
+            for name, stats in self.stats.items():
+                waits = sorted(stats["waits"])
+                classes[name] = {
+                    "queued": stats["queued"],
+                    "admitted": stats["admitted"],
+                    "shed": stats["shed"],
+                    "budget_s": self.budgets.get(name),
+                    "p50_wait_ms": 1000 * waits[len(waits) // 2] if waits else 0.0,
+                    "p95_wait_ms": 1000 * waits[int(len(waits) * 0.95)] if waits else 0.0,
+                    "max_wait_ms": 1000 * stats["max_wait"],
+                }
+            return {
+                "in_flight": self.in_flight,
+                "concurrency": self.concurrency,
+                "queue_depth": sum(stats["queued"] for stats in self.stats.values()),
+                "service_ms": 1000 * self.service_seconds if self.service_seconds is not None else None,
+                "classes": classes,
+            }
+
+
+gateway = LLMGateway()
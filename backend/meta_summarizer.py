@@ -0,0 +1,179 @@
+import re
+import time
+
+from cache import content_key
+
+
+def estimate_tokens(text: str):
+    # Roughly four characters per token for English text with Mistral's tokenizer
+    return len(text) // 4 + 1
+
+
+def split_summaries(combined):
+    # The frontend sends the article summaries joined by blank lines
+    if isinstance(combined, list):
+        parts = combined
+    else:
+        parts = re.split(r"\n\s*\n", combined)
+    return [part.strip() for part in parts if part and part.strip()]
+
+
+class MetaSummarizer:
+    """Map-reduce summarization of many summaries into one.
+
+    The summaries are packed into chunks of at most `chunk_tokens` estimated
+    tokens, every chunk is summarized by the chain (at most `max_concurrency`
+    calls in flight), and the chunk summaries are packed and summarized again
+    until one chunk is left; its summary is the result. Input that fits one
+    chunk takes a single call, as before.
+
+    Chunk summaries are cached by content hash. Chunks also close after any
+    summary whose hash ends a block (content-defined boundaries), so a
+    summary added to or dropped from a request only changes the chunk it
+    falls in and the others are served from the cache.
+    """
+
+    def __init__(self, chain, cache=None, fingerprint: str = "", chunk_tokens: int = 1500,
+                 max_concurrency: int = 4, boundary_every: int = 8):
+        self.chain = chain
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.boundary_every = boundary_every
+
+    def chunk(self, texts):
+        chunks, current, used = [], [], 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if tokens > self.chunk_tokens:
+                # A single oversized text is cut to the budget rather than overflowing the context
+                text = text[: self.chunk_tokens * 4]
+                tokens = self.chunk_tokens
+            if current and used + tokens > self.chunk_tokens:
+                chunks.append("\n\n".join(current))
+                current, used = [], 0
+            current.append(text)
+            used += tokens
+            if int(content_key(text)[:8], 16) % self.boundary_every == 0:
+                chunks.append("\n\n".join(current))
+                current, used = [], 0
+        if current:
+            chunks.append("\n\n".join(current))
+        return chunks
+
+    def next_chunks(self, texts):
+        if sum(estimate_tokens(text) for text in texts) <= self.chunk_tokens:
+            return ["\n\n".join(texts)]
+        chunks = self.chunk(texts)
+        if len(texts) > 1 and len(chunks) >= len(texts):
+            # Boundaries split every text off; pair them up so each level shrinks
+            chunks = ["\n\n".join(texts[i : i + 2]) for i in range(0, len(texts), 2)]
+        return chunks
+
+    def cache_key(self, chunk: str, topic: str, role: str):
+        return content_key(chunk, topic, role, self.fingerprint)
+
+    def lookup(self, chunks, topic: str, role: str):
+        # (summaries by chunk index for cache hits, {cache key: chunk indices} for misses)
+        done, pending = {}, {}
+        for i, chunk in enumerate(chunks):
+            key = self.cache_key(chunk, topic, role)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                done[i] = cached
+            else:
+                pending.setdefault(key, []).append(i)
+        return done, pending
+
+    def chain_input(self, chunk: str, topic: str, role: str):
+        return {"summaries": chunk, "topic": topic, "role": role}
+
+    def resolve(self, done, pending, keys, responses, stage):
+        failure = None
+        for key, response in zip(keys, responses):
+            if isinstance(response, Exception) or not getattr(response, "content", None):
+                print(f"Meta-summary chunk failed in {stage['stage']}: {response!r}")
+                failure = failure or response
+                continue
+            usage = getattr(response, "usage_metadata", None) or {}
+            stage["output_tokens"] += usage.get("output_tokens") or estimate_tokens(response.content)
+            if self.cache is not None:
+                self.cache.set(key, response.content)
+            for i in pending[key]:
+                done[i] = response.content
+        return failure
+
+    def stage_result(self, chunks, done, failure, stage, stages, start):
+        stage["seconds"] = time.perf_counter() - start
+        stages.append(stage)
+        print(
+            f"Meta-summary {stage['stage']}: {stage['chunks']} chunks ({stage['cached']} cached), "
+            f"{stage['input_tokens']} input / {stage['output_tokens']} output tokens, {stage['seconds']:.2f}s"
+        )
+        if not done:
+            raise failure or RuntimeError("Meta-summary produced no text")
+        # Failed chunks drop out of the next level
+        return [done[i] for i in range(len(chunks)) if i in done]
+
+    def new_stage(self, level: int, chunks, done):
+        return {
+            "stage": "map" if level == 0 else f"reduce-{level}",
+            "chunks": len(chunks),
+            "cached": len(done),
+            "input_tokens": sum(estimate_tokens(chunk) for i, chunk in enumerate(chunks) if i not in done),
+            "output_tokens": 0,
+        }
+
+    def summarize(self, summaries, topic: str, role: str):
+        """(summary text, per-stage stats) for a list of summaries or a blank-line joined string."""
+        texts, stages, level = split_summaries(summaries), [], 0
+        if not texts:
+            return "", stages
+        while True:
+            start = time.perf_counter()
+            chunks = self.next_chunks(texts)
+            done, pending = self.lookup(chunks, topic, role)
+            stage = self.new_stage(level, chunks, done)
+            keys = list(pending)
+            responses = self.chain.batch(
+                [self.chain_input(chunks[pending[key][0]], topic, role) for key in keys],
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True,
+            ) if keys else []
+            failure = self.resolve(done, pending, keys, responses, stage)
+            texts = self.stage_result(chunks, done, failure, stage, stages, start)
+            if len(texts) == 1:
+                return texts[0], stages
+            level += 1
+
+    async def asummarize(self, summaries, topic: str, role: str):
+        # Async twin of summarize, driving the chain with abatch
+        texts, stages, level = split_summaries(summaries), [], 0
+        if not texts:
+            return "", stages
+        while True:
+            start = time.perf_counter()
+            chunks = self.next_chunks(texts)
+            done, pending = self.lookup(chunks, topic, role)
+            stage = self.new_stage(level, chunks, done)
+            keys = list(pending)
+            responses = await self.chain.abatch(
+                [self.chain_input(chunks[pending[key][0]], topic, role) for key in keys],
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True,
+            ) if keys else []
+            failure = self.resolve(done, pending, keys, responses, stage)
+            texts = self.stage_result(chunks, done, failure, stage, stages, start)
+            if len(texts) == 1:
+                return texts[0], stages
+            level += 1
+
+
+def server_timing(stages):
+    # Server-Timing header value, so the browser's network panel shows each stage
+    return ", ".join(
+        f'{stage["stage"]};dur={stage["seconds"] * 1000:.0f};desc="{stage["chunks"]} chunks, '
+        f'{stage["input_tokens"]} in / {stage["output_tokens"]} out tokens"'
+        for stage in stages
+    )
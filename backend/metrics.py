@@ -0,0 +1,108 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+# Timing spans on the request path, exported as Prometheus histograms on
+# /metrics. Each Neo4j query, embedding lookup, diversity selection and LLM
+# call is a span of some kind (neo4j, embedding, diversity, llm, llm_queue)
+# and name (the query constant, the chain's priority class, ...). The spans
+# of one request are also added up on its Trace, and a request slower than
+# SLOW_REQUEST_SECONDS is printed with that breakdown (0 turns it off).
+
+slow_request_seconds = float(os.getenv("SLOW_REQUEST_SECONDS", 0))
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+content_type = CONTENT_TYPE_LATEST
+
+span_seconds = Histogram(
+    "historical_news_span_seconds", "Seconds spent in one step of a request", ["kind", "name"], buckets=buckets
+)
+request_seconds = Histogram(
+    "historical_news_request_seconds", "Seconds to serve an HTTP request", ["method", "route", "status"], buckets=buckets
+)
+
+current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class Trace:
+    """Span totals of one request; spans may finish on batch threads and tasks."""
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.start = time.perf_counter()
+        self.spans = {}  # (kind, name) -> [count, seconds]
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, seconds: float):
+        with self._lock:
+            totals = self.spans.setdefault((kind, name), [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def breakdown(self):
+        # Slowest first, e.g. "llm:interactive 5x 4210ms, neo4j:history_candidates_query 1x 35ms"
+        with self._lock:
+            spans = sorted(self.spans.items(), key=lambda item: item[1][1], reverse=True)
+        return ", ".join(f"{kind}:{name} {count}x {seconds * 1000:.0f}ms" for (kind, name), (count, seconds) in spans)
+
+
+def observe(kind: str, name: str, seconds: float):
+    span_seconds.labels(kind, name).observe(seconds)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, seconds)
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(kind, name, time.perf_counter() - start)
+
+
+def timed(kind: str, name: str):
+    # Decorator form of span, for plain and async functions
+    def decorate(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with span(kind, name):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with span(kind, name):
+                    return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def begin_request(method: str, route: str):
+    # route is the URL rule ("/topic/<string:topic_name>"), not the path, to keep the label set small
+    trace = Trace(method, route)
+    current_trace.set(trace)
+    return trace
+
+
+def end_request(trace: Trace, status: int):
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    seconds = time.perf_counter() - trace.start
+    request_seconds.labels(trace.method, trace.route, str(status)).observe(seconds)
+    if slow_request_seconds and seconds >= slow_request_seconds:
+        print(f"Slow request: {trace.method} {trace.route} {status} in {seconds * 1000:.0f}ms ({trace.breakdown() or 'no spans'})")
+
+
+def render():
+    return generate_latest()
@@ -1,63 +1,242 @@
+import argparse
 import os
-import pandas as pd
+import time
+from datetime import datetime, timezone
+
 from dotenv import load_dotenv
-from langchain_neo4j import Neo4jGraph
+
+import queries
+from db import get_job_state, read_query, set_job_state, write_query
 
 load_dotenv()
 
-url = os.getenv("NEO4J_URI")
-username = os.getenv("NEO4J_USER")
-password = os.getenv("NEO4J_PASSWORD")
+# Topic similarity (SIMILAR edges, used by /topic/<name>) and topic seeds
+# (celfSpread, used by /topic/get_seed). Run once after a load, or as a scheduler:
+#   python neo4j_graph_calc.py --interval 600 --celf-interval 86400
+# Each run recomputes SIMILAR edges only for topics that gained articles since
+# the previous run (all topics on the first run or with --full). CELF needs
+# the whole graph, so it runs on its own, slower schedule in a projection
+# that is replaced before and dropped after every run. With --engine local
+# (or GRAPH_ENGINE=local) CELF runs in graph_engine.py instead of GDS.
+
+job_name = "graph_analytics"
+graph_name = "newsGraph"
+engine = os.getenv("GRAPH_ENGINE", "gds")
+topic_batch_size = 50
+
+all_topic_names_query = """
+MATCH (t:Topic)
+RETURN t.name AS topic
+"""
 
-neo4j_graph = Neo4jGraph(
-    url=url, username=username, password=password, refresh_schema=False
+# Jaccard similarity of the topics' article sets, keeping each topic's top_k
+# most similar topics as outgoing SIMILAR edges (what gds.nodeSimilarity writes)
+refresh_similar_query = """
+UNWIND $topics AS name
+MATCH (t:Topic {name: name})
+OPTIONAL MATCH (t)-[old:SIMILAR]->()
+DELETE old
+WITH DISTINCT t
+MATCH (t)<-[:RELATED_TO]-(a:Article)-[:RELATED_TO]->(other:Topic)
+WHERE other <> t
+WITH t, other, count(DISTINCT a) AS shared
+WITH t, other, shared,
+     COUNT { (t)<-[:RELATED_TO]-(:Article) } AS t_articles,
+     COUNT { (other)<-[:RELATED_TO]-(:Article) } AS other_articles
+WITH t, other, toFloat(shared) / (t_articles + other_articles - shared) AS score
+ORDER BY score DESC
+WITH t, collect({other: other, score: score})[..$top_k] AS top
+UNWIND top AS pair
+WITH t, pair.other AS other, pair.score AS score
+MERGE (t)-[s:SIMILAR]->(other)
+SET s.score = score
+RETURN count(s) AS written
+"""
+
+# A changed topic's article count changes the score of edges pointing at it
+# from unchanged topics. Those are rescored in place; which topics make an
+# unchanged topic's top_k is only revisited by a --full run.
+rescore_similar_query = """
+UNWIND $topics AS name
+MATCH (other:Topic)-[s:SIMILAR]->(t:Topic {name: name})
+WHERE NOT other.name IN $topics
+WITH other, t, s,
+     COUNT { (other)<-[:RELATED_TO]-(:Article)-[:RELATED_TO]->(t) } AS shared,
+     COUNT { (other)<-[:RELATED_TO]-(:Article) } AS other_articles,
+     COUNT { (t)<-[:RELATED_TO]-(:Article) } AS t_articles
+SET s.score = toFloat(shared) / (t_articles + other_articles - shared)
+RETURN count(s) AS rescored
+"""
+
+drop_graph_query = """
+CALL gds.graph.drop($graphName, false)
+YIELD graphName
+RETURN graphName
+"""
+
+project_graph_query = """
+CALL gds.graph.project(
+    $graphName,
+    ['Article', 'Topic', 'Channel'],
+    {
+        RELATED_TO: {type: 'RELATED_TO', orientation: 'UNDIRECTED'},
+        COMES_FROM: {type: 'COMES_FROM', orientation: 'UNDIRECTED'}
+    }
 )
+YIELD graphName, nodeCount, relationshipCount
+RETURN nodeCount, relationshipCount
+"""
+
+celf_query = """
+CALL gds.influenceMaximization.celf.write($graphName, {
+    writeProperty: 'celfSpread',
+    seedSetSize: $seedSize,
+    relationshipTypes: ['RELATED_TO']
+})
+YIELD nodePropertiesWritten
+RETURN nodePropertiesWritten
+"""
 
-def generate_similarity(graph_name):
-    query = """
-    CALL gds.nodeSimilarity.write($graphName, {
-        writeRelationshipType: 'SIMILAR',
-        writeProperty: 'score'
-    })
-    YIELD nodesCompared, relationshipsWritten
-    """
-    neo4j_graph.query(query, {"graphName": graph_name})
-
-def generate_seed_topic(graph_name, seed_size=10):
-    query = """
-        CALL gds.influenceMaximization.celf.write($graphName, {
-            writeProperty: 'celfSpread',
-            seedSetSize: $seedSize,
-            relationshipTypes: ['RELATED_TO']
-        })
-        YIELD nodePropertiesWritten;
-    """
-    neo4j_graph.query(query, {"graphName": graph_name, "seedSize": seed_size})
-    return True
-
-
-def register_graph(graph_name: str):
-    query = """
-        CALL gds.graph.project(
-        $graphName,
-        ['Article', 'Topic', 'Channel'],
+
+def native(value):
+    return value.to_native() if hasattr(value, "to_native") else value
+
+
+def batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def refresh_similarity(full: bool = False, top_k: int = 10):
+    """Recompute SIMILAR edges of topics that gained articles since the last run."""
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    since = None if full else get_job_state(job_name).get("lastRunAt")
+    if since is None:
+        topics = [record["topic"] for record in read_query(all_topic_names_query)]
+    else:
+        topics = [record["topic"] for record in read_query(queries.changed_topics_query, {"since": since})]
+
+    written = rescored = 0
+    for batch in batches(sorted(topics), topic_batch_size):
+        result = write_query(refresh_similar_query, {"topics": batch, "top_k": top_k})
+        written += result[0]["written"] if result else 0
+    if since is not None and topics:
+        result = write_query(rescore_similar_query, {"topics": topics})
+        rescored = result[0]["rescored"] if result else 0
+    if topics:
+        write_query(queries.bump_graph_generation_query)
+
+    elapsed = time.perf_counter() - start
+    set_job_state(
+        job_name,
         {
-            RELATED_TO: {
-            type: 'RELATED_TO',
-            orientation: 'UNDIRECTED'
-            },
-            COMES_FROM: {
-            type: 'COMES_FROM',
-            orientation: 'UNDIRECTED'
-            }
-        }
-        )
-        YIELD graphName, nodeCount, relationshipCount;
-    """
-    neo4j_graph.query(query, {"graphName": graph_name})
-    return True
+            "lastRunAt": started_at,
+            "similaritySeconds": elapsed,
+            "topicsRefreshed": len(topics),
+            "similarWritten": written,
+            "similarRescored": rescored,
+            "incremental": since is not None,
+        },
+    )
+    print(
+        f"Refreshed SIMILAR for {len(topics)} topics in {elapsed:.1f}s "
+        f"({written} written, {rescored} rescored, {'incremental' if since is not None else 'full'} run)"
+    )
+    return len(topics)
 
-graph_name = "newsGraph"
-register_graph(graph_name)
-generate_seed_topic(graph_name)
-generate_similarity(graph_name)
+
+def refresh_seeds(seed_size: int = 10, engine: str = engine):
+    """Rerun CELF in a freshly projected graph and drop the projection afterwards."""
+    if engine == "local":
+        return refresh_seeds_locally(seed_size)
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    # A projection left behind by a crashed run would make gds.graph.project fail
+    write_query(drop_graph_query, {"graphName": graph_name})
+    try:
+        projected = write_query(project_graph_query, {"graphName": graph_name})
+        projection_seconds = time.perf_counter() - start
+        write_query(celf_query, {"graphName": graph_name, "seedSize": seed_size})
+    finally:
+        write_query(drop_graph_query, {"graphName": graph_name})
+    write_query(queries.bump_graph_generation_query)
+
+    elapsed = time.perf_counter() - start
+    set_job_state(
+        job_name,
+        {
+            "lastCelfAt": started_at,
+            "celfSeconds": elapsed,
+            "projectionSeconds": projection_seconds,
+            "projectedNodes": projected[0]["nodeCount"] if projected else 0,
+            "projectedRelationships": projected[0]["relationshipCount"] if projected else 0,
+        },
+    )
+    print(f"Refreshed {seed_size} CELF seeds in {elapsed:.1f}s (projection {projection_seconds:.1f}s)")
+
+
+def refresh_seeds_locally(seed_size: int = 10):
+    import graph_engine
+
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    matrix, topics = graph_engine.read_bipartite()
+    projection_seconds = time.perf_counter() - start
+    topic_seeds = graph_engine.write_seeds(graph_engine.compute_seeds(matrix, seed_size), topics)
+    write_query(queries.bump_graph_generation_query)
+    elapsed = time.perf_counter() - start
+    set_job_state(
+        job_name,
+        {
+            "lastCelfAt": started_at,
+            "celfSeconds": elapsed,
+            "projectionSeconds": projection_seconds,
+            "projectedNodes": matrix.shape[0] + matrix.shape[1],
+            "projectedRelationships": matrix.nnz,
+        },
+    )
+    print(f"Refreshed {len(topic_seeds)} topic seeds of {seed_size} locally in {elapsed:.1f}s")
+
+
+def seeds_due(celf_interval: float):
+    last = get_job_state(job_name).get("lastCelfAt")
+    if last is None:
+        return True
+    return (datetime.now(timezone.utc) - native(last)).total_seconds() >= celf_interval
+
+
+def run(full: bool = False, top_k: int = 10, seed_size: int = 10, celf_interval: float = 0, engine: str = engine):
+    refresh_similarity(full, top_k)
+    if full or seeds_due(celf_interval):
+        refresh_seeds(seed_size, engine)
+
+
+def run_scheduler(interval: float, celf_interval: float, top_k: int = 10, seed_size: int = 10, engine: str = engine):
+    while True:
+        start = time.perf_counter()
+        try:
+            run(top_k=top_k, seed_size=seed_size, celf_interval=celf_interval, engine=engine)
+        except Exception as e:
+            print(f"Graph analytics run failed: {e!r}")
+        time.sleep(max(interval - (time.perf_counter() - start), 0))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Recompute topic SIMILAR edges and CELF topic seeds")
+    arg_parser.add_argument("--full", action="store_true", help="recompute every topic and rerun CELF")
+    arg_parser.add_argument("--top-k", type=int, default=10, help="SIMILAR edges kept per topic")
+    arg_parser.add_argument("--seed-size", type=int, default=10, help="CELF seed set size")
+    arg_parser.add_argument("--interval", type=float, default=None, help="rerun incrementally every N seconds")
+    arg_parser.add_argument(
+        "--celf-interval", type=float, default=0, help="rerun CELF only when its last run is N seconds old"
+    )
+    arg_parser.add_argument(
+        "--engine", choices=["gds", "local"], default=engine, help="run CELF in GDS or in graph_engine.py"
+    )
+    args = arg_parser.parse_args()
+
+    if args.interval:
+        run_scheduler(args.interval, args.celf_interval, args.top_k, args.seed_size, args.engine)
+    else:
+        run(args.full, args.top_k, args.seed_size, args.celf_interval, args.engine)
@@ -1,10 +1,21 @@
+import argparse
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
+from neo4j import GraphDatabase
 from neo4j.exceptions import ClientError
 from tqdm import tqdm
 from langchain_neo4j import Neo4jGraph
+from langchain_ollama import OllamaEmbeddings
 import ast
+import queries
+from embed_articles import article_texts, read_checkpoint, text_hash
+from embedding_store import EmbeddingStore
+from vector_index import train_if_grown
 
 load_dotenv()
 
@@ -34,129 +45,344 @@ def create_constraints(graph: Neo4jGraph):
         """
         graph.query(cypher)
 
-def insert_csv_data(data: pd.DataFrame):
-    for index, row in tqdm(
-        data.iterrows(), total=len(data), desc="Inserting Data", unit="row"
-    ):
-        topic_names = row["assigned_topic_name"].split(", ") if row["assigned_topic_name"] else []
-        params = {
-            "article_link": row["url"],
-            "article_title": row["title"],
-            "article_description": row["body"],
-            "pub_date": row["timestamp"],
-            "article_embedding": row["embedding"],
-        }
+def create_indexes(graph: Neo4jGraph):
+    # loadedAt lets the feed materializer find topics with articles newer than its last run
+    graph.query("CREATE INDEX article_loaded_at IF NOT EXISTS FOR (n:Article) ON (n.loadedAt)")
+    # pubDate serves the before_date filters; (topic, shuffleKey) the random topic samples
+    # (retrieval.random_articles), which must only read the edges of their own topic
+    graph.query("CREATE INDEX article_pub_date IF NOT EXISTS FOR (n:Article) ON (n.pubDate)")
+    graph.query("DROP INDEX related_to_shuffle_key IF EXISTS")
+    graph.query(
+        "CREATE INDEX related_to_topic_shuffle_key IF NOT EXISTS FOR ()-[r:RELATED_TO]-() ON (r.topic, r.shuffleKey)"
+    )
 
-        # Updated query to save article with its embedding
-        query_article_and_embedding = """
-            MERGE (article:Article {link: $article_link})
-            ON CREATE SET 
-                article.title = $article_title, 
-                article.description = $article_description,
-                article.pubDate = datetime($pub_date)
-
-            WITH article, $article_embedding AS embedding
-            CALL db.create.setNodeVectorProperty(article, 'embedding', embedding)
-            RETURN article
+def backfill_shuffle_keys(graph: Neo4jGraph):
+    # RELATED_TO edges loaded before shuffle keys and their topic name existed
+    graph.query(
         """
-        neo4j_graph.query(query_article_and_embedding, params)
-
-        # Ensure that an index exists on the article embeddings
-        try:
-            neo4j_graph.query(
-                """
-                CREATE VECTOR INDEX article_vectors IF NOT EXISTS
-                FOR (n:Article)
-                ON (n.embedding)
-                OPTIONS {
-                indexConfig: {
-                    `vector.dimensions`: $dimension,
-                    `vector.similarity_function`: 'cosine'
-                  }
-                }
-                """,
-                {"dimension": embedding_dimension},
-            )
-        except ClientError as e:
-            if "Index already exists" not in str(e):
-                print(f"Error creating index: {e}")
-
-        query_channel = """
-        MERGE (channel:Channel {title: $channel_title})
+        MATCH ()-[r:RELATED_TO]->(topic:Topic)
+        WHERE r.shuffleKey IS NULL OR r.topic IS NULL
+        CALL {
+            WITH r, topic
+            SET r.shuffleKey = coalesce(r.shuffleKey, rand()), r.topic = topic.name
+        } IN TRANSACTIONS OF 10000 ROWS
         """
+    )
 
-        neo4j_graph.query(
-            query_channel,
-            {
-                "channel_title": row["source"],
-            },
+def create_vector_index(graph: Neo4jGraph):
+    # Ensure that an index exists on the article embeddings
+    try:
+        graph.query(
+            """
+            CREATE VECTOR INDEX article_vectors IF NOT EXISTS
+            FOR (n:Article)
+            ON (n.embedding)
+            OPTIONS {
+            indexConfig: {
+                `vector.dimensions`: $dimension,
+                `vector.similarity_function`: 'cosine'
+              }
+            }
+            """,
+            {"dimension": embedding_dimension},
         )
+    except ClientError as e:
+        if "Index already exists" not in str(e):
+            print(f"Error creating index: {e}")
+
+
+# Articles, their embedding, channel and topics are written in one transaction per batch.
+# loadedAt is refreshed whenever an article is new or gains a topic or a new
+# embedding, since the feed materializer, the SIMILAR refresh and
+# vector_index --sync only revisit articles loaded after their last run
+query_insert_articles = """
+    UNWIND $rows AS row
+    MERGE (article:Article {link: row.article_link})
+    ON CREATE SET
+        article.title = row.article_title,
+        article.description = row.article_description,
+        article.pubDate = datetime(row.pub_date)
+
+    WITH article, row, [(article)-[:RELATED_TO]->(topic:Topic) | topic.name] AS loaded_topics
+    WITH article, row,
+        article.embedding IS NULL OR article.embedding <> row.article_embedding
+        OR any(topic_name IN row.topic_names WHERE NOT topic_name IN loaded_topics) AS changed
+    FOREACH (_ IN CASE WHEN changed THEN [1] ELSE [] END | SET article.loadedAt = datetime())
 
-        # Article comes from Channel
-        query_comes_from = """
-        MATCH (article:Article {link: $article_link}), (channel:Channel {title: $channel_title})
+    WITH article, row
+    CALL db.create.setNodeVectorProperty(article, 'embedding', row.article_embedding)
+
+    WITH article, row
+    CALL {
+        WITH article, row
+        UNWIND row.channel_titles AS channel_title
+        MERGE (channel:Channel {title: channel_title})
         MERGE (article)-[:COMES_FROM]->(channel)
-        """
-        neo4j_graph.query(
-            query_comes_from,
-            {"article_link": row["url"], "channel_title": row["source"]},
+    }
+    CALL {
+        WITH article, row
+        UNWIND row.topic_names AS topic_name
+        MERGE (topic:Topic {name: topic_name})
+        MERGE (article)-[related:RELATED_TO]->(topic)
+        ON CREATE SET related.shuffleKey = rand(), related.topic = topic_name
+    }
+"""
+
+
+def load_embeddings(path: str, expected_rows: int):
+    # float32 matrix written by the embedding stage, row i belongs to data.csv row i.
+    # Memory-mapped so batches read only the rows they send.
+    embeddings = np.load(path, mmap_mode="r")
+    if embeddings.shape != (expected_rows, embedding_dimension):
+        raise ValueError(
+            f"{path} has shape {embeddings.shape}, expected ({expected_rows}, {embedding_dimension})"
         )
+    return embeddings
 
-        for topic_name in topic_names:
-            query_topic = """
-            MERGE (topic:Topic {name: $topic_name})
-            """
-            neo4j_graph.query(query_topic, {"topic_name": topic_name})
 
-            # Create relationship: Article is RELATED_TO Topic
-            query_related_to = """
-            MATCH (article:Article {link: $article_link}), (topic:Topic {name: $topic_name})
-            MERGE (article)-[:RELATED_TO]->(topic)
-            """
-            neo4j_graph.query(
-                query_related_to,
-                {"article_link": row["url"], "topic_name": topic_name},
-            )
+def embedded_rows(data: pd.DataFrame, embeddings: np.ndarray, checkpoint: str):
+    """Boolean mask of the rows whose vector the embedding stage finished.
 
+    A row counts when the checkpoint lists it with its current text hash;
+    rows of failed batches stay all-zero in the matrix and are not listed.
+    Without a checkpoint, all-zero rows are the ones left out.
+    """
+    if os.path.exists(checkpoint):
+        done = read_checkpoint(checkpoint)
+        return np.array([done.get(row) == text_hash(text) for row, text in enumerate(article_texts(data))], dtype=bool)
+    mask = np.zeros(len(embeddings), dtype=bool)
+    for start in range(0, len(embeddings), 10000):
+        mask[start : start + 10000] = np.any(embeddings[start : start + 10000], axis=1)
+    return mask
 
-def insert_topic_data(topic_df: pd.DataFrame):
-    for index, row in topic_df.iterrows():
-        # Skip if Generated_Name is missing
-        if pd.isna(row["Generated_Name"]):
+
+def article_rows(data: pd.DataFrame, embeddings: np.ndarray = None, embedded: np.ndarray = None):
+    # embedded: optional mask from embedded_rows; rows outside it are not loaded
+    rows = {}
+    for i, row in enumerate(data.to_dict("records")):
+        if embedded is not None and not embedded[i]:
+            continue
+        # Rows of the memory-mapped matrix go to the driver as numpy arrays, never as lists
+        embedding = embeddings[i] if embeddings is not None else row["embedding"]
+        topic_names = row["assigned_topic_name"].split(", ") if row["assigned_topic_name"] else []
+        if row["url"] in rows:
+            # Fold repeated links into one row so every article lands in exactly one
+            # batch: the first occurrence keeps its properties (ON CREATE), the last
+            # embedding wins and all channels and topics are kept, like a serial load
+            existing = rows[row["url"]]
+            existing["article_embedding"] = embedding
+            existing["channel_titles"] = sorted(set(existing["channel_titles"]) | {row["source"]})
+            existing["topic_names"] = sorted(set(existing["topic_names"]) | set(topic_names))
             continue
+        rows[row["url"]] = {
+            "article_link": row["url"],
+            "article_title": row["title"],
+            "article_description": row["body"],
+            "pub_date": None if pd.isna(row["timestamp"]) else row["timestamp"].isoformat(),
+            "article_embedding": embedding,
+            "channel_titles": [row["source"]],
+            # Sorted so concurrent writers lock shared topics in the same order
+            "topic_names": sorted(set(topic_names)),
+        }
+    return list(rows.values())
 
-        query = """
-        MERGE (topic:Topic {name: $generated_name})
-        SET topic.topicId = $topic_id,
-            topic.internalName = $internal_name,
-            topic.keywords = $keywords
-        """
-        neo4j_graph.query(
-            query,
+
+def batches(rows: list, batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start : start + batch_size]
+
+
+def create_shared_nodes(rows: list, batch_size: int):
+    # Channels and topics are shared by many articles. Creating them up front
+    # means parallel workers only ever MERGE onto existing nodes.
+    channel_titles = sorted({title for row in rows for title in row["channel_titles"]})
+    topic_names = sorted({name for row in rows for name in row["topic_names"]})
+    for batch in batches(channel_titles, batch_size):
+        neo4j_graph.query("UNWIND $names AS name MERGE (:Channel {title: name})", {"names": batch})
+    for batch in batches(topic_names, batch_size):
+        neo4j_graph.query("UNWIND $names AS name MERGE (:Topic {name: name})", {"names": batch})
+
+
+def insert_csv_data(
+    data: pd.DataFrame, batch_size: int = 500, workers: int = 1, embeddings: np.ndarray = None, embedded: np.ndarray = None
+):
+    rows = article_rows(data, embeddings, embedded)
+    start = time.perf_counter()
+    if workers > 1:
+        create_shared_nodes(rows, batch_size)
+        retries = insert_rows_parallel(rows, batch_size, workers)
+    else:
+        retries = 0
+        with tqdm(total=len(rows), desc="Inserting Data", unit="row") as progress:
+            for batch in batches(rows, batch_size):
+                neo4j_graph.query(query_insert_articles, {"rows": batch})
+                progress.update(len(batch))
+    elapsed = time.perf_counter() - start
+    print(
+        f"Inserted {len(rows)} rows in {elapsed:.1f}s ({len(rows) / max(elapsed, 1e-9):.0f} rows/s, "
+        f"{workers} workers, {retries} retried transactions)"
+    )
+
+
+def insert_rows_parallel(rows: list, batch_size: int, workers: int):
+    # Each batch is written in its own session and managed transaction.
+    # execute_write retries transient errors such as DeadlockDetected with
+    # exponential backoff, which covers lock conflicts on hot topic nodes.
+    driver = GraphDatabase.driver(
+        url,
+        auth=(username, password),
+        max_connection_pool_size=workers,
+        max_transaction_retry_time=120,
+    )
+    attempts = {"count": 0}
+    lock = threading.Lock()
+
+    def write_batch(tx, batch):
+        with lock:
+            attempts["count"] += 1
+        tx.run(query_insert_articles, {"rows": batch}).consume()
+
+    def run_batch(batch):
+        with driver.session() as session:
+            session.execute_write(write_batch, batch)
+        return len(batch)
+
+    try:
+        all_batches = list(batches(rows, batch_size))
+        with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(
+            total=len(rows), desc="Inserting Data", unit="row"
+        ) as progress:
+            futures = [executor.submit(run_batch, batch) for batch in all_batches]
+            for future in as_completed(futures):
+                progress.update(future.result())
+    finally:
+        driver.close()
+    return attempts["count"] - len(all_batches)
+
+
+def insert_topic_data(topic_df: pd.DataFrame, batch_size: int = 500):
+    rows = []
+    for row in topic_df.to_dict("records"):
+        # Skip if Generated_Name is missing
+        if pd.isna(row["Generated_Name"]) or not row["Generated_Name"]:
+            continue
+        rows.append(
             {
                 "generated_name": row["Generated_Name"],
                 "topic_id": int(row["Topic"]),
                 "internal_name": row["Name"],
                 "keywords": (
-                    eval(row["Representation"])
-                    if isinstance(row["Representation"], str)
+                    ast.literal_eval(row["Representation"])
+                    if isinstance(row["Representation"], str) and row["Representation"]
                     else []
                 ),
-            },
+            }
         )
-        
-csv_data = pd.read_csv("data.csv")
-csv_data = csv_data.fillna("")
-csv_data["timestamp"] = pd.to_datetime(csv_data["timestamp"], errors="coerce", utc=True)
-csv_data["embedding"] = csv_data["embedding"].apply(
-    lambda x: ast.literal_eval(x) if isinstance(x, str) else x
-)
-print("CSV data shape:", csv_data.shape)
-create_constraints(neo4j_graph)
-insert_csv_data(csv_data)
 
-topic_names = pd.read_csv("topic_data.csv")
-topic_names = topic_names.fillna("")
-insert_topic_data(topic_names)
+    query = """
+    UNWIND $rows AS row
+    MERGE (topic:Topic {name: row.generated_name})
+    SET topic.topicId = row.topic_id,
+        topic.internalName = row.internal_name,
+        topic.keywords = row.keywords
+    """
+    for batch in batches(rows, batch_size):
+        neo4j_graph.query(query, {"rows": batch})
+
+
+def insert_topic_embeddings(batch_size: int = 64):
+    # Store each topic name's query embedding so the app's vector search can
+    # take the topic vector from the graph instead of calling Ollama
+    result = neo4j_graph.query("MATCH (t:Topic) WHERE t.embedding IS NULL RETURN t.name AS name")
+    names = [record["name"] for record in result]
+    embeddings = OllamaEmbeddings(model="nomic-embed-text")
+    for batch in tqdm(list(batches(names, batch_size)), desc="Embedding topics", unit="batch"):
+        vectors = embeddings.embed_documents(batch)
+        neo4j_graph.query(
+            """
+            UNWIND $rows AS row
+            MATCH (t:Topic {name: row.name})
+            SET t.embedding = row.embedding
+            """,
+            {"rows": [{"name": name, "embedding": vector} for name, vector in zip(batch, vectors)]},
+        )
+
+
+def update_vector_store(
+    data: pd.DataFrame, embeddings: np.ndarray, path: str, batch_size: int = 500, embedded: np.ndarray = None
+):
+    # Incremental hook for the local vector index: append the articles that are
+    # new or changed since the last load, then retrain the lists if it grew a lot
+    store = EmbeddingStore(path)
+    appended = 0
+    for batch in batches(article_rows(data, embeddings, embedded), batch_size):
+        rows = [
+            {
+                "link": row["article_link"],
+                "title": row["article_title"],
+                "description": row["article_description"],
+                "pubDate": row["pub_date"],
+                "topics": row["topic_names"],
+                "embedding": row["article_embedding"],
+            }
+            for row in batch
+        ]
+        appended += store.append(row for row in rows if not store.is_current(row))
+    print(f"Appended {appended} articles to the vector store at {store.path} ({len(store)} rows)")
+    train_if_grown(store)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load articles and topics into Neo4j")
+    arg_parser.add_argument("--data", default="data.csv")
+    arg_parser.add_argument("--topics", default="topic_data.csv")
+    arg_parser.add_argument("--embeddings", default="embeddings.npy", help="float32 matrix aligned with --data rows")
+    arg_parser.add_argument("--checkpoint", default=None, help="embedding checkpoint, defaults to <embeddings>.checkpoint")
+    arg_parser.add_argument("--batch-size", type=int, default=500, help="rows per UNWIND transaction")
+    arg_parser.add_argument("--workers", type=int, default=1, help="parallel writer sessions")
+    arg_parser.add_argument(
+        "--vector-store",
+        default=os.getenv("VECTOR_STORE_PATH"),
+        help="also append the articles to this local vector store (VECTOR_BACKEND=local)",
+    )
+    args = arg_parser.parse_args()
+
+    csv_data = pd.read_csv(args.data)
+    csv_data = csv_data.fillna("")
+    csv_data["timestamp"] = pd.to_datetime(csv_data["timestamp"], errors="coerce", utc=True)
+    embeddings = embedded = None
+    if os.path.exists(args.embeddings):
+        embeddings = load_embeddings(args.embeddings, len(csv_data))
+        # Rows whose embedding failed are left out rather than loaded as zero vectors
+        embedded = embedded_rows(csv_data, embeddings, args.checkpoint or args.embeddings + ".checkpoint")
+        if not embedded.all():
+            print(f"Skipping {int((~embedded).sum())} of {len(csv_data)} rows without a finished embedding; "
+                  "rerun embed_articles.py to fill them in")
+    else:
+        # Older data.csv files keep the embeddings as list literals. Cast to float32 like
+        # the .npy path, so a reload compares equal to the stored vector property and
+        # unchanged articles keep their loadedAt
+        csv_data["embedding"] = csv_data["embedding"].apply(
+            lambda x: np.asarray(ast.literal_eval(x) if isinstance(x, str) else x, dtype=np.float32)
+        )
+    print("CSV data shape:", csv_data.shape)
+    create_constraints(neo4j_graph)
+    create_indexes(neo4j_graph)
+    backfill_shuffle_keys(neo4j_graph)
+    create_vector_index(neo4j_graph)
+    insert_csv_data(csv_data, args.batch_size, args.workers, embeddings, embedded)
+    if args.vector_store:
+        update_vector_store(csv_data, embeddings, args.vector_store, args.batch_size, embedded)
+
+    topic_names = pd.read_csv(args.topics)
+    topic_names = topic_names.fillna("")
+    insert_topic_data(topic_names, args.batch_size)
+    try:
+        insert_topic_embeddings()
+    except Exception as e:
+        # The app embeds any topic without a stored vector when it starts
+        print(f"Could not embed topic names: {e}")
+    # Cached topic responses in the API are rebuilt on their next request
+    neo4j_graph.query(queries.bump_graph_generation_query)
 
-print("Data inserted into Neo4j successfully!")
+    print("Data inserted into Neo4j successfully!")
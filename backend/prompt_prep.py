@@ -0,0 +1,116 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from cache import content_key
+from meta_summarizer import estimate_tokens
+
+# The loader stores the whole scraped body as Article.description, so a raw
+# title + description prompt can run to thousands of tokens and prompt
+# evaluation dominates the Mistral call. Articles over PROMPT_TOKEN_BUDGET
+# tokens are compacted to their lead sentences plus the sentences that best
+# match the topic, the title and the article's own keywords, kept in their
+# original order. Compacted text is cached per article, topic and budget.
+
+token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", 400))
+lead_sentences = 2
+article_keywords = 10
+# Bumped whenever compact() changes, so cached prompts and summaries are rebuilt
+version = 1
+
+stop_words = set(
+    """a about after all also an and any are as at be been before but by can could did do does for from had has
+    have he her his how i if in into is it its more most no not of on one or our out over said says she so some
+    than that the their them then there these they this to under up was we were what when which who will with
+    would you your""".split()
+)
+sentence_end = re.compile(r"(?<=[.!?])\s+|(?<=[.!?][\"')\]])\s+")
+word = re.compile(r"[a-z0-9]+")
+
+
+def split_sentences(text: str):
+    # Distinct sentences only: scraped bodies repeat captions and boilerplate
+    return list(dict.fromkeys(sentence.strip() for sentence in sentence_end.split(text) if sentence.strip()))
+
+
+def content_words(text: str):
+    return [w for w in word.findall(text.lower()) if len(w) > 2 and w not in stop_words]
+
+
+class PromptPreparer:
+    def __init__(self, cache=None, token_budget: int = token_budget, lead: int = lead_sentences):
+        self.cache = cache
+        self.token_budget = token_budget
+        self.lead = lead
+        self.prompts = 0
+        self.compacted = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def fingerprint(self):
+        # Part of the summary cache key: a different budget gives different prompts
+        return f"prompt_prep:{version}:{self.token_budget}:{self.lead}"
+
+    def compact(self, title: str, description: str, topic: str):
+        """Sentences of description fitting the budget left after the title, in article order."""
+        budget = self.token_budget - estimate_tokens(title)
+        sentences = split_sentences(description)
+        frequent = Counter(w for sentence in sentences for w in set(content_words(sentence)))
+        weights = Counter({w: 1.0 for w, _ in frequent.most_common(article_keywords)})
+        weights.update({w: 2.0 for w in content_words(title)})
+        weights.update({w: 3.0 for w in content_words(topic)})
+
+        def score(i, sentence):
+            words = set(content_words(sentence))
+            relevance = sum(weights[w] for w in words) / math.sqrt(len(words) + 1)
+            # The lead always goes first; later sentences lose a little by position
+            return (i < self.lead, relevance - 0.01 * i)
+
+        ranked = sorted(enumerate(sentences), key=lambda pair: score(*pair), reverse=True)
+        chosen, used = [], 0
+        for i, sentence in ranked:
+            tokens = estimate_tokens(sentence)
+            if used + tokens <= budget:
+                chosen.append(i)
+                used += tokens
+        if not chosen:
+            # Not even one sentence fits; cut the first to the budget
+            return description[: max(budget, 0) * 4]
+        return " ".join(sentences[i] for i in sorted(chosen))
+
+    def question(self, record, topic: str):
+        # The summary chain's question for a record: title + description, compacted when over budget
+        raw = record["title"] + record["description"]
+        before = estimate_tokens(raw)
+        if before <= self.token_budget:
+            self.count(before, before, False)
+            return raw
+        key = content_key(record["link"], topic, raw, self.fingerprint())
+        description = self.cache.get(key) if self.cache is not None else None
+        if description is None:
+            description = self.compact(record["title"], record["description"], topic)
+            if self.cache is not None:
+                self.cache.set(key, description)
+        question = record["title"] + description
+        self.count(before, estimate_tokens(question), True)
+        return question
+
+    def count(self, before: int, after: int, compacted: bool):
+        with self._lock:
+            self.prompts += 1
+            self.compacted += compacted
+            self.tokens_before += before
+            self.tokens_after += after
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "prompts": self.prompts,
+                "compacted": self.compacted,
+                "avg_tokens_before": self.tokens_before / max(self.prompts, 1),
+                "avg_tokens_after": self.tokens_after / max(self.prompts, 1),
+            }
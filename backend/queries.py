@@ -0,0 +1,292 @@
+# Cypher used by the API. Shared by the Flask app (app.py) and the async
+# ASGI app (asgi_app.py) so both serve exactly the same data.
+
+topic_seed_query = """
+MATCH (n:Topic)
+WHERE n.celfSpread IS NOT NULL AND n.celfSpread <> 0
+RETURN n.name AS name, n.celfSpread AS spread
+ORDER BY spread DESC, name ASC
+"""
+
+# Every topic SIMILAR to the given one. Cached per graph generation
+# (response_cache.py); the user's subscriptions are filtered out per request
+similar_topics_query = """
+MATCH (t:Topic {name: $topic_name})-[s:SIMILAR]-(other:Topic)
+RETURN other.name AS name, s.score AS score
+ORDER BY s.score DESC
+"""
+
+subscribed_topic_names_query = """
+MATCH (:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)
+RETURN topic.name AS name
+"""
+
+create_user_query = """
+MERGE (user:User {id: $user_id})
+SET user.name = $name,
+    user.base_understanding = $base_understanding,
+    user.join_date = datetime($join_date)
+"""
+
+update_user_query = """
+MATCH (user:User {id: $user_id})
+SET user.name = $name,
+    user.base_understanding = $base_understanding,
+    user.join_date = datetime($join_date)
+"""
+
+# User information and their subscribed interests with levels
+get_user_query = """
+MATCH (user:User {id: $user_id})
+OPTIONAL MATCH (user)-[:SUBSCRIBED_TO]->(topic:Topic)
+OPTIONAL MATCH (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
+RETURN
+    user.id AS id,
+    user.name AS name,
+    user.base_understanding AS base_understanding,
+    user.join_date AS join_date,
+    collect({topic: topic.name, level: r.level}) AS interests
+"""
+
+# Add relationship: User SUBSCRIBED_TO Topic
+subscribe_query = """
+MATCH (user:User {id: $user_id}), (topic:Topic {name: $topic_name})
+MERGE (user)-[:SUBSCRIBED_TO]->(topic)
+"""
+
+# Add level of understanding relationship
+set_level_query = """
+MATCH (user:User {id: $user_id}), (topic:Topic {name: $topic_name})
+MERGE (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
+SET r.level = $level
+"""
+
+unsubscribe_query = """
+MATCH (user:User {id: $user_id})-[r:SUBSCRIBED_TO]->(topic:Topic {name: $topic_name})
+DELETE r
+"""
+
+user_interests_query = """
+MATCH (user:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)
+OPTIONAL MATCH (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
+RETURN topic.name AS name, r.level AS level
+"""
+
+# Add relationship: User SAVED_FOR_LATER Article
+save_article_query = """
+MATCH (user:User {id: $user_id}), (article:Article {link: $article_link})
+MERGE (user)-[:SAVED_FOR_LATER]->(article)
+"""
+
+remove_saved_article_query = """
+MATCH (user:User {id: $user_id})-[r:SAVED_FOR_LATER]->(article:Article {link: $article_link})
+DELETE r
+"""
+
+all_topics_query = """
+MATCH (topic:Topic)
+RETURN topic.name AS name
+"""
+
+topic_embeddings_query = """
+MATCH (t:Topic)
+RETURN t.name AS name, t.embedding AS embedding
+"""
+
+set_topic_embeddings_query = """
+UNWIND $rows AS row
+MATCH (t:Topic {name: row.name})
+SET t.embedding = row.embedding
+"""
+
+# Approximate top-k from the vector index, then restricted to the topic and
+# date. retrieval.py raises $k until enough candidates survive the filter.
+filtered_vector_articles_query = """
+CALL db.index.vector.queryNodes('article_vectors', $k, $topic_embedding) YIELD node, score
+WHERE node.pubDate < datetime($before_date)
+AND EXISTS { (node)-[:RELATED_TO]->(:Topic {name: $topic}) }
+RETURN node.link AS link, node.title AS title, node.description AS description,
+    node.pubDate AS pubDate, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+# Exact cosine over the filtered articles, for filters too selective for the index
+exact_vector_articles_query = """
+MATCH (node:Article)-[:RELATED_TO]->(:Topic {name: $topic})
+WHERE node.pubDate < datetime($before_date) AND node.embedding IS NOT NULL
+WITH node, vector.similarity.cosine(node.embedding, $topic_embedding) AS score
+RETURN node.link AS link, node.title AS title, node.description AS description,
+    node.pubDate AS pubDate, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+random_articles_query = """
+MATCH (article:Article)-[:RELATED_TO]->(topic:Topic {name: $topic})
+WHERE article.pubDate < datetime($before_date)
+RETURN article.link AS link, article.title AS title, article.description AS description,
+       article.pubDate AS pubDate, 0 AS score
+ORDER BY rand()
+LIMIT $limit
+"""
+
+# Random articles of a large topic without sorting all of them: every
+# RELATED_TO edge has a random shuffleKey and a copy of its topic's name, and
+# the (topic, shuffleKey) index is walked over key ranges of that topic only,
+# starting at a random point (retrieval.random_articles)
+sampled_articles_query = """
+UNWIND $ranges AS range
+MATCH (article:Article)-[r:RELATED_TO]->(:Topic)
+USING INDEX r:RELATED_TO(topic, shuffleKey)
+WHERE r.topic = $topic AND r.shuffleKey >= range[0] AND r.shuffleKey < range[1]
+  AND article.pubDate < datetime($before_date)
+RETURN article.link AS link, article.title AS title, article.description AS description,
+       article.pubDate AS pubDate, 0 AS score
+ORDER BY (r.shuffleKey - $start + 1.0) % 1.0
+LIMIT $limit
+"""
+
+topic_size_query = """
+MATCH (topic:Topic {name: $topic})
+RETURN COUNT { (topic)<-[:RELATED_TO]-(:Article) } AS size
+"""
+
+# All articles from the given topic the given user is subscribed to. Their
+# vectors come from the local embedding store (embedding_store.article_embeddings)
+history_candidates_query = """
+MATCH (user:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)<-[:RELATED_TO]-(article:Article)
+WHERE topic.name = $topic
+AND article.pubDate < datetime($date)
+RETURN elementId(article) as elementId, article.link AS link,
+       article.title AS title, article.description AS description, article.pubDate AS pubDate
+ORDER BY article.pubDate DESC
+"""
+
+# Add LAST_QUERY relationship for each selected article's topic
+record_history_query = """
+UNWIND $articles AS article
+MATCH (user:User {id: $user_id})
+MATCH (a:Article)-[:RELATED_TO]->(topic:Topic {name: $topic})
+WHERE elementId(a) = article.elementId
+MERGE (user)-[r:LAST_QUERY]->(a)
+SET r.lastQueriedAt = $date
+MERGE (user)-[r2:LAST_QUERY]->(topic)
+SET r2.lastQueriedAt = $date, r2.historyVersion = coalesce(r2.historyVersion, 0) + 1
+"""
+
+# Bumped by every history write; history feeds are stamped with the version they were built from
+history_version_query = """
+MATCH (:User {id: $user_id})-[r:LAST_QUERY]->(:Topic {name: $topic})
+RETURN coalesce(r.historyVersion, 0) AS version
+"""
+
+# All articles related to topic that were last queried by the user
+history_articles_query = """
+MATCH (user:User {id: $user_id})-[:LAST_QUERY]->(topic:Topic {name: $topic})<-[:RELATED_TO]-(article:Article)
+MATCH (user)-[:LAST_QUERY]->(article)
+RETURN article.link AS link, article.title AS title, article.description AS description, article.pubDate AS pubDate
+"""
+
+last_query_date_query = """
+MATCH (user:User {id: $user_id})-[r:LAST_QUERY]->(topic:Topic {name: $topic})
+RETURN r.lastQueriedAt AS lastQueriedAt
+"""
+
+# Relevant articles that were published after the last query date
+new_articles_query = """
+MATCH (user:User {id: $user_id})-[:SUBSCRIBED_TO]->(topic:Topic)<-[:RELATED_TO]-(article:Article)
+WHERE topic.name = $topic
+AND article.pubDate > datetime($prev_date)
+RETURN elementId(article) as elementId, article.link AS link,
+       article.title AS title, article.description AS description, article.pubDate AS pubDate
+ORDER BY article.pubDate DESC
+LIMIT 10
+"""
+
+# Articles from the history that are related to the topic
+history_records_query = """
+MATCH (user:User {id: $user_id})-[:LAST_QUERY]->(topic:Topic {name: $topic})<-[:RELATED_TO]-(article:Article)
+RETURN elementId(article) as elementId, article.link AS link, article.title AS title, article.description AS description, article.pubDate AS pubDate
+"""
+
+# Vectors of articles the local embedding store doesn't hold yet
+article_embeddings_query = """
+UNWIND $element_ids AS id
+MATCH (article:Article)
+WHERE elementId(article) = id
+RETURN id AS elementId, article.embedding AS embedding
+"""
+
+# Materialized feeds (feed_materializer.py). Each :Feed node holds one
+# ready-to-serve article list as JSON, keyed by what the endpoint was asked for.
+# A history feed only counts while its historyVersion matches the user's current
+# one, so a build that raced a history write is never served
+feed_query = """
+MATCH (f:Feed {key: $key})
+WHERE f.kind <> 'history'
+   OR f.historyVersion = coalesce(head([(:User {id: f.userId})-[r:LAST_QUERY]->(:Topic {name: f.topic}) | r.historyVersion]), 0)
+RETURN f.articles AS articles
+"""
+
+set_feed_query = """
+MERGE (f:Feed {key: $key})
+SET f += $props, f.articles = $articles, f.builtAt = datetime()
+"""
+
+delete_feed_query = """
+MATCH (f:Feed {key: $key})
+DELETE f
+"""
+
+# A user's history feed is stale as soon as their LAST_QUERY set changes
+delete_history_feeds_query = """
+MATCH (f:Feed {kind: 'history', userId: $user_id, topic: $topic})
+DELETE f
+"""
+
+# Stale history feeds are left out, so incremental runs rebuild them
+feed_keys_query = """
+MATCH (f:Feed)
+WHERE f.kind <> 'history'
+   OR f.historyVersion = coalesce(head([(:User {id: f.userId})-[r:LAST_QUERY]->(:Topic {name: f.topic}) | r.historyVersion]), 0)
+RETURN f.key AS key
+"""
+
+subscriptions_query = """
+MATCH (user:User)-[:SUBSCRIBED_TO]->(topic:Topic)
+OPTIONAL MATCH (user)-[r:LEVEL_OF_UNDERSTANDING]->(topic)
+RETURN user.id AS user_id, topic.name AS topic,
+       coalesce(r.level, user.base_understanding, 'Beginner') AS level
+"""
+
+# Topics that gained or changed articles since the given time (Article.loadedAt is
+# set by the loader when an article is new or gets a topic or embedding)
+changed_topics_query = """
+MATCH (article:Article)-[:RELATED_TO]->(topic:Topic)
+WHERE article.loadedAt > $since
+RETURN DISTINCT topic.name AS topic
+"""
+
+job_state_query = """
+MATCH (j:JobState {name: $name})
+RETURN properties(j) AS state
+"""
+
+set_job_state_query = """
+MERGE (j:JobState {name: $name})
+SET j += $state
+"""
+
+# Bumped by the loader, neo4j_graph_calc.py and graph_engine.py whenever topics,
+# SIMILAR edges or celfSpread change; cached topic responses are keyed by it
+graph_generation_query = """
+MATCH (g:GraphGeneration {name: 'graph'})
+RETURN g.generation AS generation
+"""
+
+bump_graph_generation_query = """
+MERGE (g:GraphGeneration {name: 'graph'})
+SET g.generation = coalesce(g.generation, 0) + 1, g.bumpedAt = datetime()
+RETURN g.generation AS generation
+"""
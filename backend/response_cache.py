@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import queries
+from db import aread_query, read_query
+
+# In-memory cache for the read-mostly topic endpoints (/topic/get_seed,
+# /interests, /topic/<name>). Their data only changes when the loader or the
+# graph jobs run, and those bump the graph generation; an entry is only valid
+# for the generation it was built in. The generation is re-read at most every
+# GRAPH_GENERATION_TTL seconds, so a bump shows up within that time.
+# Keys include topic names taken from URLs, so at most
+# RESPONSE_CACHE_MAX_ENTRIES entries are kept, least recently used first out.
+
+generation_ttl = float(os.getenv("GRAPH_GENERATION_TTL", 5))
+max_cache_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+
+
+def json_body(value):
+    # (JSON bytes, strong ETag) for a response value
+    body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = generation_ttl, max_entries: int = max_cache_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = None
+        self.checked_at = float("-inf")
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def generation_stale(self):
+        return time.monotonic() - self.checked_at >= self.ttl
+
+    def set_generation(self, records):
+        generation = records[0]["generation"] if records else 0
+        with self._lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            self.checked_at = time.monotonic()
+
+    def lookup(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return True, self.entries[key], self.generation
+            self.misses += 1
+            return False, None, self.generation
+
+    def store(self, key, value, generation):
+        # A value computed while the generation moved on is returned but not kept
+        with self._lock:
+            if generation == self.generation:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+    def get(self, key, compute):
+        if self.generation_stale():
+            self.set_generation(read_query(queries.graph_generation_query))
+        found, value, generation = self.lookup(key)
+        if not found:
+            value = compute()
+            self.store(key, value, generation)
+        return value
+
+    async def aget(self, key, compute):
+        # compute is a coroutine function
+        if self.generation_stale():
+            self.set_generation(await aread_query(queries.graph_generation_query))
+        found, value, generation = self.lookup(key)
+        if not found:
+            value = await compute()
+            self.store(key, value, generation)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"generation": self.generation, "entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+topic_cache = ResponseCache()
+
+
+def related_topics(similar, subscribed):
+    # What the uncached query returned: the five most similar rows the user isn't
+    # subscribed to, then deduplicated, so a topic SIMILAR in both directions
+    # takes two of the five. A user without subscriptions (or an unknown user) gets none
+    if not subscribed:
+        return []
+    subscribed = {record["name"] for record in subscribed}
+    rows = [record for record in similar if record["name"] not in subscribed][:5]
+    seen = set()
+    topics = []
+    for record in rows:
+        if record["name"] not in seen:
+            seen.add(record["name"])
+            topics.append({"name": record["name"], "score": record["score"]})
+    return topics
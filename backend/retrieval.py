@@ -0,0 +1,164 @@
+import asyncio
+import os
+import random
+import threading
+from collections import OrderedDict
+
+import queries
+import vector_index
+from db import aread_query, read_query
+from response_cache import topic_cache
+
+# "Top-k by cosine among a topic's articles published before a date".
+# The vector index only knows the global neighbours, so the search over-fetches
+# and raises k geometrically until enough neighbours pass the topic/date
+# filter. Filters so selective that even max_candidates neighbours don't
+# cover them are answered by an exact scan of the (small) filtered set.
+# With VECTOR_BACKEND=local the in-process index (vector_index.py) applies
+# the filters itself and Neo4j is not queried at all.
+
+overfetch = int(os.getenv("VECTOR_OVERFETCH", 4))
+expansion_factor = 4
+max_candidates = int(os.getenv("VECTOR_MAX_CANDIDATES", 1280))
+
+# Smallest k that satisfied each topic's last search; the next one starts there.
+# Only topics whose search found enough articles are kept, at most max_topic_k
+# of them, least recently used first out
+max_topic_k = 10000
+topic_k = OrderedDict()
+topic_k_lock = threading.Lock()
+
+
+def candidate_sizes(topic: str, limit: int):
+    with topic_k_lock:
+        start = topic_k.get(topic, 0)
+    k = max(start, limit * overfetch)
+    while True:
+        yield min(k, max_candidates)
+        if k >= max_candidates:
+            return
+        k *= expansion_factor
+
+
+def satisfied(topic: str, limit: int, k: int, result):
+    # Whether the top-k search found enough articles; if so its k is kept for the topic
+    if len(result) < limit:
+        return False
+    with topic_k_lock:
+        topic_k[topic] = k
+        topic_k.move_to_end(topic)
+        while len(topic_k) > max_topic_k:
+            topic_k.popitem(last=False)
+    return True
+
+
+def adaptive_search(fetch, exact, topic: str, limit: int):
+    # fetch(k) returns the index's top-k that pass the filter; exact() scans them all
+    for k in candidate_sizes(topic, limit):
+        result = fetch(k)
+        if satisfied(topic, limit, k, result):
+            return result
+    return exact()
+
+
+async def aadaptive_search(fetch, exact, topic: str, limit: int):
+    for k in candidate_sizes(topic, limit):
+        result = await fetch(k)
+        if satisfied(topic, limit, k, result):
+            return result
+    return await exact()
+
+
+def search_articles(topic: str, before_date: str, topic_embedding, limit: int = 5):
+    if vector_index.vector_backend == "local":
+        return vector_index.search_articles(topic, before_date, topic_embedding, limit)
+    params = {"topic": topic, "before_date": before_date, "topic_embedding": topic_embedding, "limit": limit}
+    return adaptive_search(
+        lambda k: read_query(queries.filtered_vector_articles_query, {**params, "k": k}),
+        lambda: read_query(queries.exact_vector_articles_query, params),
+        topic,
+        limit,
+    )
+
+
+async def asearch_articles(topic: str, before_date: str, topic_embedding, limit: int = 5):
+    if vector_index.vector_backend == "local":
+        return await asyncio.to_thread(vector_index.search_articles, topic, before_date, topic_embedding, limit)
+    params = {"topic": topic, "before_date": before_date, "topic_embedding": topic_embedding, "limit": limit}
+    return await aadaptive_search(
+        lambda k: aread_query(queries.filtered_vector_articles_query, {**params, "k": k}),
+        lambda: aread_query(queries.exact_vector_articles_query, params),
+        topic,
+        limit,
+    )
+
+
+# "A few random articles of a topic published before a date". ORDER BY rand()
+# sorts every article of the topic, so topics above RANDOM_SAMPLE_ABOVE
+# articles are sampled from the RELATED_TO shuffle-key index instead: the
+# articles whose random key follows a random starting point. The key window
+# starts at about sample_overfetch * limit / size, so it holds a few dozen
+# edges, and widens geometrically (wrapping around 1.0) while the date filter
+# leaves too few; past max_sample_window the exact query is cheaper.
+
+sample_above = int(os.getenv("RANDOM_SAMPLE_ABOVE", 2000))
+sample_overfetch = 8
+max_sample_window = 0.25
+
+
+def topic_size(topic: str):
+    # Cached until the next graph generation, as the loader is what changes it
+    def compute():
+        records = read_query(queries.topic_size_query, {"topic": topic})
+        return records[0]["size"] if records else 0
+
+    return topic_cache.get(("topic_size", topic), compute)
+
+
+async def atopic_size(topic: str):
+    async def compute():
+        records = await aread_query(queries.topic_size_query, {"topic": topic})
+        return records[0]["size"] if records else 0
+
+    return await topic_cache.aget(("topic_size", topic), compute)
+
+
+def key_ranges(start: float, width: float):
+    if start + width <= 1.0:
+        return [[start, start + width]]
+    return [[start, 1.0], [0.0, start + width - 1.0]]
+
+
+def sample_windows(size: int, limit: int):
+    # Shuffle-key ranges to try in turn, all from one random starting point
+    start = random.random()
+    width = sample_overfetch * limit / size
+    while width <= max_sample_window:
+        yield start, key_ranges(start, width)
+        width *= expansion_factor
+
+
+def random_articles(topic: str, before_date: str, limit: int = 5):
+    params = {"topic": topic, "before_date": before_date, "limit": limit}
+    size = topic_size(topic)
+    if size > sample_above:
+        for start, ranges in sample_windows(size, limit):
+            result = read_query(
+                queries.sampled_articles_query, {**params, "ranges": ranges, "start": start}
+            )
+            if len(result) >= limit:
+                return result
+    return read_query(queries.random_articles_query, params)
+
+
+async def arandom_articles(topic: str, before_date: str, limit: int = 5):
+    params = {"topic": topic, "before_date": before_date, "limit": limit}
+    size = await atopic_size(topic)
+    if size > sample_above:
+        for start, ranges in sample_windows(size, limit):
+            result = await aread_query(
+                queries.sampled_articles_query, {**params, "ranges": ranges, "start": start}
+            )
+            if len(result) >= limit:
+                return result
+    return await aread_query(queries.random_articles_query, params)
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+# Request coalescing: while a computation for a key is in flight, identical
+# requests wait for its result instead of starting their own. Used for whole
+# feeds (same topic, level and date) and for single article summaries, so a
+# burst of subscribers refreshing one topic makes one set of Ollama calls.
+# A flight lives only while it runs; finished results are the caches' job.
+# Works from Flask threads and asyncio tasks alike.
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # The leader stopped without a result (closed stream, cancelled task);
+        # followers then compute for themselves
+        self.abandoned = False
+        self.waiters = []  # (event loop, future) of async followers
+        self._lock = threading.Lock()
+
+    def set(self, value=None, error=None, abandoned: bool = False):
+        with self._lock:
+            self.value, self.error, self.abandoned = value, error, abandoned
+            self.done.set()
+            waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(wake, future)
+
+    def wait(self):
+        self.done.wait()
+
+    async def await_done(self):
+        with self._lock:
+            if self.done.is_set():
+                return
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.append((asyncio.get_running_loop(), future))
+        await future
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.flights = {}
+        self.led = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        # (flight, True) if the caller should compute it, (flight in progress, False) otherwise
+        with self._lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                return flight, False
+            flight = self.flights[key] = Flight()
+            self.led += 1
+            return flight, True
+
+    def finish(self, key, flight: Flight, value=None, error=None, abandoned: bool = False):
+        with self._lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.set(value, error, abandoned)
+
+    def do(self, key, compute):
+        while True:
+            flight, leader = self.claim(key)
+            if leader:
+                try:
+                    value = compute()
+                except Exception as e:
+                    self.finish(key, flight, error=e)
+                    raise
+                except BaseException:
+                    self.finish(key, flight, abandoned=True)
+                    raise
+                self.finish(key, flight, value)
+                return value
+            flight.wait()
+            if not flight.abandoned:
+                return flight.result()
+
+    async def ado(self, key, compute):
+        # compute is a coroutine function
+        while True:
+            flight, leader = self.claim(key)
+            if leader:
+                try:
+                    value = await compute()
+                except Exception as e:
+                    self.finish(key, flight, error=e)
+                    raise
+                except BaseException:
+                    self.finish(key, flight, abandoned=True)
+                    raise
+                self.finish(key, flight, value)
+                return value
+            await flight.await_done()
+            if not flight.abandoned:
+                return flight.result()
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "in_flight": len(self.flights), "led": self.led, "shared": self.shared}
@@ -0,0 +1,170 @@
+from cache import content_key
+
+# Returned for an article whose summary could not be generated, so one bad
+# LLM response never fails the whole feed
+empty_analysis = {"summary": None, "intent": None}
+
+
+class ArticleSummarizer:
+    """Runs summary_chain over batches of article records.
+
+    Cached summaries are served straight from the cache; the misses are sent
+    to the chain as a single batch with at most `max_concurrency` calls in
+    flight. summarize_many keeps the order of the input records while
+    iter_summaries yields them as they complete, for streaming responses.
+
+    With `flights` (a SingleFlight), a miss that another request is already
+    summarizing waits for that call instead of making its own. `prepare`
+    builds the question from a record and topic (prompt_prep.PromptPreparer);
+    it only runs for misses, since the cache key is taken from the raw text.
+    """
+
+    def __init__(self, chain, cache=None, fingerprint: str = "", max_concurrency: int = 4, flights=None, prepare=None):
+        self.chain = chain
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.max_concurrency = max_concurrency
+        self.flights = flights
+        self.prepare = prepare
+
+    def chain_input(self, record, topic: str, level: str):
+        if self.prepare is not None:
+            question = self.prepare(record, topic)
+        else:
+            question = record["title"] + record["description"]
+        return {"question": question, "topic": topic, "level": level}
+
+    def cache_key(self, record, topic: str, level: str):
+        question = record["title"] + record["description"]
+        return content_key(record["link"], topic, level, question, self.fingerprint)
+
+    def summarize(self, record, topic: str, level: str):
+        return self.summarize_many([record], topic, level)[0]
+
+    def summarize_many(self, records, topic: str, level: str):
+        results = [None] * len(records)
+        for i, analysis in self.iter_summaries(records, topic, level):
+            results[i] = analysis
+        return results
+
+    def iter_summaries(self, records, topic: str, level: str):
+        # Yields (index, analysis) pairs as soon as each summary is ready:
+        # cache hits first, then LLM results in completion order
+        hits, pending = self.lookup(records, topic, level)
+        yield from hits
+        if not pending:
+            return
+        owned, waiting = self.claim(pending)
+        try:
+            keys = list(owned)
+            inputs = [self.chain_input(records[pending[key][0]], topic, level) for key in keys]
+            responses = self.chain.batch_as_completed(
+                inputs,
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True,
+            ) if keys else []
+            for j, response in responses:
+                self.finish(keys[j], owned.pop(keys[j]), response)
+                yield from self.resolve(records, pending, keys[j], response)
+            for key, flight in waiting.items():
+                flight.wait()
+                if flight.abandoned:
+                    response = self.invoke(self.chain_input(records[pending[key][0]], topic, level))
+                else:
+                    response = flight.value
+                yield from self.resolve(records, pending, key, response, shared=not flight.abandoned)
+        finally:
+            self.abandon(owned)
+
+    async def asummarize_many(self, records, topic: str, level: str):
+        results = [None] * len(records)
+        async for i, analysis in self.aiter_summaries(records, topic, level):
+            results[i] = analysis
+        return results
+
+    async def aiter_summaries(self, records, topic: str, level: str):
+        # Async twin of iter_summaries, driving the chain with abatch_as_completed
+        hits, pending = self.lookup(records, topic, level)
+        for item in hits:
+            yield item
+        if not pending:
+            return
+        owned, waiting = self.claim(pending)
+        try:
+            keys = list(owned)
+            if keys:
+                inputs = [self.chain_input(records[pending[key][0]], topic, level) for key in keys]
+                responses = self.chain.abatch_as_completed(
+                    inputs,
+                    config={"max_concurrency": self.max_concurrency},
+                    return_exceptions=True,
+                )
+                async for j, response in responses:
+                    self.finish(keys[j], owned.pop(keys[j]), response)
+                    for item in self.resolve(records, pending, keys[j], response):
+                        yield item
+            for key, flight in waiting.items():
+                await flight.await_done()
+                if flight.abandoned:
+                    response = await self.ainvoke(self.chain_input(records[pending[key][0]], topic, level))
+                else:
+                    response = flight.value
+                for item in self.resolve(records, pending, key, response, shared=not flight.abandoned):
+                    yield item
+        finally:
+            self.abandon(owned)
+
+    def lookup(self, records, topic: str, level: str):
+        # Splits records into cache hits and misses grouped by cache key
+        hits = []
+        pending = {}  # cache key -> indices of the records waiting on it
+        for i, record in enumerate(records):
+            key = self.cache_key(record, topic, level)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                hits.append((i, cached))
+            else:
+                pending.setdefault(key, []).append(i)
+        return hits, pending
+
+    def claim(self, pending):
+        # ({key: flight} this call summarizes, {key: flight} another request is summarizing)
+        if self.flights is None:
+            return {key: None for key in pending}, {}
+        owned, waiting = {}, {}
+        for key in pending:
+            flight, leader = self.flights.claim(key)
+            (owned if leader else waiting)[key] = flight
+        return owned, waiting
+
+    def finish(self, key, flight, response):
+        if flight is not None:
+            self.flights.finish(key, flight, response)
+
+    def abandon(self, owned):
+        # Keys left unsummarized by a closed stream; their followers summarize them themselves
+        for key, flight in owned.items():
+            if flight is not None:
+                self.flights.finish(key, flight, abandoned=True)
+
+    def invoke(self, chain_input):
+        try:
+            return self.chain.invoke(chain_input)
+        except Exception as e:
+            return e
+
+    async def ainvoke(self, chain_input):
+        try:
+            return await self.chain.ainvoke(chain_input)
+        except Exception as e:
+            return e
+
+    def resolve(self, records, pending, key, response, shared: bool = False):
+        # shared: the response came from another request's call, which already cached or logged it
+        if not isinstance(response, dict) or not {"summary", "intent"} <= response.keys():
+            if not shared:
+                print(f"Summarization failed for {records[pending[key][0]]['link']}: {response!r}")
+            response = empty_analysis
+        elif self.cache is not None and not shared:
+            self.cache.set(key, response)
+        return [(i, dict(response)) for i in pending[key]]
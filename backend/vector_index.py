@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_store import EmbeddingStore, epoch_seconds, get_store, no_date
+
+load_dotenv()
+
+# VECTOR_BACKEND=local answers the app's vector searches from an in-process IVF
+# index over the embedding store instead of Neo4j's article_vectors index.
+# The store is filled by the loader (neo4j_loader.py --vector-store) or from
+# the graph (python vector_index.py --sync), then trained:
+#   python vector_index.py --sync --train
+vector_backend = os.getenv("VECTOR_BACKEND", "neo4j")
+nprobe = int(os.getenv("IVF_NPROBE", 8))
+# Filtered sets at most this large are scored exactly instead of through the lists
+exact_below = int(os.getenv("IVF_EXACT_BELOW", 2000))
+chunk_rows = 16384
+
+
+def normalize(matrix: np.ndarray):
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+    return matrix / np.maximum(norms, 1e-12)[:, None], norms
+
+
+def nearest_centroids(matrix: np.ndarray, centroids: np.ndarray):
+    # Chunked so a large store never materializes the full rows x lists score matrix
+    assignments = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), chunk_rows):
+        block, _ = normalize(np.asarray(matrix[start : start + chunk_rows], dtype=np.float32))
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_index(store: EmbeddingStore, nlist: int = None, iterations: int = 10, sample: int = 50000, seed: int = 0):
+    """Spherical k-means over (a sample of) the live rows; writes ivf.npz next to the store."""
+    store.refresh()
+    rows = np.flatnonzero(store.alive)
+    if len(rows) == 0:
+        return None
+    nlist = nlist or max(1, int(np.sqrt(len(rows))))
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(rows, min(sample, len(rows)), replace=False))
+    data, _ = normalize(np.asarray(store.matrix[sample_rows], dtype=np.float32))
+    centroids = data[rng.choice(len(data), min(nlist, len(data)), replace=False)]
+    for _ in range(iterations):
+        labels = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        empty = ~np.bincount(labels, minlength=len(centroids)).astype(bool)
+        sums[empty] = centroids[empty]
+        centroids, _ = normalize(sums)
+    assignments = nearest_centroids(store.matrix, centroids)
+    np.savez(os.path.join(store.path, "ivf.npz"), centroids=centroids, assignments=assignments)
+    print(f"Trained IVF index: {len(centroids)} lists over {len(rows)} rows")
+    return centroids
+
+
+def train_if_grown(store: EmbeddingStore, growth: float = 2.0):
+    # Retrain once the store has grown `growth` times past the rows the lists were trained on
+    ivf_path = os.path.join(store.path, "ivf.npz")
+    trained_rows = 0
+    if os.path.exists(ivf_path):
+        with np.load(ivf_path) as ivf:
+            trained_rows = len(ivf["assignments"])
+    if len(store) > growth * trained_rows:
+        return train_index(store)
+    return None
+
+
+class IVFIndex:
+    """Inverted-file index over an EmbeddingStore.
+
+    Every row is bucketed under its nearest k-means centroid. A search scores
+    only the rows in the `nprobe` lists closest to the query, after applying
+    the topic/date filter, and probes more lists until enough rows pass it.
+    Rows appended after training are bucketed under the existing centroids;
+    retrain (python vector_index.py --train) once the store has grown a lot.
+    """
+
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self._ivf_mtime = None
+        self._lock = threading.Lock()
+        self.sync()
+
+    def __len__(self):
+        return len(self.norms)
+
+    def sync(self):
+        # Picks up rows appended to the store and a retrained ivf.npz
+        self.store.refresh()
+        ivf_path = os.path.join(self.store.path, "ivf.npz")
+        ivf_mtime = os.path.getmtime(ivf_path) if os.path.exists(ivf_path) else None
+        n = len(self.store)
+        if n == len(self.norms) and ivf_mtime == self._ivf_mtime:
+            return 0
+        with self._lock:
+            added = n - len(self.norms)
+            if n > len(self.norms):
+                norms = np.empty(n - len(self.norms), dtype=np.float32)
+                for start in range(len(self.norms), n, chunk_rows):
+                    _, block_norms = normalize(np.asarray(self.store.matrix[start : min(start + chunk_rows, n)]))
+                    norms[start - len(self.norms) : start - len(self.norms) + len(block_norms)] = block_norms
+                self.norms = np.concatenate([self.norms, norms])
+            if ivf_mtime != self._ivf_mtime:
+                with np.load(ivf_path) as ivf:
+                    self.centroids = ivf["centroids"]
+                    self.assignments = ivf["assignments"][:n]
+                self._ivf_mtime = ivf_mtime
+            if self.centroids is not None and len(self.assignments) < n:
+                new = nearest_centroids(self.store.matrix[len(self.assignments) : n], self.centroids)
+                self.assignments = np.concatenate([self.assignments, new])
+            return added
+
+    def search(self, query, limit: int, topic: str = None, before: int = None):
+        """(row, cosine) pairs of the best `limit` live rows passing the filters."""
+        n = len(self.norms)
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        allowed = self.store.alive[:n].copy()
+        if topic is not None:
+            allowed &= self.store.topic_mask(topic, n)
+        if before is not None:
+            # Articles without a pubDate never pass a date filter, as in Cypher
+            dates = self.store.pub_dates[:n]
+            allowed &= (dates < before) & (dates != no_date)
+        candidates = np.flatnonzero(allowed)
+
+        if len(candidates) > exact_below and self.centroids is not None and len(self.assignments) >= n:
+            order = np.argsort(-(self.centroids @ query))
+            probe = nprobe
+            lists = self.assignments[candidates]
+            while True:
+                in_lists = np.isin(lists, order[:probe])
+                if in_lists.sum() >= limit or probe >= len(order):
+                    break
+                probe *= 2
+            candidates = candidates[in_lists]
+
+        if len(candidates) == 0:
+            return []
+        scores = (np.asarray(self.store.matrix[candidates]) @ query) / np.maximum(self.norms[candidates], 1e-12)
+        top = np.argsort(-scores)[:limit]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+
+index = None
+index_lock = threading.Lock()
+
+
+def get_index():
+    global index
+    with index_lock:
+        if index is None:
+            index = IVFIndex(get_store())
+    return index
+
+
+def search_articles(topic: str, before_date: str, topic_embedding, limit: int = 5):
+    # Same records as retrieval.search_articles, without a Neo4j round trip.
+    # Scores use Neo4j's cosine scale, (1 + cos) / 2.
+    local = get_index()
+    local.sync()
+    hits = local.search(topic_embedding, limit, topic, epoch_seconds(before_date))
+    records = []
+    for row, cosine in hits:
+        meta = local.store.record(row)
+        records.append(
+            {
+                "link": meta["link"],
+                "title": meta["title"],
+                "description": meta["description"],
+                "pubDate": meta["pubDate"],
+                "score": (1 + cosine) / 2,
+            }
+        )
+    return records
+
+
+graph_articles_query = """
+MATCH (a:Article)
+WHERE a.embedding IS NOT NULL AND ($since IS NULL OR a.loadedAt > datetime($since))
+OPTIONAL MATCH (a)-[:RELATED_TO]->(t:Topic)
+WITH a, collect(t.name) AS topics
+RETURN a.link AS link, a.title AS title, a.description AS description, a.pubDate AS pubDate,
+       a.embedding AS embedding, topics, toString(a.loadedAt) AS loadedAt
+ORDER BY loadedAt, link
+SKIP $skip
+LIMIT $limit
+"""
+
+
+def sync_from_graph(store: EmbeddingStore, batch_size: int = 1000):
+    """Append Article nodes loaded since the last sync (all of them the first time)."""
+    from db import read_query
+
+    state_path = os.path.join(store.path, "sync_state.json")
+    since = None
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            since = json.load(f).get("loadedAt")
+    added = skip = 0
+    latest = since
+    while True:
+        records = read_query(graph_articles_query, {"since": since, "skip": skip, "limit": batch_size})
+        if not records:
+            break
+        skip += len(records)
+        latest = records[-1]["loadedAt"] or latest
+        added += store.append(record for record in records if not store.is_current(record))
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"loadedAt": latest}, f)
+    print(f"Synced {added} articles from Neo4j into {store.path} ({len(store)} rows)")
+    return added
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Maintain the local article vector index")
+    arg_parser.add_argument("--path", default=None, help="store directory, defaults to VECTOR_STORE_PATH")
+    arg_parser.add_argument("--sync", action="store_true", help="append articles loaded into Neo4j since the last sync")
+    arg_parser.add_argument("--train", action="store_true", help="(re)train the IVF lists")
+    arg_parser.add_argument("--nlist", type=int, default=None, help="number of lists, default sqrt(rows)")
+    args = arg_parser.parse_args()
+
+    store = EmbeddingStore(args.path)
+    if args.sync:
+        sync_from_graph(store)
+    if args.train:
+        train_index(store, args.nlist)
@@ -32,7 +32,39 @@ async function fetchTopicSummary(combined_summaries: String) {
   }
 }
 
-async function checkAndHandleHistory(user_id: string, topic: string, current_date: Date): Promise<{ initialized: boolean; data: any }> {
+// Reads an NDJSON article stream and hands each article to onArticle as soon as it arrives.
+// Articles arrive as their summaries complete; the returned list is back in feed order (index)
+async function streamArticles(method: string, url: string, body: object, onArticle: (article: any) => void): Promise<any[]> {
+  const response = await fetch(`${url}?stream=1`, {
+    method,
+    headers: { "Content-Type": "application/json", Accept: "application/x-ndjson" },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Request failed with status ${response.status}`);
+  }
+
+  const articles: any[] = [];
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value ?? new Uint8Array(), { stream: !done });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const article = JSON.parse(line);
+      articles.push(article);
+      onArticle(article);
+    }
+    if (done) break;
+  }
+  return articles.sort((a, b) => a.index - b.index);
+}
+
+async function checkAndHandleHistory(user_id: string, topic: string, current_date: Date, onArticle: (article: any) => void = () => {}): Promise<{ initialized: boolean; data: any }> {
   try {
     // Check if history exists
     console.log("Checking if history exists for user:", user_id, "and topic:", topic);
@@ -46,32 +78,29 @@ async function checkAndHandleHistory(user_id: string, topic: string, current_dat
 
     console.log("History check response:", getResponse.data);
 
+    const body = {
+      user_id: user_id,
+      topic: topic,
+      current_date: current_date.toISOString(),
+      level: currentInterest.value.level,
+    };
+
     if (getResponse.data && getResponse.data.length > 0) {
       console.log("History exists. Updating history...");
 
-      // Update history with a PUT request
-      const putResponse = await axios.put(`${apiUrl}/articles/history`, {
-        user_id: user_id,
-        topic: topic,
-        current_date: current_date.toISOString(),
-        level: currentInterest.value.level,
-      });
+      // Update history with a PUT request, streaming new articles as they are summarized
+      const putData = await streamArticles("PUT", `${apiUrl}/articles/history`, body, onArticle);
 
-      console.log("History updated:", putResponse.data);
-      return { initialized: false, data: putResponse.data }; // Return updated history with initialized = false
+      console.log("History updated:", putData);
+      return { initialized: false, data: putData }; // Return updated history with initialized = false
     } else {
       console.log("No history found. Initializing history...");
 
-      // Initialize history with a POST request
-      const postResponse = await axios.post(`${apiUrl}/articles/history`, {
-        user_id: user_id,
-        topic: topic,
-        current_date: current_date.toISOString(),
-        level: currentInterest.value.level,
-      });
+      // Initialize history with a POST request, streaming articles as they are summarized
+      const postData = await streamArticles("POST", `${apiUrl}/articles/history`, body, onArticle);
 
-      console.log("History initialized:", postResponse.data);
-      return { initialized: true, data: postResponse.data }; // Return initialized history with initialized = true
+      console.log("History initialized:", postData);
+      return { initialized: true, data: postData }; // Return initialized history with initialized = true
     }
   } catch (error) {
     console.error("Error checking or handling history:", error);